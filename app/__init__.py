@@ -1,7 +1,7 @@
 import logging
-from flask import Flask
-from telegram.ext import Updater
 from app.config import Config
+from utils.rate_limiter import RateLimiter
+from utils.send_queue import SendQueue
 
 # Configure logging
 logging.basicConfig(
@@ -10,56 +10,81 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Initialize Telegram bot
-try:
-    updater = Updater(token=Config.BOT_TOKEN, use_context=True)
-    bot = updater.bot
-    dp = updater.dispatcher
-    logger.info("Bot initialized successfully!")
-except Exception as e:
-    logger.error(f"Failed to initialize bot: {str(e)}")
-    raise
-
-# Rate limiting dictionary
-user_requests = {}
+# Bot commands shown in the Telegram menu
+BOT_COMMANDS = [
+    ('start', 'Start the bot'),
+    ('help', 'Show help message'),
+    ('status', 'Check bot status'),
+    ('about', 'About the bot')
+]
 
-def init_bot():
-    """Initialize bot commands and handlers"""
-    from app.utils import terabox, media_player
-    from app import main
-    
-    # Register bot commands
-    commands = [
-        ('start', 'Start the bot'),
-        ('help', 'Show help message'),
-        ('status', 'Check bot status'),
-        ('about', 'About the bot')
-    ]
-    
+async def set_bot_commands(application):
+    """Register bot commands once the bot is running"""
     try:
-        bot.set_my_commands(commands)
+        await application.bot.set_my_commands(BOT_COMMANDS)
         logger.info("Bot commands set successfully!")
     except Exception as e:
         logger.error(f"Failed to set bot commands: {str(e)}")
 
-def create_app():
-    """Initialize the core application"""
-    try:
-        # Initialize bot
-        init_bot()
-        
-        # Register blueprints if any
-        # app.register_blueprint(some_blueprint)
-        
-        logger.info("Application initialized successfully!")
-        return app
-    except Exception as e:
-        logger.error(f"Failed to create application: {str(e)}")
-        raise
+_application = None
+
+def get_application():
+    """Build the Telegram application on first use
+
+    telegram.ext is imported here too, so importing app stays cheap and
+    does not touch the network; the bot only connects when it is started.
+    """
+    global _application
+    if _application is None:
+        from telegram.ext import Application
+        try:
+            builder = (
+                Application.builder()
+                .token(Config.BOT_TOKEN)
+                .concurrent_updates(Config.BOT_CONCURRENT_UPDATES)
+                .connection_pool_size(Config.TELEGRAM_POOL_SIZE)
+                .post_init(set_bot_commands)
+            )
+            if Config.TELEGRAM_API_URL:
+                builder = builder.base_url(Config.TELEGRAM_API_URL)
+            _application = builder.build()
+            logger.info("Bot initialized successfully!")
+        except Exception as e:
+            logger.error(f"Failed to initialize bot: {str(e)}")
+            raise
+        _application.add_error_handler(handle_telegram_error)
+    return _application
+
+def __getattr__(name: str):
+    # Keeps `from app import application` working without building the bot at import
+    if name == 'application':
+        return get_application()
+    if name == 'bot':
+        return get_application().bot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Rate limiter shared by the bot handlers and the API routes
+rate_limiter = RateLimiter(
+    max_requests=Config.RATE_LIMIT['max_requests'],
+    window=Config.RATE_LIMIT['window']
+)
+
+# Separate budget for /stream and /hls, charged per request and per ffmpeg run
+media_rate_limiter = RateLimiter(
+    max_requests=Config.MEDIA_RATE_LIMIT['max_requests'],
+    window=Config.MEDIA_RATE_LIMIT['window']
+)
+
+# Every outbound Telegram call goes through this to stay under flood limits
+send_queue = SendQueue(
+    global_rate=Config.TELEGRAM_GLOBAL_RATE,
+    global_burst=Config.TELEGRAM_GLOBAL_BURST,
+    chat_rate=Config.TELEGRAM_CHAT_RATE,
+    group_rate=Config.TELEGRAM_GROUP_RATE,
+    chat_burst=Config.TELEGRAM_CHAT_BURST,
+    admin_ids=Config.ADMIN_IDS,
+    alert_interval=Config.ADMIN_ALERT_INTERVAL
+)
 
 # Create version info
 __version__ = '1.0.0'
@@ -68,60 +93,22 @@ __license__ = 'MIT'
 
 # Export necessary items
 __all__ = [
-    'app',
+    'application',
     'bot',
-    'dp',
-    'updater',
-    'user_requests',
-    'create_app',
+    'get_application',
+    'media_rate_limiter',
+    'rate_limiter',
+    'send_queue',
     '__version__',
     '__author__',
     '__license__'
 ]
 
-# Create the application instance
-app = create_app()
-
-@app.after_request
-def after_request(response):
-    """Add headers to both force latest IE rendering engine or Chrome Frame,
-    and also to cache the rendered page for 10 minutes."""
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
-
-@app.errorhandler(404)
-def not_found_error(error):
-    """Handle 404 errors"""
-    return {
-        'error': 'Not Found',
-        'status': 404
-    }, 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    """Handle 500 errors"""
-    logger.error(f'Server Error: {error}')
-    return {
-        'error': 'Internal Server Error',
-        'status': 500
-    }, 500
-
 # Initialize error handlers
-@dp.error_handler
-def handle_telegram_error(update, context):
+async def handle_telegram_error(update, context):
     """Log Errors caused by Updates."""
     logger.warning('Update "%s" caused error "%s"', update, context.error)
     
-    # Send message to admin if critical error
+    # Alert admins if critical error; alerts are batched by the send queue
     if hasattr(context.error, 'message'):
-        error_msg = f"⚠️ Bot Error:\n\n{context.error.message}"
-        for admin_id in Config.ADMIN_IDS:
-            try:
-                bot.send_message(chat_id=admin_id, text=error_msg)
-            except Exception as e:
-                logger.error(f"Failed to send error message to admin {admin_id}: {str(e)}")
-
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=Config.PORT)
+        send_queue.alert(context.bot, context.error.message)
@@ -0,0 +1,9 @@
+# app/__main__.py
+
+# Entry point for python -m app. Kept apart from app.main so that module is
+# imported exactly once, also in uvicorn worker processes, and its caches
+# and metrics exist once.
+from app.main import main
+
+if __name__ == '__main__':
+    main()
@@ -26,20 +26,66 @@ class Config:
     CHANNEL_URL = f"https://t.me/{CHANNEL_USERNAME}"
     ADMIN_IDS = [int(id_) for id_ in os.getenv('ADMIN_IDS', '').split(',') if id_]
     OWNER_ID = int(os.getenv('OWNER_ID', 0))  # Owner's Telegram ID
+    MEMBER_CACHE_TTL = int(os.getenv('MEMBER_CACHE_TTL', 3600))  # Seconds a confirmed member is trusted
+    NON_MEMBER_CACHE_TTL = int(os.getenv('NON_MEMBER_CACHE_TTL', 60))  # Seconds before rechecking a non-member
+    MEMBER_CHECK_FAILURE_TTL = int(os.getenv('MEMBER_CHECK_FAILURE_TTL', 60))  # Seconds a failed check lets the user through
+    MEMBERSHIP_CHECK_CONCURRENCY = int(os.getenv('MEMBERSHIP_CHECK_CONCURRENCY', 16))  # get_chat_member calls at once
 
     # Gemini Configuration
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    if not GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-pro')
+    GEMINI_CACHE_TTL = int(os.getenv('GEMINI_CACHE_TTL', 86400))  # 1 day in seconds
+    GEMINI_CACHE_SIZE = int(os.getenv('GEMINI_CACHE_SIZE', 2048))  # Analyses kept
+    GEMINI_BATCH_WINDOW = float(os.getenv('GEMINI_BATCH_WINDOW', 0))  # Seconds; 0 disables batching
+    GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', 8))  # Files per batched prompt
     
     # Database Configuration (if needed)
     DATABASE_URL = os.getenv('DATABASE_URL', '')
+    LINK_STORE = os.getenv('LINK_STORE', 'True').lower() == 'true'  # Persist resolved links
+    LINK_DB_PATH = os.getenv('LINK_DB_PATH', 'links.db')  # SQLite file when DATABASE_URL is not Postgres
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 10))  # Postgres connections
+    DATABASE_BATCH_SIZE = int(os.getenv('DATABASE_BATCH_SIZE', 100))  # Links per buffered write
+    DATABASE_FLUSH_INTERVAL = float(os.getenv('DATABASE_FLUSH_INTERVAL', 2))  # Seconds between writes
+    DATABASE_MAX_PENDING = int(os.getenv('DATABASE_MAX_PENDING', 10000))  # Unwritten links kept while the database is down
+    DATABASE_RETRY_MAX = float(os.getenv('DATABASE_RETRY_MAX', 60))  # Longest pause between reconnect attempts
     
     # Terabox Configuration
     TERABOX_COOKIE = os.getenv('TERABOX_COOKIE', '')
     TERABOX_TOKEN = os.getenv('TERABOX_TOKEN', '')
     TERABOX_USER_ID = os.getenv('TERABOX_USER_ID', '')
+    TERABOX_ACCOUNTS = os.getenv('TERABOX_ACCOUNTS', '')  # JSON list of {"cookie", "token", "user_id", "name"}
+    ACCOUNT_STRATEGY = os.getenv('ACCOUNT_STRATEGY', 'least_loaded')  # or round_robin
+    ACCOUNT_COOLDOWN = int(os.getenv('ACCOUNT_COOLDOWN', 300))  # Seconds a throttled account sits out
+    TERABOX_THROTTLE_ERRNOS = {
+        int(errno) for errno in os.getenv('TERABOX_THROTTLE_ERRNOS', '31034,4000023').split(',') if errno.strip()
+    }
+    TERABOX_API_HOSTS = [
+        host.strip() for host in os.getenv('TERABOX_API_HOSTS', 'www.terabox.com,www.1024tera.com').split(',')
+        if host.strip()
+    ]
+    
+    TERABOX_API_SCHEME = os.getenv('TERABOX_API_SCHEME', 'https')  # http only for local fakes
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')  # Bot API base URL; empty means api.telegram.org
+    
+    # Upstream Resilience Configuration
+    UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', 8))  # Seconds per attempt
+    UPSTREAM_DEADLINE = float(os.getenv('UPSTREAM_DEADLINE', 20))  # Seconds per call, retries included
+    UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', 3))  # Retries after the first attempt
+    UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', 0.2))  # Seconds, doubled per retry
+    UPSTREAM_BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', 2))  # Seconds
+    UPSTREAM_HEDGE_DELAY = float(os.getenv('UPSTREAM_HEDGE_DELAY', 0))  # Seconds before racing the next host (0 disables)
+    UPSTREAM_RETRY_RATIO = float(os.getenv('UPSTREAM_RETRY_RATIO', 0.2))  # Retries allowed per call
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))  # Failures before failing fast
+    CIRCUIT_RESET_TIMEOUT = int(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))  # Seconds before probing again
+    
+    # HTTP Connection Pool Configuration
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 100))  # Total open connections
+    HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', 20))  # Connections per host
+    HTTP_KEEPALIVE_TIMEOUT = int(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))  # Idle seconds
+    DNS_CACHE_TTL = int(os.getenv('DNS_CACHE_TTL', 300))  # 5 minutes in seconds
     
     # User Agent Configuration
     USER_AGENT = (
@@ -49,8 +95,9 @@ if not GEMINI_API_KEY:
     )
     
     # Media Player Templates
+    # Fields: {url} direct URL, {url_encoded} URL as a query value, {title} encoded filename
     MXPLAYER_TEMPLATE = (
-        "intent://play?link={url}#Intent;"
+        "intent:{url}#Intent;"
         "package=com.mxtech.videoplayer.ad;"
         "S.title={title};"
         "end"
@@ -58,14 +105,82 @@ if not GEMINI_API_KEY:
     VLC_TEMPLATE = "vlc://{url}"
     PLAYIT_TEMPLATE = (
         "playit://playerv2/video?"
-        "url={url}&"
+        "url={url_encoded}&"
         "title={title}"
     )
+    NPLAYER_TEMPLATE = "nplayer-{url}"
+    INFUSE_TEMPLATE = "infuse://x-callback-url/play?url={url_encoded}"
+    MPV_TEMPLATE = (
+        "intent:{url}#Intent;"
+        "package=is.xyz.mpv;"
+        "type=video/any;"
+        "end"
+    )
+    PLAYER_TEMPLATES = {
+        'vlc': VLC_TEMPLATE,
+        'mx_player': MXPLAYER_TEMPLATE,
+        'playit': PLAYIT_TEMPLATE,
+        'nplayer': NPLAYER_TEMPLATE,
+        'infuse': INFUSE_TEMPLATE,
+        'mpv': MPV_TEMPLATE
+    }
+    
+    # Streaming Proxy Configuration
+    STREAM_BASE_URL = os.getenv('STREAM_BASE_URL', os.getenv('WEBHOOK_URL', '')).rstrip('/')  # Public URL of /stream
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 262144))  # 256KB per relayed chunk
+    STREAM_CONNECT_TIMEOUT = int(os.getenv('STREAM_CONNECT_TIMEOUT', 10))  # Seconds
+    STREAM_READ_TIMEOUT = int(os.getenv('STREAM_READ_TIMEOUT', 60))  # Seconds between upstream reads
+    STREAM_MAX_RESUMES = int(os.getenv('STREAM_MAX_RESUMES', 2))  # Reconnects per client stream
+    
+    # Chunk Cache Configuration (0 bytes disables)
+    CHUNK_CACHE_DIR = os.getenv('CHUNK_CACHE_DIR', '/tmp/terabox-chunks')
+    CHUNK_CACHE_MAX_BYTES = int(os.getenv('CHUNK_CACHE_MAX_BYTES', 2147483648))  # 2GB on disk
+    CHUNK_CACHE_BLOCK_SIZE = int(os.getenv('CHUNK_CACHE_BLOCK_SIZE', 2097152))  # 2MB per block
+    CHUNK_CACHE_MIN_HITS = int(os.getenv('CHUNK_CACHE_MIN_HITS', 2))  # Distinct viewers before a file is cached
+    CHUNK_CACHE_HOT_WINDOW = int(os.getenv('CHUNK_CACHE_HOT_WINDOW', 3600))  # Seconds viewers are counted over
+
+    # HLS Configuration (segments are remuxed by ffmpeg on demand)
+    HLS_ENABLED = os.getenv('HLS_ENABLED', 'False').lower() == 'true'
+    FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+    FFPROBE_PATH = os.getenv('FFPROBE_PATH', 'ffprobe')
+    HLS_SOURCE_URL = os.getenv('HLS_SOURCE_URL', f"http://127.0.0.1:{os.getenv('PORT', 8080)}").rstrip('/')  # Where ffmpeg reads /stream
+    HLS_SEGMENT_SECONDS = int(os.getenv('HLS_SEGMENT_SECONDS', 6))  # Seconds per segment
+    HLS_CACHE_DIR = os.getenv('HLS_CACHE_DIR', '/tmp/terabox-hls')
+    HLS_CACHE_MAX_BYTES = int(os.getenv('HLS_CACHE_MAX_BYTES', 1073741824))  # 1GB of segments on disk
+    HLS_SEGMENT_MAX_BYTES = int(os.getenv('HLS_SEGMENT_MAX_BYTES', 67108864))  # Larger segments are served but not cached
+    HLS_MAX_PROCESSES = int(os.getenv('HLS_MAX_PROCESSES', 4))  # ffmpeg/ffprobe runs at once
+    HLS_PROCESS_TIMEOUT = int(os.getenv('HLS_PROCESS_TIMEOUT', 60))  # Seconds per ffmpeg run
+
+    # Media Probe Configuration (header-only container/codec detection)
+    MEDIA_PROBE = os.getenv('MEDIA_PROBE', 'True').lower() == 'true'
+    PROBE_HEAD_BYTES = int(os.getenv('PROBE_HEAD_BYTES', 65536))  # 64KB read from the start of each file
+    PROBE_MAX_MOOV_BYTES = int(os.getenv('PROBE_MAX_MOOV_BYTES', 8388608))  # Largest MP4 index fetched
+    PROBE_TIMEOUT = float(os.getenv('PROBE_TIMEOUT', 5))  # Seconds before falling back to the extension
+    PROBE_CACHE_TTL = int(os.getenv('PROBE_CACHE_TTL', 604800))  # 1 week; content never changes per fs_id
+    
+    # Concurrency Configuration
+    BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', 256))  # Updates handled at once
+    MAX_CONCURRENT_CONVERSIONS = int(os.getenv('MAX_CONCURRENT_CONVERSIONS', 128))  # Shared by bot and API
+    CONVERSION_TIMEOUT = int(os.getenv('CONVERSION_TIMEOUT', 30))  # Seconds per conversion
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))  # Links resolved at once per batch
+    MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 50))  # Links accepted per batch
+    
+    # Telegram Send Queue Configuration (Bot API flood limits)
+    TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))  # Messages per second across all chats
+    TELEGRAM_GLOBAL_BURST = int(os.getenv('TELEGRAM_GLOBAL_BURST', 30))
+    TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))  # Messages per second per private chat
+    TELEGRAM_GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', 20 / 60))  # Messages per second per group
+    TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', 3))  # Sent back to back before pacing
+    TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', 64))  # Bot API connections
+    ADMIN_ALERT_INTERVAL = int(os.getenv('ADMIN_ALERT_INTERVAL', 30))  # Seconds alerts are batched for
     
     # Webhook Configuration (for Koyeb)
     WEBHOOK = os.getenv('WEBHOOK', 'True').lower() == 'true'
     WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Your Koyeb app URL
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # Checked against Telegram's secret token header
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))  # Uvicorn worker processes in webhook mode
     PORT = int(os.getenv('PORT', 8080))
+    TRUSTED_PROXIES = os.getenv('TRUSTED_PROXIES', '127.0.0.1')  # Comma-separated proxy IPs whose X-Forwarded-For is believed
     
     # Security Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
@@ -77,9 +192,27 @@ if not GEMINI_API_KEY:
         'window': 3600,  # 1 hour in seconds
         'max_requests': int(os.getenv('MAX_REQUESTS', 50))
     }
+    # Players and HLS clients make many requests per video, so they get their own budget
+    MEDIA_RATE_LIMIT = {
+        'window': int(os.getenv('MEDIA_RATE_WINDOW', 60)),
+        'max_requests': int(os.getenv('MEDIA_MAX_REQUESTS', 600))
+    }
+    HLS_REMUX_COST = int(os.getenv('HLS_REMUX_COST', 10))  # Media requests an ffmpeg/ffprobe run is charged as
     
     # Cache Configuration
     CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', 3600))  # 1 hour in seconds
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))  # Resolved links kept
+    CACHE_EXPIRY_MARGIN = int(os.getenv('CACHE_EXPIRY_MARGIN', 300))  # Drop before signed URL expiry
+    SHARE_LIST_PAGE_SIZE = int(os.getenv('SHARE_LIST_PAGE_SIZE', 100))  # Folder entries per upstream page
+    
+    # Link Refresh Configuration (hot shares are renewed before they expire)
+    REFRESH_ENABLED = os.getenv('REFRESH_ENABLED', 'True').lower() == 'true'
+    REFRESH_INTERVAL = float(os.getenv('REFRESH_INTERVAL', 30))  # Seconds between sweeps
+    REFRESH_LEAD_TIME = float(os.getenv('REFRESH_LEAD_TIME', 120))  # Renew this long before the cached link expires
+    REFRESH_CONCURRENCY = int(os.getenv('REFRESH_CONCURRENCY', 4))  # Renewals in flight per sweep
+    REFRESH_MIN_SCORE = float(os.getenv('REFRESH_MIN_SCORE', 3))  # Decayed requests that make a share hot
+    REFRESH_HALF_LIFE = float(os.getenv('REFRESH_HALF_LIFE', 600))  # Seconds for a share's request count to halve
+    REFRESH_MAX_TRACKED = int(os.getenv('REFRESH_MAX_TRACKED', 10000))  # Shares scored at once, least recently requested dropped first
     
     # Bot Messages and Text
     START_TEXT = """
@@ -117,6 +250,7 @@ Last Updated: 2024-12-30
     # Error Messages
     ERROR_MESSAGES = {
         'not_subscribed': f"❌ Please join our channel first:\n{CHANNEL_URL}",
+        'user_id_required': "❌ user_id is required while channel membership is enforced.",
         'invalid_link': "❌ Invalid Terabox link! Please send a valid link.",
         'processing_error': "❌ Error processing the link. Please try again later.",
         'rate_limit': "❌ Rate limit exceeded. Please try again later.",
@@ -1,9 +1,29 @@
 # app/main.py
 
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
+from app import get_application, media_rate_limiter, rate_limiter, send_queue
 from app.config import Config
-from app.utils.terabox import TeraboxDownloader
-from app.utils.media_player import MediaPlayerHandler
+from utils import ResponseFormatter, TeraboxError, TeraboxValidator
+from utils.terabox import TeraboxDownloader, entry_key
+from utils.media_player import MediaPlayerHandler
+from utils.gemini_ai import GeminiAI
+from utils.media_analyzer import MediaAnalyzer
+from utils.chunk_cache import ChunkCache
+from utils.hls import INTERNAL_TOKEN_HEADER, HLSRemuxer, ffmpeg_available, is_internal
+from utils.probe import MediaProber
+from utils.refresher import LinkRefresher
+from utils.subscription import MembershipGate
+from utils.metrics import (
+    CONVERSION_LATENCY, CONVERSIONS_IN_FLIGHT, RATE_LIMIT_REJECTIONS, REGISTRY,
+    TELEGRAM_SEND_LATENCY, CallbackMetric
+)
+from utils.stream import FileTooLarge, RangeNotSatisfiable, StreamProxy
 import logging
 
 # Enable logging
@@ -13,68 +33,343 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def start(update, context):
-    update.message.reply_text(
+# Shared by the bot handlers and the API routes
+terabox = TeraboxDownloader()
+media_handler = MediaPlayerHandler()
+gemini = GeminiAI()
+# The chunk cache scans its directory, so it is attached in start_services
+stream_proxy = StreamProxy(terabox)
+prober = MediaProber(stream_proxy)
+
+async def keyframes(share_id: str) -> Optional[List[float]]:
+    """Keyframe times HLS cuts copied video on, read from the file's own index"""
+    file_info = await terabox.process_share(share_id)
+    return await prober.keyframes(file_info) if file_info else None
+
+hls = HLSRemuxer(keyframe_source=keyframes)
+membership = MembershipGate(
+    channel_id=Config.CHANNEL_ID,
+    member_ttl=Config.MEMBER_CACHE_TTL,
+    non_member_ttl=Config.NON_MEMBER_CACHE_TTL,
+    failure_ttl=Config.MEMBER_CHECK_FAILURE_TTL,
+    max_concurrent=Config.MEMBERSHIP_CHECK_CONCURRENCY,
+    max_size=Config.CACHE_MAX_ENTRIES
+)
+
+def cache_counters(field: str):
+    """Read one counter from every cache at scrape time"""
+    caches = {
+        "links": terabox.cache, "gemini": gemini.cache, "chunks": stream_proxy.chunk_cache,
+        "hls": hls.segment_cache, "probes": prober.cache, "members": membership.cache,
+        "store": terabox.store
+    }
+    return [((name,), getattr(cache, field)) for name, cache in caches.items() if cache is not None]
+
+CallbackMetric("cache_hits_total", "Cache lookups answered", "counter", ["cache"], lambda: cache_counters("hits"))
+CallbackMetric("cache_misses_total", "Cache lookups missed", "counter", ["cache"], lambda: cache_counters("misses"))
+CallbackMetric("telegram_sends_total", "Outbound Telegram calls by outcome", "counter", ["outcome"], lambda: [
+    ((outcome,), getattr(send_queue, outcome)) for outcome in ("sent", "coalesced", "retried", "failed")
+])
+CallbackMetric("telegram_send_queue", "Telegram calls waiting for flood limits", "gauge", [], lambda: [
+    ((), send_queue.stats()["queued"])
+])
+REPLY_LATENCY = TELEGRAM_SEND_LATENCY.labels("reply_text")
+EDIT_LATENCY = TELEGRAM_SEND_LATENCY.labels("edit_text")
+TELEGRAM_REJECTIONS = RATE_LIMIT_REJECTIONS.labels("telegram")
+API_REJECTIONS = RATE_LIMIT_REJECTIONS.labels("api")
+
+_conversion_slots: Optional[asyncio.Semaphore] = None
+
+def get_conversion_slots() -> asyncio.Semaphore:
+    """Semaphore bounding concurrent conversions, created on the running loop"""
+    global _conversion_slots
+    if _conversion_slots is None:
+        _conversion_slots = asyncio.Semaphore(Config.MAX_CONCURRENT_CONVERSIONS)
+    return _conversion_slots
+
+async def resolve_share(share_id: str) -> Optional[Dict]:
+    """Resolve one share ID within the shared concurrency and time budget"""
+    async def convert() -> Optional[Dict]:
+        async with get_conversion_slots():
+            CONVERSIONS_IN_FLIGHT.inc()
+            try:
+                with CONVERSION_LATENCY.time():
+                    return await terabox.process_share(share_id)
+            finally:
+                CONVERSIONS_IN_FLIGHT.dec()
+
+    # Waiting for a free slot counts against the timeout too
+    return await asyncio.wait_for(convert(), timeout=Config.CONVERSION_TIMEOUT)
+
+async def inspect(file_info: Dict) -> Dict:
+    """Swap the extension-based MIME type for the one read from the file header"""
+    if not Config.MEDIA_PROBE:
+        return file_info
+    media = await prober.probe(file_info)
+    if not media:
+        return file_info
+    return {**file_info, "mime_type": media["mime_type"] or file_info["mime_type"], "media": media}
+
+async def resolve_link(url: str) -> Optional[Dict]:
+    """Convert the first Terabox link found in url"""
+    share_ids = terabox.extract_share_ids(url)
+    if not share_ids:
+        return None
+    return await resolve_share(share_ids[0])
+
+async def resolve_many(share_ids: List[str]) -> AsyncIterator[Tuple[str, Optional[Dict]]]:
+    """Resolve share IDs concurrently, yielding each one as soon as it is ready"""
+    fan_out = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+
+    async def resolve(share_id: str) -> Tuple[str, Optional[Dict]]:
+        async with fan_out:
+            try:
+                return share_id, await resolve_share(share_id)
+            except asyncio.TimeoutError:
+                logger.warning(f"Conversion timed out for share {share_id}")
+                return share_id, None
+
+    tasks = [asyncio.ensure_future(resolve(share_id)) for share_id in share_ids]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away or the consumer stopped early
+        for task in tasks:
+            task.cancel()
+
+def format_link_message(result: Dict) -> str:
+    """Render a converted link as a Telegram reply"""
+    urls = media_handler.generate_stream_urls(result)
+    players = urls['players']
+    hls = f"▫️ HLS: {urls['hls_url']}\n" if urls['hls_url'] else ""
+    return (
+        f"✅ Link Converted Successfully!\n\n"
+        f"📁 File: {result['filename']}\n"
+        f"📦 Size: {result['size']}\n\n"
+        f"🎬 Streaming Links:\n"
+        f"▫️ MX Player: {players['mx_player']}\n"
+        f"▫️ VLC Player: {players['vlc']}\n"
+        f"▫️ Playit: {players['playit']}\n"
+        f"{hls}\n"
+        f"🔄 Direct Link: {result['direct_url']}"
+    )
+
+async def is_rate_limited(user_id: int, cost: int = 1) -> bool:
+    """Check the shared rate limit for a Telegram user; admins are exempt"""
+    if Config.is_admin(user_id):
+        return False
+    if await rate_limiter.allow(f"tg:{user_id}", cost):
+        return False
+    TELEGRAM_REJECTIONS.inc()
+    return True
+
+async def check_api_rate_limit(request: Request, cost: int = 1, limiter=None, scope: str = "api"):
+    """Reject API callers over the shared rate limit with 429"""
+    # uvicorn already replaced the peer with the forwarded client when the peer is a trusted proxy
+    client_ip = request.client.host if request.client else "unknown"
+    if not await (limiter or rate_limiter).allow(f"{scope}:{client_ip}", cost):
+        API_REJECTIONS.inc()
+        raise HTTPException(status_code=429, detail=Config.ERROR_MESSAGES['rate_limit'])
+
+async def check_media_rate_limit(request: Request, cost: int = 1):
+    """Charge a /stream or /hls request against the media budget; ffmpeg's own reads are free"""
+    if is_internal(request.headers.get(INTERNAL_TOKEN_HEADER)):
+        return
+    await check_api_rate_limit(request, cost, limiter=media_rate_limiter, scope="media")
+
+async def is_subscribed(user_id: int) -> bool:
+    """Force-subscribe check shared by the bot and the API; admins are exempt"""
+    if Config.is_admin(user_id):
+        return True
+    return await membership.is_member(get_application().bot, user_id)
+
+async def check_api_membership(user_id: Optional[int]):
+    """Reject API callers acting for a Telegram user who has not joined the channel
+
+    With the force-subscribe gate on, leaving user_id out is refused
+    rather than treated as exempt.
+    """
+    if not membership.enabled:
+        return
+    if user_id is None:
+        raise HTTPException(status_code=403, detail=Config.ERROR_MESSAGES['user_id_required'])
+    if not await is_subscribed(user_id):
+        raise HTTPException(status_code=403, detail=Config.ERROR_MESSAGES['not_subscribed'])
+
+async def reply(message, text: str, **kwargs):
+    """Reply to a Telegram message through the send queue, timing the round trip"""
+    with REPLY_LATENCY.time():
+        return await send_queue.reply(message, text, **kwargs)
+
+async def edit(message, text: str, **kwargs):
+    """Edit a sent Telegram message through the send queue; queued edits coalesce"""
+    with EDIT_LATENCY.time():
+        return await send_queue.edit(message, text, **kwargs)
+
+async def start(update, context):
+    await reply(
+        update.message,
         'Welcome to Terabox Link Converter Bot!\n'
         'Send me a Terabox link to convert it for streaming.'
     )
 
-def handle_link(update, context):
+async def handle_link(update, context):
+    if update.message is None or update.effective_user is None:
+        return
+    url = update.message.text
+    if not TeraboxValidator.is_valid_terabox_url(url):
+        await reply(update.message, Config.ERROR_MESSAGES['invalid_link'])
+        return
+
+    if not await is_subscribed(update.effective_user.id):
+        await reply(update.message, Config.ERROR_MESSAGES['not_subscribed'])
+        return
+
+    share_ids = terabox.extract_share_ids(url)[:Config.MAX_BATCH_SIZE]
+    if await is_rate_limited(update.effective_user.id, max(len(share_ids), 1)):
+        await reply(update.message, Config.ERROR_MESSAGES['rate_limit'])
+        return
+
+    if len(share_ids) > 1:
+        await handle_links(update, share_ids)
+        return
+
+    message = await reply(update.message, "Processing your link...")
     try:
-        url = update.message.text
-        message = update.message.reply_text("Processing your link...")
-        
         # Convert Terabox link
-        downloader = TeraboxDownloader()
-        result = downloader.get_direct_link(url)
-        
-        # Generate player links
-        player_handler = MediaPlayerHandler()
-        mx_link = player_handler.get_player_url(result['url'], 'mxplayer', result['filename'])
-        vlc_link = player_handler.get_player_url(result['url'], 'vlc', result['filename'])
-        playit_link = player_handler.get_player_url(result['url'], 'playit', result['filename'])
-        
-        response = (
-            f"✅ Link Converted Successfully!\n\n"
-            f"📁 File: {result['filename']}\n"
-            f"📦 Size: {result['size']}\n\n"
-            f"🎬 Streaming Links:\n"
-            f"▫️ MX Player: {mx_link}\n"
-            f"▫️ VLC Player: {vlc_link}\n"
-            f"▫️ Playit: {playit_link}\n\n"
-            f"🔄 Direct Link: {result['url']}"
-        )
-        
-        message.edit_text(response, disable_web_page_preview=True)
-        
+        result = await resolve_link(url)
+        if not result:
+            await edit(message, Config.ERROR_MESSAGES['processing_error'])
+            return
+
+        await edit(message, format_link_message(result), disable_web_page_preview=True)
+
+    except asyncio.TimeoutError:
+        logger.warning(f"Conversion timed out for {url}")
+        await edit(message, Config.ERROR_MESSAGES['processing_error'])
     except Exception as e:
-        update.message.reply_text(f"Error: {str(e)}")
+        logger.error(f"Failed to handle link: {str(e)}")
+        await edit(message, f"Error: {str(e)}")
 
-def main():
-    updater = Updater(Config.BOT_TOKEN, use_context=True)
-    dp = updater.dispatcher
+async def handle_links(update, share_ids: List[str]):
+    """Convert several links from one message, replying as each one finishes"""
+    message = await reply(update.message, f"Processing {len(share_ids)} links...")
+    converted = 0
+    async for share_id, result in resolve_many(share_ids):
+        if result:
+            converted += 1
+            text = format_link_message(result)
+        else:
+            text = f"{Config.ERROR_MESSAGES['processing_error']}\n🔗 {share_id}"
+        try:
+            await reply(update.message, text, disable_web_page_preview=True)
+        except Exception as e:
+            logger.error(f"Failed to send result for share {share_id}: {str(e)}")
+    await edit(message, f"✅ Converted {converted} of {len(share_ids)} links")
+
+async def close_clients(_application):
+    """Close pooled upstream connections when the bot stops"""
+    if terabox.refresher is not None:
+        await terabox.refresher.close()
+    await terabox.close()
+
+def webhook_path() -> str:
+    """Path Telegram posts updates to, unchanged from the standalone webhook server"""
+    return f"/{Config.BOT_TOKEN}"
+
+def use_webhook() -> bool:
+    return Config.WEBHOOK and bool(Config.WEBHOOK_URL)
+
+def register_handlers(application):
+    """Attach the conversion handlers to the shared bot application"""
+    from telegram.ext import ChatMemberHandler, CommandHandler, MessageHandler, filters
 
     # Command handlers
-    dp.add_handler(CommandHandler("start", start))
-    
-    # Message handlers
-    dp.add_handler(MessageHandler(
-        Filters.text & ~Filters.command,
+    application.add_handler(CommandHandler("start", start))
+
+    # Message handlers; only new messages, since edits and channel posts carry no update.message
+    application.add_handler(MessageHandler(
+        filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND,
         handle_link
     ))
 
-    # Start the Bot
-    if Config.WEBHOOK_URL:
-        updater.start_webhook(
-            listen="0.0.0.0",
-            port=Config.PORT,
-            url_path=Config.BOT_TOKEN,
-            webhook_url=f"{Config.WEBHOOK_URL}/{Config.BOT_TOKEN}"
-        )
+    # Joins and leaves in the force-subscribe channel refresh the membership cache
+    if membership.enabled:
+        application.add_handler(ChatMemberHandler(membership.on_chat_member, ChatMemberHandler.CHAT_MEMBER))
+    application.post_shutdown = close_clients
+
+async def start_services():
+    """Open local resources that are too slow to set up at import time"""
+    if Config.CHUNK_CACHE_MAX_BYTES > 0 and stream_proxy.chunk_cache is None:
+        loop = asyncio.get_running_loop()
+        stream_proxy.chunk_cache = await loop.run_in_executor(None, lambda: ChunkCache(
+            Config.CHUNK_CACHE_DIR, Config.CHUNK_CACHE_MAX_BYTES, Config.CHUNK_CACHE_BLOCK_SIZE
+        ))
+    if ffmpeg_available() and hls.segment_cache is None:
+        loop = asyncio.get_running_loop()
+        # Segments are stored whole, one block per segment index
+        hls.segment_cache = await loop.run_in_executor(None, lambda: ChunkCache(
+            Config.HLS_CACHE_DIR, Config.HLS_CACHE_MAX_BYTES, Config.HLS_SEGMENT_MAX_BYTES
+        ))
+    if Config.REFRESH_ENABLED and terabox.refresher is None:
+        terabox.refresher = LinkRefresher.from_config(terabox)
+        terabox.refresher.start()
+
+async def start_bot():
+    """Start the bot on the server's event loop, by webhook or by polling"""
+    from telegram import Update
+    from telegram.error import TelegramError
+
+    application = get_application()
+    register_handlers(application)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    if use_webhook():
+        try:
+            await application.bot.set_webhook(
+                url=f"{Config.WEBHOOK_URL}{webhook_path()}",
+                secret_token=Config.WEBHOOK_SECRET or None,
+                # chat_member updates are only delivered when asked for
+                allowed_updates=Update.ALL_TYPES
+            )
+        except TelegramError as e:
+            # Every worker runs this; Telegram throttles all but the first
+            logger.warning(f"Could not set webhook: {str(e)}")
     else:
-        updater.start_polling()
-    
-    updater.idle()
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+    await application.start()
+
+async def stop_bot():
+    """Stop update processing and release the bot's and our clients"""
+    application = get_application()
+    if application.updater and application.updater.running:
+        await application.updater.stop()
+    if application.running:
+        await application.stop()
+    await send_queue.close()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+def main():
+    import uvicorn
+
+    # Polling must not run in more than one process
+    workers = Config.WEB_CONCURRENCY if use_webhook() else 1
+    if workers > 1:
+        logger.warning(f"Rate limits are kept per process, so each of the {workers} workers allows the full limit")
+    # Worker processes need an import string; a single process serves this
+    # module's app directly so it is never imported a second time
+    uvicorn.run(
+        "app.main:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=Config.PORT,
+        workers=workers,
+        proxy_headers=True,
+        forwarded_allow_ips=Config.TRUSTED_PROXIES
+    )
 
 app = FastAPI(title="Terabox Stream Bot with Gemini AI")
 
@@ -87,39 +382,220 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-terabox = TeraboxDownloader()
-media_handler = MediaPlayerHandler()
-gemini = GeminiHandler()
+@app.on_event("startup")
+async def startup():
+    """Explicit startup phase: local services first, then the bot"""
+    await start_services()
+    await start_bot()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the bot and close pooled upstream connections"""
+    await stop_bot()
+
+@app.post(webhook_path(), include_in_schema=False)
+async def telegram_webhook(request: Request):
+    """Hand a Telegram update to the bot without waiting for it to be handled"""
+    if Config.WEBHOOK_SECRET and request.headers.get("x-telegram-bot-api-secret-token") != Config.WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    from telegram import Update
+
+    application = get_application()
+    update = Update.de_json(await request.json(), application.bot)
+    await application.update_queue.put(update)
+    return Response(status_code=200)
+
+@app.get("/metrics")
+async def metrics():
+    """Expose counters and latency histograms in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    """Expose resolved-link, analysis and chunk cache counters"""
+    return {
+        "cache": terabox.cache_stats(),
+        "gemini": gemini.cache_stats(),
+        "chunks": stream_proxy.cache_stats(),
+        "hls": hls.cache_stats(),
+        "probes": prober.cache.stats(),
+        "telegram": send_queue.stats(),
+        "membership": membership.stats(),
+        "refresher": terabox.refresher.stats() if terabox.refresher else None
+    }
 
 class TeraboxURL(BaseModel):
     url: HttpUrl
-    analyze: bool = False  # Option to enable Gemini analysis
+    analyze: bool = False  # Option to enable content analysis
+    deep_analysis: bool = False  # Ask Gemini instead of the local analyzer
+    user_id: Optional[int] = None  # Telegram user to hold to the force-subscribe check; required while it is on
+
+class TeraboxBatch(BaseModel):
+    urls: List[HttpUrl] = Field(..., min_length=1, max_length=Config.MAX_BATCH_SIZE)
+    user_id: Optional[int] = None  # Telegram user to hold to the force-subscribe check; required while it is on
 
 @app.post("/convert")
-async def convert_link(data: TeraboxURL):
+async def convert_link(data: TeraboxURL, request: Request):
+    await check_api_rate_limit(request)
+    await check_api_membership(data.user_id)
     try:
         # Get file info from Terabox
-        file_info = await terabox.get_download_info(str(data.url))
+        file_info = await resolve_link(str(data.url))
         if not file_info:
             raise HTTPException(status_code=400, detail="Failed to process Terabox link")
+        file_info = await inspect(file_info)
 
         # Check format support
-        if not media_handler.is_supported_format(file_info['mime_type']):
+        if not media_handler.check_format_support(file_info['mime_type']):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
         # Get streaming URLs
-        stream_urls = media_handler.format_stream_urls(file_info)
+        stream_urls = media_handler.generate_stream_urls(file_info)
 
-        # If analysis is requested, use Gemini
-        if data.analyze:
-            analysis = await gemini.analyze_content(file_info)
+        # Metadata answers the routine questions; Gemini only on request
+        if data.deep_analysis:
+            analysis = await gemini.analyze_file(file_info)
             if analysis:
                 stream_urls["content_analysis"] = analysis
+        elif data.analyze:
+            stream_urls["content_analysis"] = MediaAnalyzer.analyze(file_info)
 
         return stream_urls
 
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out processing Terabox link")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-        
+
+def format_batch_result(share_id: str, result: Optional[Dict]) -> str:
+    """Render one batch result as an NDJSON line"""
+    if not result:
+        body = ResponseFormatter.format_response(False, error="Failed to process Terabox link")
+    elif not media_handler.check_format_support(result['mime_type']):
+        body = ResponseFormatter.format_response(False, error="Unsupported file format")
+    else:
+        body = ResponseFormatter.format_response(True, data=media_handler.generate_stream_urls(result))
+    body["share_id"] = share_id
+    return json.dumps(body) + "\n"
+
+@app.post("/convert/playlist")
+async def convert_playlist(data: TeraboxBatch, request: Request):
+    """Convert many links into a single M3U playlist"""
+    share_ids = terabox.extract_share_ids(" ".join(str(url) for url in data.urls))
+    if not share_ids:
+        raise HTTPException(status_code=400, detail="No valid Terabox links found")
+    await check_api_rate_limit(request, len(share_ids))
+    await check_api_membership(data.user_id)
+
+    resolved = {share_id: result async for share_id, result in resolve_many(share_ids) if result}
+    files = [resolved[share_id] for share_id in share_ids if share_id in resolved]
+    if not files:
+        raise HTTPException(status_code=400, detail="Failed to process Terabox links")
+    return PlainTextResponse(
+        media_handler.generate_playlist(files),
+        media_type="audio/x-mpegurl",
+        headers={"Content-Disposition": 'attachment; filename="playlist.m3u"'}
+    )
+
+@app.post("/convert/batch")
+async def convert_batch(data: TeraboxBatch, request: Request):
+    """Convert many links, streaming one NDJSON line per link as it resolves"""
+    share_ids = terabox.extract_share_ids(" ".join(str(url) for url in data.urls))
+    if not share_ids:
+        raise HTTPException(status_code=400, detail="No valid Terabox links found")
+    await check_api_rate_limit(request, len(share_ids))
+    await check_api_membership(data.user_id)
+
+    async def results():
+        async for share_id, result in resolve_many(share_ids):
+            yield format_batch_result(share_id, result)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.get("/share/{share_id}/files")
+async def list_share_files(share_id: str, request: Request, dir: Optional[str] = None, recursive: bool = True):
+    """Stream the entries of a share folder as NDJSON, one line per entry"""
+    await check_api_rate_limit(request)
+
+    async def entries():
+        try:
+            async for entry in terabox.iter_share_files(share_id, dir, recursive):
+                yield json.dumps(entry) + "\n"
+        except Exception as e:
+            logger.error(f"Share listing error for {share_id}: {str(e)}")
+            yield json.dumps(ResponseFormatter.format_response(False, error="Failed to list share")) + "\n"
+
+    return StreamingResponse(entries(), media_type="application/x-ndjson")
+
+@app.get("/share/{share_id}/files/{fs_id}")
+async def convert_share_file(share_id: str, fs_id: str, request: Request, user_id: Optional[int] = None):
+    """Resolve one selected file of a share folder to player links"""
+    await check_api_rate_limit(request)
+    await check_api_membership(user_id)
+    try:
+        file_info = await resolve_share(entry_key(share_id, fs_id))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out processing Terabox link")
+    if not file_info:
+        raise HTTPException(status_code=404, detail="File not found in share")
+    file_info = await inspect(file_info)
+    if not media_handler.check_format_support(file_info['mime_type']):
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+    return media_handler.generate_stream_urls(file_info)
+
+@app.api_route("/stream/{share_id}", methods=["GET", "HEAD"])
+async def stream_file(share_id: str, request: Request):
+    """Proxy a resolved file to players with HTTP Range support"""
+    await check_media_rate_limit(request)
+    try:
+        stream = await stream_proxy.open(
+            share_id,
+            request.headers.get("range"),
+            with_body=request.method == "GET",
+            client=request.client.host if request.client else None
+        )
+    except RangeNotSatisfiable as e:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{e.size}"})
+    except FileTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except TeraboxError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Failed to process Terabox link")
+    if stream.body is None:
+        return Response(status_code=stream.status, headers=stream.headers)
+    return StreamingResponse(stream.body, status_code=stream.status, headers=stream.headers)
+
+@app.get("/hls/{share_id}/index.m3u8")
+async def hls_playlist(share_id: str, request: Request):
+    """VOD playlist whose segments are remuxed when first requested"""
+    if not ffmpeg_available():
+        raise HTTPException(status_code=404, detail="HLS is not enabled")
+    # The first request for a file runs ffprobe over it
+    await check_media_rate_limit(request, 1 if hls.probes.get(share_id) else Config.HLS_REMUX_COST)
+    try:
+        playlist = await hls.playlist(share_id)
+    except TeraboxError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return PlainTextResponse(playlist, media_type="application/vnd.apple.mpegurl")
+
+@app.get("/hls/{share_id}/{index}.ts")
+async def hls_segment(share_id: str, index: int, request: Request):
+    """One MPEG-TS segment, from the segment cache or a fresh ffmpeg run"""
+    if not ffmpeg_available():
+        raise HTTPException(status_code=404, detail="HLS is not enabled")
+    cached = hls.segment_cache is not None and hls.segment_cache.has(share_id, index)
+    await check_media_rate_limit(request, 1 if cached else Config.HLS_REMUX_COST)
+    try:
+        segment = await hls.segment(share_id, index)
+    except TeraboxError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if segment is None:
+        raise HTTPException(status_code=404, detail="Segment out of range")
+    return Response(segment, media_type="video/mp2t", headers={"Cache-Control": "public, max-age=86400"})
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the Terabox Converter Bot
+
+Run from the repository root, e.g. python -m benchmarks.bench_url_recognizer
+"""
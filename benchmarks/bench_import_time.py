@@ -0,0 +1,68 @@
+"""
+Startup benchmark: import cost per module
+
+Imports each entry point in a fresh interpreter under -X importtime and
+reports wall-clock time plus the modules with the largest cumulative
+import cost. Placeholder credentials are injected so Config can load
+without a real .env; nothing here talks to the network.
+
+Usage: python -m benchmarks.bench_import_time [--top N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ('app', 'utils.terabox', 'utils.gemini_ai', 'app.main')
+
+PLACEHOLDER_ENV = {
+    'BOT_TOKEN': '123456:placeholder',
+    'GEMINI_API_KEY': 'placeholder',
+    'CHANNEL_ID': '0',
+    'OWNER_ID': '0',
+    'ADMIN_IDS': '',
+    'PORT': '8080'
+}
+
+def import_profile(module: str) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """Return wall-clock seconds and (self µs, cumulative µs, name) per imported module"""
+    env = {**os.environ, **PLACEHOLDER_ENV}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((int(self_us), int(cumulative_us), name.strip()))
+    return elapsed, modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--top', type=int, default=10, help='modules listed per entry point')
+    args = parser.parse_args()
+
+    for module in ENTRY_POINTS:
+        elapsed, modules = import_profile(module)
+        own = next((cumulative for _, cumulative, name in modules if name == module), 0)
+        print(f"{module}: {own / 1000:.1f} ms to import, {elapsed * 1000:.0f} ms interpreter wall-clock")
+        for self_us, cumulative_us, name in sorted(modules, key=lambda m: m[1], reverse=True)[1:args.top + 1]:
+            print(f"    {cumulative_us / 1000:>8.1f} ms  {self_us / 1000:>7.1f} ms self  {name}")
+        heavy = [name for name in ('telegram', 'google.generativeai', 'uvicorn', 'flask')
+                 if any(imported == name for _, _, imported in modules)]
+        print(f"    deferred-only packages imported: {', '.join(heavy) or 'none'}\n")
+
+if __name__ == '__main__':
+    main()
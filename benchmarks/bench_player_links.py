@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: batch rendering of player links
+
+Compares the previous MediaPlayerHandler.generate_stream_urls body, which
+formatted and quoted per player, with the precompiled PlayerLinkRenderer
+that quotes once per file and renders every configured player in one pass.
+
+Usage: python -m benchmarks.bench_player_links
+"""
+
+import os
+import timeit
+from typing import Dict, List
+from urllib.parse import quote
+
+from benchmarks.bench_import_time import PLACEHOLDER_ENV
+
+# Config loads app/.env, which ships values that do not parse
+os.environ.update(PLACEHOLDER_ENV)
+
+from app.config import Config
+from utils.player_links import PlayerLinkRenderer
+
+def legacy_generate_stream_urls(file_info: Dict) -> Dict:
+    filename = quote(file_info['filename'])
+    direct_url = quote(file_info['direct_url'])
+    return {
+        "vlc": f"vlc://{direct_url}",
+        "mx_player": (
+            f"intent:{direct_url}#Intent;"
+            f"package=com.mxtech.videoplayer.ad;"
+            f"S.title={filename};end"
+        ),
+        "playit": f"playit://{direct_url}"
+    }
+
+def build_files(count: int) -> List[Dict]:
+    return [
+        {
+            "filename": f"Episode {i:03d} [1080p] (Dual Audio).mkv",
+            "direct_url": (
+                f"https://d.terabox.com/file/{i:032x}?fid=4398046511104-250528-{i}"
+                f"&time=1735550000&rt=sh&sign=FDTAER-DCb740ccc5511e5e8fedcff06b081203-{i}"
+                f"&expires=8h&chkv=0&chkbd=0&chkpc=&dp-logid=8712361&dp-callid=0&r=123456"
+            )
+        }
+        for i in range(count)
+    ]
+
+def report(name: str, func, number: int, per: int):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{name:<40} {best / number / per * 1e6:>8.2f} µs/file")
+
+def main():
+    files = build_files(1000)
+    renderer = PlayerLinkRenderer(Config.PLAYER_TEMPLATES)
+    legacy_three = PlayerLinkRenderer({
+        name: Config.PLAYER_TEMPLATES[name] for name in ('vlc', 'mx_player', 'playit')
+    })
+
+    print(f"{len(files)} files, {len(renderer.templates)} players configured\n")
+    report(
+        "legacy generate_stream_urls (3 players)",
+        lambda: [legacy_generate_stream_urls(f) for f in files], 20, len(files)
+    )
+    report(
+        "renderer (3 players)",
+        lambda: [legacy_three.render_all(f['direct_url'], f['filename']) for f in files], 20, len(files)
+    )
+    report(
+        f"renderer ({len(renderer.templates)} players)",
+        lambda: [renderer.render_all(f['direct_url'], f['filename']) for f in files], 20, len(files)
+    )
+    report(
+        "m3u playlist",
+        lambda: renderer.render_playlist((f['filename'], f['direct_url']) for f in files), 20, len(files)
+    )
+
+if __name__ == '__main__':
+    main()
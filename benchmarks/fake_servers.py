@@ -0,0 +1,239 @@
+"""
+Local stand-ins for the Terabox and Telegram Bot APIs
+
+FakeTerabox serves /api/share/list (paginated, with folders), the dlink
+redirect and ranged file downloads, with configurable latency, error and
+throttle rates. FakeTelegram answers the Bot API methods the bot calls and
+records when each one arrived. Both run on aiohttp and need no network.
+
+Usage: python -m benchmarks.fake_servers [--terabox-port N] [--telegram-port N]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# 1 MB block the fake files repeat; it opens like a real MP4 (ftyp, then mdat to EOF)
+MP4_HEADER = b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isommp41" + b"\x00\x00\x00\x00mdat"
+PATTERN = (MP4_HEADER + bytes(range(256)) * 4096)[:1048576]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def file_bytes(start: int, end: int) -> bytes:
+    """Content of every fake file between start and end inclusive"""
+    offset = start % len(PATTERN)
+    length = end - start + 1
+    data = PATTERN[offset:offset + length]
+    while len(data) < length:
+        data += PATTERN[:length - len(data)]
+    return data
+
+class FakeServer:
+    """aiohttp application bound to a local port"""
+
+    def __init__(self, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.app = web.Application()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+class FakeTerabox(FakeServer):
+    """Terabox share API with tunable latency, failures and throttling
+
+    Share IDs starting with "dir" are folders of files_per_share files, one
+    level deep; every other share holds a single file of file_size bytes.
+    """
+
+    def __init__(self, port: Optional[int] = None, latency: float = 0.02, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, file_size: int = 8 * 1024 * 1024,
+                 files_per_share: int = 250, seed: int = 1):
+        super().__init__(port)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.file_size = file_size
+        self.files_per_share = files_per_share
+        self.random = random.Random(seed)
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.bytes_sent = 0
+        self.app.router.add_get('/api/share/list', self.share_list)
+        self.app.router.add_route('HEAD', '/dlink/{share_id}/{fs_id}', self.dlink)
+        self.app.router.add_get('/file/{share_id}/{fs_id}', self.download)
+
+    async def _delay(self):
+        if self.latency:
+            # Exponential jitter gives the long tail real upstreams have
+            await asyncio.sleep(self.random.expovariate(1 / self.latency))
+
+    def _fault(self) -> Optional[web.Response]:
+        roll = self.random.random()
+        if roll < self.error_rate:
+            return web.Response(status=503)
+        if roll < self.error_rate + self.throttle_rate:
+            return web.json_response({"errno": 31034, "errmsg": "too frequent"})
+        return None
+
+    def _entry(self, share_id: str, fs_id: int, name: str, path: str, is_dir: bool = False) -> Dict:
+        return {
+            "fs_id": fs_id,
+            "server_filename": name,
+            "filename": name,
+            "path": path,
+            "isdir": 1 if is_dir else 0,
+            "size": 0 if is_dir else self.file_size,
+            "dlink": f"http://{self.host}/dlink/{share_id}/{fs_id}"
+        }
+
+    def _listing(self, share_id: str, directory: str) -> List[Dict]:
+        if not share_id.startswith("dir"):
+            return [self._entry(share_id, 1, f"{share_id}.mp4", f"/{share_id}.mp4")]
+        if not directory:
+            return [self._entry(share_id, 1, "extras", "/extras", is_dir=True)] + [
+                self._entry(share_id, 100 + index, f"episode-{index:04d}.mkv", f"/episode-{index:04d}.mkv")
+                for index in range(self.files_per_share)
+            ]
+        return [self._entry(share_id, 2, "trailer.mp4", f"{directory}/trailer.mp4")]
+
+    async def share_list(self, request: web.Request) -> web.Response:
+        self.requests["share_list"] += 1
+        await self._delay()
+        fault = self._fault()
+        if fault is not None:
+            return fault
+        share_id = request.query.get("shareid", "")
+        page = int(request.query.get("page", 1))
+        num = int(request.query.get("num", 100))
+        entries = self._listing(share_id, request.query.get("dir", ""))
+        return web.json_response({"errno": 0, "list": entries[(page - 1) * num:page * num]})
+
+    async def dlink(self, request: web.Request) -> web.Response:
+        self.requests["dlink"] += 1
+        await self._delay()
+        if self.random.random() < self.error_rate:
+            return web.Response(status=503)
+        share_id, fs_id = request.match_info["share_id"], request.match_info["fs_id"]
+        location = f"http://{self.host}/file/{share_id}/{fs_id}?time={int(time.time())}&expires=8h"
+        return web.Response(status=302, headers={"Location": location})
+
+    async def download(self, request: web.Request) -> web.StreamResponse:
+        self.requests["download"] += 1
+        start, end = 0, self.file_size - 1
+        status = 200
+        header = request.headers.get("Range")
+        if header:
+            first, last = header.split("=", 1)[1].split("-", 1)
+            start = int(first)
+            end = min(int(last), self.file_size - 1) if last else self.file_size - 1
+            status = 206
+        response = web.StreamResponse(status=status, headers={
+            "Content-Type": "video/mp4",
+            "Content-Length": str(end - start + 1),
+            "Accept-Ranges": "bytes"
+        })
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{self.file_size}"
+        await response.prepare(request)
+        position = start
+        while position <= end:
+            chunk_end = min(position + 262144, end + 1) - 1
+            chunk = file_bytes(position, chunk_end)
+            await response.write(chunk)
+            self.bytes_sent += len(chunk)
+            position = chunk_end + 1
+        await response.write_eof()
+        return response
+
+class FakeTelegram(FakeServer):
+    """Telegram Bot API that acknowledges every call and records its arrival
+
+    Point the bot at it with TELEGRAM_API_URL=http://<host>/bot.
+    """
+
+    def __init__(self, port: Optional[int] = None, latency: float = 0.005):
+        super().__init__(port)
+        self.latency = latency
+        self.calls: List[Tuple[float, str, Dict]] = []
+        self._message_id = 0
+        self.app.router.add_post('/bot{token}/{method}', self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            payload = await request.json()
+        else:
+            payload = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append((time.perf_counter(), method, payload))
+        return web.json_response({"ok": True, "result": self._result(method, payload)})
+
+    def _result(self, method: str, payload: Dict):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            chat_id = int(payload.get("chat_id", 0))
+            return {
+                "message_id": int(payload.get("message_id") or self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": payload.get("text", "")
+            }
+        if method == "getUpdates":
+            return []
+        return True
+
+    def calls_for(self, method: str) -> List[Tuple[float, Dict]]:
+        return [(at, payload) for at, name, payload in self.calls if name == method]
+
+async def serve(terabox_port: int, telegram_port: int):
+    terabox = FakeTerabox(terabox_port)
+    telegram = FakeTelegram(telegram_port)
+    await terabox.start()
+    await telegram.start()
+    print(json.dumps({
+        "TERABOX_API_HOSTS": terabox.host,
+        "TERABOX_API_SCHEME": "http",
+        "TELEGRAM_API_URL": f"http://{telegram.host}/bot"
+    }, indent=2))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await terabox.stop()
+        await telegram.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake Terabox and Telegram servers")
+    parser.add_argument('--terabox-port', type=int, default=8701)
+    parser.add_argument('--telegram-port', type=int, default=8702)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.terabox_port, args.telegram_port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
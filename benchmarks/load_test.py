@@ -0,0 +1,359 @@
+"""
+Load scenarios against the full app, offline
+
+Starts FakeTerabox and FakeTelegram, points the app at them through the
+environment, serves app.main:app with uvicorn in-process and runs:
+
+  single_link   sequential conversions through TeraboxDownloader, cold then warm
+  viral_burst   many concurrent conversions of one share (single-flight)
+  player_links  MediaPlayerHandler.generate_stream_urls throughput
+  convert_api   concurrent POST /convert for distinct shares
+  batch         POST /convert/batch with MAX_BATCH_SIZE links
+  streaming     concurrent GET /stream downloads, ranged and whole-file
+  bot_webhook   Telegram updates posted to the webhook until the reply edit
+
+Each scenario reports p50/p95/p99 latency, throughput and process RSS.
+bot_webhook sends are paced by the send queue at Telegram's real ceiling;
+set TELEGRAM_GLOBAL_RATE and TELEGRAM_GLOBAL_BURST higher in the
+environment to measure the pipeline without it.
+
+Usage: python -m benchmarks.load_test [--scenario NAME ...] [--requests N]
+       [--concurrency N] [--latency S] [--error-rate R] [--throttle-rate R] [--json FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.fake_servers import FakeTelegram, FakeTerabox, free_port
+
+BOT_TOKEN = '123456:bench'
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def rss_mb() -> float:
+    """Current resident set size, or the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class Result:
+    """Latencies and errors of one scenario"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self.extra: Dict[str, float] = {}
+
+    def summary(self) -> Dict:
+        count = len(self.latencies)
+        return {
+            "scenario": self.name,
+            "ok": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(self.latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 2),
+            "throughput_per_s": round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            "rss_mb": round(rss_mb(), 1),
+            **self.extra
+        }
+
+async def run_load(result: Result, total: int, concurrency: int, operation: Callable[[int], Awaitable[bool]]):
+    """Run operation(0..total-1) with bounded concurrency, timing each call"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await operation(index)
+            except Exception:
+                ok = False
+            if ok:
+                result.latencies.append(time.perf_counter() - started)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    result.elapsed = time.perf_counter() - started
+
+def configure_environment(terabox: FakeTerabox, telegram: FakeTelegram, api_port: int, chunk_cache: bool):
+    """Point Config at the fakes; must run before anything imports app"""
+    base_url = f"http://127.0.0.1:{api_port}"
+    os.environ.update({
+        'BOT_TOKEN': BOT_TOKEN,
+        'GEMINI_API_KEY': 'bench',
+        'CHANNEL_ID': '0',
+        'OWNER_ID': '0',
+        'ADMIN_IDS': '',
+        'PORT': str(api_port),
+        'WEBHOOK': 'True',
+        'WEBHOOK_URL': base_url,
+        'STREAM_BASE_URL': base_url,
+        'TERABOX_API_HOSTS': terabox.host,
+        'TERABOX_API_SCHEME': 'http',
+        'TELEGRAM_API_URL': f"http://{telegram.host}/bot",
+        'LINK_STORE': 'False',
+        'MAX_REQUESTS': str(10 ** 9),
+        'CHUNK_CACHE_MAX_BYTES': os.environ.get('CHUNK_CACHE_MAX_BYTES', '2147483648') if chunk_cache else '0'
+    })
+
+class Bench:
+    """Shared state of one load-test run"""
+
+    def __init__(self, args, terabox: FakeTerabox, telegram: FakeTelegram, api_port: int):
+        self.args = args
+        self.terabox = terabox
+        self.telegram = telegram
+        self.base_url = f"http://127.0.0.1:{api_port}"
+        self.session: Optional[aiohttp.ClientSession] = None
+        import app.main
+        self.main = app.main
+
+    def share_url(self, share_id: str) -> str:
+        return f"https://www.terabox.com/s/{share_id}"
+
+    async def single_link(self) -> List[Result]:
+        downloader = self.main.terabox
+        results = []
+        for label in ("cold", "warm"):
+            result = Result(f"single_link_{label}")
+            await run_load(
+                result, self.args.requests, 1,
+                lambda index: self._converted(downloader.process_share(f"1single{index}"))
+            )
+            results.append(result)
+        return results
+
+    async def viral_burst(self) -> List[Result]:
+        downloader = self.main.terabox
+        result = Result("viral_burst")
+        before = self.terabox.requests["share_list"]
+        rounds = 5
+        started = time.perf_counter()
+        for round_number in range(rounds):
+            downloader.invalidate("1viral")
+            burst = Result("burst")
+            await run_load(
+                burst, self.args.requests, self.args.requests,
+                lambda index: self._converted(downloader.process_share("1viral"))
+            )
+            result.latencies.extend(burst.latencies)
+            result.errors += burst.errors
+        result.elapsed = time.perf_counter() - started
+        result.extra["upstream_list_calls"] = self.terabox.requests["share_list"] - before
+        return [result]
+
+    async def player_links(self) -> List[Result]:
+        handler = self.main.media_handler
+        file_info = await self.main.terabox.process_share("1players")
+        result = Result("player_links")
+        count = self.args.requests * 100
+        started = time.perf_counter()
+        for _ in range(count):
+            tick = time.perf_counter()
+            handler.generate_stream_urls(file_info)
+            result.latencies.append(time.perf_counter() - tick)
+        result.elapsed = time.perf_counter() - started
+        return [result]
+
+    async def convert_api(self) -> List[Result]:
+        result = Result("convert_api")
+
+        async def convert(index: int) -> bool:
+            async with self.session.post(
+                f"{self.base_url}/convert", json={"url": self.share_url(f"1api{index}")}
+            ) as response:
+                await response.read()
+                return response.status == 200
+
+        await run_load(result, self.args.requests, self.args.concurrency, convert)
+        return [result]
+
+    async def batch(self) -> List[Result]:
+        result = Result("batch")
+        size = self.main.Config.MAX_BATCH_SIZE
+        rounds = max(self.args.requests // size, 1)
+
+        async def convert_batch(index: int) -> bool:
+            urls = [self.share_url(f"1batch{index}x{item}") for item in range(size)]
+            async with self.session.post(f"{self.base_url}/convert/batch", json={"urls": urls}) as response:
+                lines = [line async for line in response.content if line.strip()]
+                return response.status == 200 and len(lines) == size
+
+        await run_load(result, rounds, min(self.args.concurrency, rounds), convert_batch)
+        result.extra["links_per_s"] = round(rounds * size / result.elapsed, 1) if result.elapsed else 0.0
+        return [result]
+
+    async def streaming(self) -> List[Result]:
+        results = []
+        await self.main.terabox.process_share("1stream")
+        file_size = self.terabox.file_size
+        for label, headers in (("streaming_range", {"Range": "bytes=1048576-3145727"}), ("streaming_full", {})):
+            result = Result(label)
+            first_bytes: List[float] = []
+            received = [0]
+
+            async def stream(index: int, headers=headers) -> bool:
+                started = time.perf_counter()
+                async with self.session.get(f"{self.base_url}/stream/1stream", headers=headers) as response:
+                    first = True
+                    async for chunk in response.content.iter_chunked(262144):
+                        if first:
+                            first_bytes.append(time.perf_counter() - started)
+                            first = False
+                        received[0] += len(chunk)
+                    return response.status in (200, 206)
+
+            total = max(self.args.concurrency // 4, 4)
+            await run_load(result, total, total, stream)
+            result.extra["ttfb_p50_ms"] = round(percentile(first_bytes, 0.5) * 1000, 2)
+            result.extra["mb_per_s"] = round(received[0] / 1048576 / result.elapsed, 1) if result.elapsed else 0.0
+            result.extra["file_mb"] = round(file_size / 1048576, 1)
+            results.append(result)
+        return results
+
+    async def bot_webhook(self) -> List[Result]:
+        result = Result("bot_webhook")
+        total = self.args.requests
+        first_chat = 100000
+        posted: Dict[int, float] = {}
+        sent_before = len(self.telegram.calls)
+
+        async def post(index: int) -> bool:
+            chat_id = first_chat + index
+            update = {
+                "update_id": chat_id,
+                "message": {
+                    "message_id": 1,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": "bench"},
+                    "text": self.share_url(f"1bot{index}")
+                }
+            }
+            posted[chat_id] = time.perf_counter()
+            async with self.session.post(f"{self.base_url}/{BOT_TOKEN}", json=update) as response:
+                return response.status == 200
+
+        started = time.perf_counter()
+        await run_load(Result("post"), total, self.args.concurrency, post)
+        deadline = time.perf_counter() + 60
+        while time.perf_counter() < deadline:
+            edits = {
+                int(payload.get("chat_id", 0)): at
+                for at, payload in self.telegram.calls_for("editMessageText")
+            }
+            if all(chat_id in edits for chat_id in posted):
+                break
+            await asyncio.sleep(0.05)
+        result.elapsed = time.perf_counter() - started
+        for chat_id, at in posted.items():
+            if chat_id in edits:
+                result.latencies.append(edits[chat_id] - at)
+            else:
+                result.errors += 1
+        result.extra["bot_api_calls"] = len(self.telegram.calls) - sent_before
+        return [result]
+
+    @staticmethod
+    async def _converted(call: Awaitable[Optional[Dict]]) -> bool:
+        return bool(await call)
+
+SCENARIOS = ('single_link', 'viral_burst', 'player_links', 'convert_api', 'batch', 'streaming', 'bot_webhook')
+
+async def run(args) -> List[Dict]:
+    terabox = FakeTerabox(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        file_size=args.file_mb * 1024 * 1024
+    )
+    telegram = FakeTelegram()
+    api_port = free_port()
+    configure_environment(terabox, telegram, api_port, args.chunk_cache)
+    await terabox.start()
+    await telegram.start()
+
+    import uvicorn
+    bench = Bench(args, terabox, telegram, api_port)
+    server = uvicorn.Server(uvicorn.Config(
+        bench.main.app, host="127.0.0.1", port=api_port, log_level="warning", access_log=False
+    ))
+    serving = asyncio.ensure_future(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+
+    summaries = []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            bench.session = session
+            for name in args.scenario or SCENARIOS:
+                for result in await getattr(bench, name)():
+                    summary = result.summary()
+                    summaries.append(summary)
+                    print(format_summary(summary), flush=True)
+    finally:
+        server.should_exit = True
+        await serving
+        await terabox.stop()
+        await telegram.stop()
+    return summaries
+
+def format_summary(summary: Dict) -> str:
+    extra = {key: value for key, value in summary.items() if key not in (
+        "scenario", "ok", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "rss_mb"
+    )}
+    line = (
+        f"{summary['scenario']:<18} ok={summary['ok']:<6} err={summary['errors']:<4} "
+        f"p50={summary['p50_ms']:>8.2f}ms p95={summary['p95_ms']:>8.2f}ms p99={summary['p99_ms']:>8.2f}ms "
+        f"{summary['throughput_per_s']:>9.1f}/s rss={summary['rss_mb']:.0f}MB"
+    )
+    if extra:
+        line += "  " + " ".join(f"{key}={value}" for key, value in extra.items())
+    return line
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load scenarios against fake Terabox and Telegram servers")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='run only these (repeatable)')
+    parser.add_argument('--requests', type=int, default=200, help='operations per scenario')
+    parser.add_argument('--concurrency', type=int, default=50, help='operations in flight')
+    parser.add_argument('--latency', type=float, default=0.02, help='mean fake Terabox latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of fake Terabox 503s')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of throttled API answers')
+    parser.add_argument('--file-mb', type=int, default=8, help='size of the fake files')
+    parser.add_argument('--chunk-cache', action='store_true', help='enable the disk chunk cache')
+    parser.add_argument('--json', help='also write the summaries to this file')
+    args = parser.parse_args()
+
+    summaries = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(summaries, handle, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+# app/.env ships placeholder values that do not parse, and load_dotenv
+# never overrides variables already set, so pin usable ones first
+os.environ.update({
+    'BOT_TOKEN': '123456:placeholder',
+    'GEMINI_API_KEY': 'placeholder',
+    'CHANNEL_ID': '0',
+    'OWNER_ID': '0',
+    'ADMIN_IDS': '',
+    'PORT': '8080',
+    'LINK_STORE': 'False'
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_app_imports_without_loading_gemini():
+    # A fresh interpreter, so modules other tests imported do not hide a failure
+    script = (
+        "import sys, app.main, utils.gemini_ai; "
+        "assert 'google.generativeai' not in sys.modules, 'genai imported eagerly'"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, env=dict(os.environ),
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,13 @@
+import asyncio
+from utils.chunk_cache import ChunkCache
+
+def test_stray_files_do_not_break_startup(tmp_path):
+    cache = ChunkCache(str(tmp_path), max_bytes=1024, block_size=16)
+    asyncio.run(cache.write("42", 0, b"x" * 16))
+    (tmp_path / "42" / "notes.blk").write_bytes(b"junk")
+    (tmp_path / "42" / "1.blk.partial").write_bytes(b"junk")
+    (tmp_path / "stray.txt").write_bytes(b"junk")
+
+    reloaded = ChunkCache(str(tmp_path), max_bytes=1024, block_size=16)
+    assert reloaded.has("42", 0)
+    assert reloaded.current_bytes == 16
@@ -0,0 +1,74 @@
+import asyncio
+import re
+from types import SimpleNamespace
+from app.config import Config
+from utils.gemini_ai import GeminiAI
+
+class FakeModel:
+    """Answers every prompt, batched or not, and records the calls"""
+
+    def __init__(self, delay=0.01, skip=()):
+        self.prompts = []
+        self.delay = delay
+        self.skip = set(skip)
+
+    async def generate_content_async(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        names = re.findall(r"File (\d+): (\S+)", prompt)
+        if not names:
+            name = re.search(r"Filename: (\S+)", prompt).group(1)
+            return SimpleNamespace(text=f"single: {name}")
+        return SimpleNamespace(text="\n".join(
+            f"### FILE {index}\nbatch: {name}" for index, name in names if name not in self.skip
+        ))
+
+def file_info(name):
+    return {"filename": name, "size": 1024, "mime_type": "video/mp4"}
+
+def analyze_all(gemini, infos):
+    async def run():
+        return await asyncio.gather(*[gemini.analyze_file(info) for info in infos])
+    return asyncio.run(run())
+
+def test_analyses_in_one_window_share_one_call(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_BATCH_WINDOW", 0.05)
+    monkeypatch.setattr(Config, "GEMINI_BATCH_SIZE", 8)
+    model = FakeModel()
+    gemini = GeminiAI(client=model)
+    infos = [file_info(f"movie{i}.mp4") for i in range(5)]
+
+    results = analyze_all(gemini, infos)
+    assert len(model.prompts) == 1
+    assert [r["analysis"] for r in results] == [f"batch: movie{i}.mp4" for i in range(5)]
+
+    # The same files again are answered from the cache
+    again = analyze_all(gemini, infos)
+    assert len(model.prompts) == 1
+    assert again == results
+    assert gemini.cache_stats()["hits"] == 5
+
+def test_full_batch_is_sent_without_waiting_for_the_window(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_BATCH_WINDOW", 60)
+    monkeypatch.setattr(Config, "GEMINI_BATCH_SIZE", 2)
+    model = FakeModel()
+    gemini = GeminiAI(client=model)
+    results = analyze_all(gemini, [file_info("a.mp4"), file_info("b.mp4")])
+    assert len(model.prompts) == 1
+    assert all(result is not None for result in results)
+
+def test_identical_requests_coalesce(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_BATCH_WINDOW", 0)
+    model = FakeModel()
+    gemini = GeminiAI(client=model)
+    results = analyze_all(gemini, [file_info("same.mp4")] * 5)
+    assert len(model.prompts) == 1
+    assert {r["analysis"] for r in results} == {"single: same.mp4"}
+
+def test_file_missing_from_batch_answer_is_asked_alone(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_BATCH_WINDOW", 0.05)
+    model = FakeModel(skip={"b.mp4"})
+    gemini = GeminiAI(client=model)
+    results = analyze_all(gemini, [file_info("a.mp4"), file_info("b.mp4")])
+    assert len(model.prompts) == 2
+    assert [r["analysis"] for r in results] == ["batch: a.mp4", "single: b.mp4"]
@@ -0,0 +1,43 @@
+import asyncio
+from utils.hls import HLSRemuxer, plan_segments
+
+def test_fixed_segments_without_keyframes():
+    assert plan_segments(20, 6) == [0, 6, 12, 18]
+
+def test_segments_start_on_keyframes():
+    keyframes = [0.0, 2.5, 5.0, 7.5, 10.0, 12.5, 15.0]
+    assert plan_segments(16, 6, keyframes) == [0.0, 7.5, 15.0]
+
+def test_playlist_lengths_match_keyframe_cuts():
+    info = {"duration": 16.0, "starts": [0.0, 7.5, 15.0]}
+    assert [HLSRemuxer._bounds(info, index) for index in range(3)] == [(0.0, 7.5), (7.5, 7.5), (15.0, 1.0)]
+
+class FakeSegmentCache:
+    block_size = 1024
+
+    def has(self, share_id, index):
+        return False
+
+def test_prefetch_task_is_held_until_done():
+    remuxer = HLSRemuxer(segment_cache=FakeSegmentCache())
+    fetched = []
+
+    async def probe(share_id):
+        return {"duration": 12.0, "starts": [0.0, 6.0]}
+
+    async def cached_segment(share_id, index, info):
+        fetched.append(index)
+        return b"segment"
+
+    remuxer.probe = probe
+    remuxer._cached_segment = cached_segment
+
+    async def run():
+        assert await remuxer.segment("share", 0) == b"segment"
+        assert len(remuxer._prefetches) == 1
+        await asyncio.gather(*remuxer._prefetches)
+        await asyncio.sleep(0)
+        assert not remuxer._prefetches
+
+    asyncio.run(run())
+    assert fetched == [0, 1]
@@ -0,0 +1,21 @@
+import pytest
+from utils.metrics import Metric, Registry
+from utils.rate_limiter import RateLimitBackend
+from utils.storage import StorageBackend
+
+@pytest.mark.parametrize("interface", [RateLimitBackend, StorageBackend])
+def test_incomplete_backend_fails_on_creation(interface):
+    class Incomplete(interface):
+        async def connect(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_incomplete_metric_fails_on_creation():
+    class Incomplete(Metric):
+        def render(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "Missing _new_child", registry=Registry())
@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+import app.main as main
+from app.config import Config
+from utils.hls import INTERNAL_TOKEN_HEADER, internal_token
+from utils.rate_limiter import RateLimiter
+
+def request(client="203.0.113.7", headers=()):
+    return Request({
+        "type": "http",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "client": (client, 40000)
+    })
+
+def test_media_requests_are_rate_limited(monkeypatch):
+    monkeypatch.setattr(main, "media_rate_limiter", RateLimiter(max_requests=12, window=60))
+
+    async def run():
+        await main.check_media_rate_limit(request(), Config.HLS_REMUX_COST)
+        await main.check_media_rate_limit(request())
+        await main.check_media_rate_limit(request())
+        with pytest.raises(HTTPException) as error:
+            await main.check_media_rate_limit(request())
+        assert error.value.status_code == 429
+        # Another client has its own budget, and ffmpeg's own reads are free
+        await main.check_media_rate_limit(request("198.51.100.1"))
+        for _ in range(20):
+            await main.check_media_rate_limit(request(headers=[(INTERNAL_TOKEN_HEADER, internal_token())]))
+        with pytest.raises(HTTPException):
+            await main.check_media_rate_limit(request(headers=[(INTERNAL_TOKEN_HEADER, "guess")]))
+
+    asyncio.run(run())
+
+def test_forwarded_header_does_not_change_the_api_key(monkeypatch):
+    keys = []
+
+    class Recorder:
+        async def allow(self, key, cost):
+            keys.append(key)
+            return True
+
+    monkeypatch.setattr(main, "rate_limiter", Recorder())
+    asyncio.run(main.check_api_rate_limit(request(headers=[("X-Forwarded-For", "9.9.9.9")])))
+    assert keys == ["api:203.0.113.7"]
+
+def test_conversion_timeout_covers_waiting_for_a_slot(monkeypatch):
+    monkeypatch.setattr(Config, "CONVERSION_TIMEOUT", 0.1)
+    monkeypatch.setattr(main, "_conversion_slots", None)
+    monkeypatch.setattr(Config, "MAX_CONCURRENT_CONVERSIONS", 1)
+    release = None
+
+    async def process_share(share_id):
+        await release.wait()
+        return {"share_id": share_id}
+
+    monkeypatch.setattr(main.terabox, "process_share", process_share)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        # Every slot is taken, so the conversion never starts
+        await main.get_conversion_slots().acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await main.resolve_share("queued")
+        main.get_conversion_slots().release()
+        release.set()
+        assert await main.resolve_share("next") == {"share_id": "next"}
+
+    asyncio.run(run())
+    monkeypatch.setattr(main, "_conversion_slots", None)
+
+def test_api_requires_user_id_while_the_gate_is_on(monkeypatch):
+    checked = []
+
+    async def is_subscribed(user_id):
+        checked.append(user_id)
+        return user_id == 1
+
+    monkeypatch.setattr(main, "is_subscribed", is_subscribed)
+    monkeypatch.setattr(main.membership, "channel_id", -100123)
+
+    async def run():
+        await main.check_api_membership(1)
+        for user_id in (None, 2):
+            with pytest.raises(HTTPException) as error:
+                await main.check_api_membership(user_id)
+            assert error.value.status_code == 403
+        monkeypatch.setattr(main.membership, "channel_id", 0)
+        await main.check_api_membership(None)
+
+    asyncio.run(run())
+    assert checked == [1, 2]
@@ -0,0 +1,28 @@
+from app.config import Config
+from utils.media_player import MediaPlayerHandler
+from utils.player_links import PlayerLinkRenderer
+
+FILE = {
+    "share_id": "abc123",
+    "filename": "Episode 1.mkv\r\n#EXTINF:-1,evil\nhttp://evil.example/x",
+    "direct_url": "https://d.terabox.com/file/abc?sign=xyz&expires=8h"
+}
+
+def test_playlist_uses_stream_urls(monkeypatch):
+    monkeypatch.setattr(Config, "STREAM_BASE_URL", "https://bot.example")
+    playlist = MediaPlayerHandler.generate_playlist([FILE])
+    assert "https://bot.example/stream/abc123" in playlist
+    assert "d.terabox.com" not in playlist
+
+def test_playlist_falls_back_to_direct_url(monkeypatch):
+    monkeypatch.setattr(Config, "STREAM_BASE_URL", "")
+    playlist = MediaPlayerHandler.generate_playlist([FILE])
+    assert playlist.splitlines()[-1] == FILE["direct_url"]
+
+def test_playlist_titles_cannot_inject_lines():
+    playlist = PlayerLinkRenderer.render_playlist([(FILE["filename"], "https://bot.example/stream/abc123")])
+    assert playlist.splitlines() == [
+        "#EXTM3U",
+        "#EXTINF:-1,Episode 1.mkv  #EXTINF:-1,evil http://evil.example/x",
+        "https://bot.example/stream/abc123"
+    ]
@@ -0,0 +1,75 @@
+import struct
+from utils.probe import box_header, keyframe_times, parse_moov, signature_mime
+
+def box(kind: bytes, *children: bytes) -> bytes:
+    payload = b"".join(children)
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+def full_box(kind: bytes, body: bytes, version: int = 0) -> bytes:
+    return box(kind, bytes([version, 0, 0, 0]) + body)
+
+def table(kind: bytes, row: str, rows) -> bytes:
+    return full_box(kind, struct.pack(">I", len(rows)) + b"".join(struct.pack(row, *r) for r in rows))
+
+def track(handler: bytes, fourcc: bytes, timescale: int = 25, tables=(), edit=None, tkhd=b"") -> bytes:
+    stsd = full_box(b"stsd", struct.pack(">I", 1) + box(fourcc, b"\x00" * 8))
+    mdhd = full_box(b"mdhd", struct.pack(">IIII", 0, 0, timescale, 0) + b"\x00" * 4)
+    hdlr = full_box(b"hdlr", struct.pack(">I", 0) + handler + b"\x00" * 12)
+    children = [tkhd] if tkhd else []
+    if edit is not None:
+        children.append(box(b"edts", table(b"elst", ">IiI", [(0, edit, 0x10000)])))
+    children.append(box(b"mdia", mdhd, hdlr, box(b"minf", box(b"stbl", stsd, *tables))))
+    return box(b"trak", *children)
+
+def video_track(**kwargs) -> bytes:
+    tkhd = full_box(b"tkhd", b"\x00" * 72 + struct.pack(">II", 1280 << 16, 720 << 16))
+    return track(b"vide", b"avc1", tkhd=tkhd, **kwargs)
+
+MVHD = full_box(b"mvhd", struct.pack(">IIII", 0, 0, 1000, 90500) + b"\x00" * 80)
+
+def test_keyframe_times_follow_sample_tables():
+    tables = [
+        table(b"stts", ">II", [(40, 1), (60, 1)]),
+        table(b"stss", ">I", [(1,), (26,), (51,), (76,)]),
+        # Two frames of B-frame delay, removed again by the edit list
+        table(b"ctts", ">Ii", [(100, 2)])
+    ]
+    moov = box(b"moov", MVHD, track(b"soun", b"mp4a"), video_track(tables=tables, edit=2))
+    assert keyframe_times(moov) == [0.0, 1.0, 2.0, 3.0]
+
+def test_keyframe_times_with_varying_deltas():
+    tables = [
+        table(b"stts", ">II", [(10, 100), (10, 200)]),
+        table(b"stss", ">I", [(1,), (11,), (16,)])
+    ]
+    moov = box(b"moov", video_track(timescale=1000, tables=tables))
+    assert keyframe_times(moov) == [0.0, 1.0, 2.0]
+
+def test_keyframe_times_unknown_without_sync_table():
+    moov = box(b"moov", video_track(tables=[table(b"stts", ">II", [(100, 1)])]))
+    assert keyframe_times(moov) is None
+    assert keyframe_times(box(b"moov", track(b"soun", b"mp4a"))) is None
+
+def test_parse_moov_reads_duration_codecs_and_size():
+    moov = box(b"moov", MVHD, track(b"soun", b"mp4a"), video_track())
+    assert parse_moov(moov) == {
+        "duration": 90.5, "video_codec": "h264", "audio_codec": "aac", "width": 1280, "height": 720
+    }
+
+def test_parse_moov_ignores_other_boxes():
+    assert parse_moov(box(b"free", b"\x00" * 8))["duration"] is None
+
+def test_box_header_handles_large_and_truncated_boxes():
+    large = struct.pack(">I4sQ", 1, b"mdat", 1 << 33)
+    assert box_header(large, 0, len(large)) == (b"mdat", 16, 1 << 33)
+    assert box_header(large[:12], 0, 12) is None
+    to_end = struct.pack(">I4s", 0, b"mdat") + b"\x00" * 4
+    assert box_header(to_end, 0, len(to_end)) == (b"mdat", 8, 12)
+    assert box_header(struct.pack(">I4s", 4, b"bad "), 0, 8) is None
+
+def test_signature_mime_recognises_containers():
+    assert signature_mime(b"\x00\x00\x00\x18ftypisom") == "video/mp4"
+    assert signature_mime(b"\x00\x00\x00\x14ftypqt  ") == "video/quicktime"
+    assert signature_mime(b"\x1aE\xdf\xa3" + b"\x00" * 8 + b"webm") == "video/webm"
+    assert signature_mime(b"RIFF\x00\x00\x00\x00AVI ") == "video/x-msvideo"
+    assert signature_mime(b"<html>") is None
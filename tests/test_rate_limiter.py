@@ -0,0 +1,43 @@
+import asyncio
+from utils import rate_limiter
+from utils.rate_limiter import MemoryBackend, RateLimiter
+
+def at(monkeypatch, now):
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: now)
+
+def test_limit_per_key(monkeypatch):
+    at(monkeypatch, 1000.0)
+    limiter = RateLimiter(max_requests=3, window=60)
+
+    async def run():
+        results = [await limiter.allow("a") for _ in range(4)]
+        return results, await limiter.allow("b")
+
+    results, other = asyncio.run(run())
+    assert results == [True, True, True, False]
+    assert other
+    assert limiter.rejected == 1
+
+def test_previous_window_is_weighted_by_overlap(monkeypatch):
+    limiter = RateLimiter(max_requests=10, window=60)
+    at(monkeypatch, 600.0)
+    assert asyncio.run(limiter.allow("a", 10))
+    # Halfway through the next window half of the old requests still count
+    at(monkeypatch, 690.0)
+    assert asyncio.run(limiter.allow("a", 5))
+    assert not asyncio.run(limiter.allow("a"))
+
+def test_cost_above_limit_is_clamped(monkeypatch):
+    at(monkeypatch, 1000.0)
+    limiter = RateLimiter(max_requests=5, window=60)
+    assert asyncio.run(limiter.allow("batch", 50))
+    assert not asyncio.run(limiter.allow("batch"))
+
+def test_idle_keys_are_evicted(monkeypatch):
+    backend = MemoryBackend()
+    at(monkeypatch, 1000.0)
+    limiter = RateLimiter(max_requests=5, window=60, backend=backend)
+    asyncio.run(limiter.allow("old"))
+    at(monkeypatch, 1200.0)
+    asyncio.run(limiter.allow("new"))
+    assert len(backend) == 1
@@ -0,0 +1,58 @@
+import asyncio
+from utils.cache import TTLCache
+from utils.refresher import LinkRefresher
+
+class FakeDownloader:
+    """Stands in for TeraboxDownloader: renew caches a link with a fixed TTL"""
+
+    def __init__(self, ttl):
+        self.cache = TTLCache(100, 3600)
+        self.ttl = ttl
+        self.renewed = []
+
+    async def renew(self, share_id):
+        self.renewed.append(share_id)
+        if self.ttl is None:
+            return None
+        result = {"share_id": share_id, "direct_url": f"https://d.example/{share_id}"}
+        self.cache.set(share_id, result, ttl=self.ttl)
+        return result
+
+def make_refresher(downloader, **kwargs):
+    settings = dict(interval=30, lead_time=120, concurrency=2, min_score=0.5, half_life=600)
+    settings.update(kwargs)
+    return LinkRefresher(downloader, **settings)
+
+def test_tracked_shares_are_capped_least_recent_first():
+    refresher = make_refresher(FakeDownloader(ttl=3600), max_tracked=2)
+    for share_id in ("1a", "1b", "1a", "1c"):
+        refresher.touch(share_id)
+    assert list(refresher._scores) == ["1a", "1c"]
+    assert refresher.stats()["tracked"] == 2
+
+def test_renewed_share_is_not_due_again():
+    downloader = FakeDownloader(ttl=3600)
+    refresher = make_refresher(downloader)
+    refresher.touch("1a")
+    assert asyncio.run(refresher.sweep()) == 1
+    assert asyncio.run(refresher.sweep()) == 0
+    assert downloader.renewed == ["1a"]
+
+def test_link_that_still_expires_soon_is_not_renewed_every_sweep():
+    # Upstream keeps returning a link inside the lead time, e.g. the same URL
+    downloader = FakeDownloader(ttl=60)
+    refresher = make_refresher(downloader)
+    refresher.touch("1a")
+    assert asyncio.run(refresher.sweep()) == 0
+    assert asyncio.run(refresher.sweep()) == 0
+    assert downloader.renewed == ["1a"]
+    assert refresher.stats()["unchanged"] == 1
+
+def test_failed_renewal_backs_off():
+    downloader = FakeDownloader(ttl=None)
+    refresher = make_refresher(downloader)
+    refresher.touch("1a")
+    asyncio.run(refresher.sweep())
+    asyncio.run(refresher.sweep())
+    assert downloader.renewed == ["1a"]
+    assert refresher.stats()["failed"] == 1
@@ -0,0 +1,145 @@
+import asyncio
+import time
+import aiohttp
+import pytest
+from benchmarks.fake_servers import FakeTerabox
+from utils import resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError, RetryBudget, UpstreamError, UpstreamPolicy
+
+def make_policy(hosts, **kwargs):
+    settings = dict(attempt_timeout=2, deadline=10, retries=0, backoff_base=0.01, backoff_max=0.05)
+    settings.update(kwargs)
+    return UpstreamPolicy(hosts, **settings)
+
+def list_share(session):
+    async def call(host):
+        async with session.get(f"http://{host}/api/share/list", params={"shareid": "abc"}) as response:
+            if response.status >= 500:
+                raise UpstreamError(f"{host}: HTTP {response.status}")
+            data = await response.json()
+            return host, data["list"][0]["server_filename"]
+    return call
+
+def run_against(servers, scenario):
+    async def run():
+        for server in servers:
+            await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await scenario(session)
+        finally:
+            for server in servers:
+                await server.stop()
+    return asyncio.run(run())
+
+def test_breaker_opens_then_half_opens():
+    server = FakeTerabox(latency=0, error_rate=1.0)
+    policy = make_policy([server.host], failure_threshold=3, reset_timeout=0.2)
+
+    async def scenario(session):
+        for _ in range(3):
+            with pytest.raises(UpstreamError):
+                await policy.call(list_share(session))
+        assert policy.breaker(server.host).state == CircuitBreaker.OPEN
+
+        # Open: rejected without reaching the server
+        with pytest.raises(CircuitOpenError):
+            await policy.call(list_share(session))
+        assert server.requests["share_list"] == 3
+
+        await asyncio.sleep(0.25)
+        assert policy.breaker(server.host).state == CircuitBreaker.HALF_OPEN
+
+        # A failed probe opens it again straight away
+        with pytest.raises(UpstreamError):
+            await policy.call(list_share(session))
+        assert policy.breaker(server.host).state == CircuitBreaker.OPEN
+
+        await asyncio.sleep(0.25)
+        server.error_rate = 0.0
+        assert await policy.call(list_share(session)) == (server.host, "abc.mp4")
+        assert policy.breaker(server.host).state == CircuitBreaker.CLOSED
+        assert server.requests["share_list"] == 5
+
+    run_against([server], scenario)
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+def test_retry_budget_runs_out():
+    server = FakeTerabox(latency=0, error_rate=1.0)
+    policy = make_policy(
+        [server.host], retries=5, failure_threshold=100,
+        retry_budget=RetryBudget(ratio=0, max_tokens=2)
+    )
+
+    async def scenario(session):
+        with pytest.raises(UpstreamError):
+            await policy.call(list_share(session))
+        # One call plus the two retries the budget held, not five
+        assert server.requests["share_list"] == 3
+        assert policy.retried == 2
+
+        with pytest.raises(UpstreamError):
+            await policy.call(list_share(session))
+        assert server.requests["share_list"] == 4
+
+    run_against([server], scenario)
+
+def test_hedge_fires_after_delay():
+    slow = FakeTerabox(latency=0)
+    fast = FakeTerabox(latency=0)
+    hedge_delay = 0.1
+
+    async def stall():
+        await asyncio.sleep(0.6)
+
+    slow._delay = stall
+    policy = make_policy([slow.host, fast.host], hedge_delay=hedge_delay)
+
+    async def scenario(session):
+        started = time.monotonic()
+        result = await policy.call(list_share(session))
+        elapsed = time.monotonic() - started
+        assert result == (fast.host, "abc.mp4")
+        assert hedge_delay <= elapsed < 0.5
+        assert slow.requests["share_list"] == 1
+        assert fast.requests["share_list"] == 1
+        # Losing the race says nothing about the slow host
+        assert policy.breaker(slow.host).failures == 0
+
+    run_against([slow, fast], scenario)
+
+def test_retries_wait_jittered_backoff(monkeypatch):
+    server = FakeTerabox(latency=0, error_rate=1.0)
+    policy = make_policy([server.host], retries=3, backoff_base=0.02, backoff_max=0.05, failure_threshold=100)
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr(resilience.random, "uniform", uniform)
+
+    async def scenario(session):
+        started = time.monotonic()
+        with pytest.raises(UpstreamError):
+            await policy.call(list_share(session))
+        return time.monotonic() - started
+
+    elapsed = run_against([server], scenario)
+    # Full jitter: each delay is drawn from zero up to the capped exponential step
+    assert bounds[:3] == [(0, 0.02), (0, 0.04), (0, 0.05)]
+    assert elapsed >= 0.11
+    assert server.requests["share_list"] == 4
+    assert policy.retried == 3
+
+def test_backoff_delay_stays_within_cap():
+    for attempt in range(8):
+        delay = resilience.backoff_delay(attempt, 0.1, 1.0)
+        assert 0 <= delay <= min(1.0, 0.1 * 2 ** attempt)
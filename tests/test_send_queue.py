@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+from telegram.error import BadRequest, RetryAfter
+from utils.send_queue import SendQueue, TokenBucket
+
+def make_queue(**kwargs):
+    settings = dict(global_rate=1000, global_burst=100, chat_rate=1000, group_rate=1000, chat_burst=100)
+    settings.update(kwargs)
+    return SendQueue(**settings)
+
+def test_token_bucket_reserves_in_order():
+    bucket = TokenBucket(rate=10, capacity=2)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert 0.05 < delays[2] <= 0.1 < delays[3] <= 0.2
+
+def test_calls_for_one_chat_go_out_in_order():
+    sent = []
+
+    async def run():
+        queue = make_queue()
+
+        def call(n):
+            async def send():
+                sent.append(n)
+                return n
+            return send
+        return await asyncio.gather(*[queue.send(1, call(n)) for n in range(5)])
+
+    assert asyncio.run(run()) == list(range(5))
+    assert sent == list(range(5))
+
+def test_queued_edits_coalesce_into_the_latest():
+    edits = []
+
+    async def run():
+        queue = make_queue()
+        release = asyncio.Event()
+
+        async def blocking():
+            await release.wait()
+
+        def edit(text):
+            async def send():
+                edits.append(text)
+                return text
+            return send
+
+        first = asyncio.ensure_future(queue.send(1, blocking))
+        await asyncio.sleep(0)
+        waiting = [asyncio.ensure_future(queue.send(1, edit(n), key="msg")) for n in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        await first
+        return await asyncio.gather(*waiting), queue.stats()
+
+    results, stats = asyncio.run(run())
+    assert edits == [2]
+    assert results == [2, 2, 2]
+    assert stats["coalesced"] == 2
+
+def test_retry_after_pauses_and_retries():
+    attempts = []
+
+    async def run():
+        queue = make_queue()
+
+        async def flaky():
+            attempts.append(asyncio.get_running_loop().time())
+            if len(attempts) == 1:
+                raise RetryAfter(0.05)
+            return "ok"
+        return await queue.send(1, flaky), queue.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == "ok"
+    assert stats["retried"] == 1 and stats["sent"] == 1
+    assert attempts[1] - attempts[0] >= 0.04
+
+def test_not_modified_edit_counts_as_success():
+    async def run():
+        queue = make_queue()
+
+        async def unchanged():
+            raise BadRequest("Message is not modified")
+        return await queue.send(1, unchanged, key="msg"), queue.stats()
+
+    result, stats = asyncio.run(run())
+    assert result is None
+    assert stats["failed"] == 0
+
+def test_alerts_are_deduplicated_into_one_message_per_admin():
+    messages = []
+
+    async def send_message(chat_id, text):
+        messages.append((chat_id, text))
+
+    async def run():
+        queue = make_queue(admin_ids=[10, 20], alert_interval=60)
+        bot = SimpleNamespace(send_message=send_message)
+        for text in ("boom", "boom", "other"):
+            queue.alert(bot, text)
+        await queue.close()
+
+    asyncio.run(run())
+    assert sorted(chat_id for chat_id, _ in messages) == [10, 20]
+    text = messages[0][1]
+    assert text.startswith("⚠️ 3 bot error(s)")
+    assert "boom (x2)" in text and "other" in text
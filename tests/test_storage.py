@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from utils.storage import LinkStore, SQLiteBackend, StorageBackend
+
+def link(share_id, fs_id=12345):
+    return {
+        "share_id": share_id,
+        "fs_id": fs_id,
+        "filename": f"{share_id}.mp4",
+        "size": 1024,
+        "mime_type": "video/mp4",
+        "direct_url": f"https://d.terabox.com/file/{share_id}"
+    }
+
+class FlakyBackend(StorageBackend):
+    """Refuses connections until up is set, then keeps rows in memory"""
+
+    def __init__(self):
+        self.up = False
+        self.connects = 0
+        self.rows = {}
+
+    async def connect(self):
+        self.connects += 1
+        if not self.up:
+            raise OSError("connection refused")
+
+    async def close(self):
+        pass
+
+    async def get(self, share_id):
+        return self.rows.get(share_id)
+
+    async def upsert_many(self, records):
+        for record in records:
+            self.rows[record["share_id"]] = record
+
+def test_flush_then_reload(tmp_path):
+    path = str(tmp_path / "links.db")
+
+    async def write():
+        store = LinkStore(SQLiteBackend(path), flush_interval=60)
+        store.record(link("first"), time.time() + 3600)
+        store.record(link("second"), time.time() + 3600)
+        await store.flush()
+        assert store.written == 2
+        await store.close()
+
+    async def read():
+        store = LinkStore(SQLiteBackend(path), flush_interval=60)
+        try:
+            return await store.lookup("first"), await store.lookup("missing")
+        finally:
+            await store.close()
+
+    asyncio.run(write())
+    found, missing = asyncio.run(read())
+    assert found["direct_url"] == "https://d.terabox.com/file/first"
+    # Same type the resolver produces, so derived cache keys match
+    assert found["fs_id"] == 12345
+    assert missing is None
+
+def test_buffered_lookup_normalizes_fs_id():
+    async def run():
+        store = LinkStore(FlakyBackend(), flush_interval=60)
+        store.record(link("share"), time.time() + 3600)
+        result = await store.lookup("share")
+        await store.close()
+        return result
+
+    assert asyncio.run(run())["fs_id"] == 12345
+
+def test_unreachable_database_is_retried_and_backlog_capped(caplog):
+    backend = FlakyBackend()
+    store = LinkStore(backend, flush_interval=60, max_pending=3, retry_max=60)
+
+    async def run():
+        for index in range(5):
+            store.record(link(f"share{index}"), None)
+        with caplog.at_level(logging.ERROR):
+            for _ in range(5):
+                await store.flush()
+        # One attempt, then the retry pause holds further flushes back
+        assert backend.connects == 1
+        assert list(store._buffer) == ["share2", "share3", "share4"]
+        assert store.dropped == 2
+
+        backend.up = True
+        store._retry_at = 0
+        await store.flush()
+        assert backend.connects == 2
+        assert sorted(backend.rows) == ["share2", "share3", "share4"]
+        assert store.stats()["pending"] == 0
+        await store.close()
+
+    asyncio.run(run())
+    assert len([r for r in caplog.records if "unreachable" in r.getMessage()]) == 1
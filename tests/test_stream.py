@@ -0,0 +1,102 @@
+import asyncio
+import time
+import aiohttp
+import pytest
+from app.config import Config
+from urllib.parse import quote, unquote
+from utils.stream import StreamProxy
+
+class FakeContent:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+class FakeResponse:
+    def __init__(self, chunks, error=None):
+        self.content = FakeContent(chunks, error)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class FakeDownloader:
+    async def refresh(self, share_id):
+        return {"direct_url": "http://upstream.invalid/file"}
+
+async def collect(body):
+    received = []
+    async for chunk in body:
+        received.append(chunk)
+    return received
+
+def test_relay_resumes_after_break():
+    proxy = StreamProxy(FakeDownloader())
+    first = FakeResponse([b"abc"], aiohttp.ClientPayloadError("cut"))
+    second = FakeResponse([b"def"])
+
+    async def reopen(share_id, file_info, start, end):
+        assert start == 3
+        return second
+
+    proxy._open_upstream = reopen
+    assert asyncio.run(collect(proxy._relay("share", first, 0, None))) == [b"abc", b"def"]
+    assert first.closed and second.closed
+
+def test_relay_failed_resume_raises_upstream_error():
+    proxy = StreamProxy(FakeDownloader())
+    first = FakeResponse([b"abc"], aiohttp.ClientPayloadError("cut"))
+
+    async def reopen(share_id, file_info, start, end):
+        return None
+
+    proxy._open_upstream = reopen
+    received = []
+
+    async def run():
+        async for chunk in proxy._relay("share", first, 0, None):
+            received.append(chunk)
+
+    with pytest.raises(aiohttp.ClientPayloadError):
+        asyncio.run(run())
+    assert received == [b"abc"]
+    assert first.closed
+
+class FakeChunkCache:
+    block_size = 1024
+
+    def has(self, fs_id, block):
+        return False
+
+def test_one_viewer_seeking_does_not_make_a_file_hot(monkeypatch):
+    monkeypatch.setattr(Config, "CHUNK_CACHE_MIN_HITS", 2)
+    proxy = StreamProxy(FakeDownloader(), FakeChunkCache())
+    assert not any(proxy._is_hot(7, offset, "10.0.0.1") for offset in range(0, 50000, 1000))
+    assert proxy._is_hot(7, 0, "10.0.0.2")
+    assert proxy._is_hot(7, 0, "10.0.0.1")
+
+def test_viewers_outside_the_window_are_forgotten(monkeypatch):
+    monkeypatch.setattr(Config, "CHUNK_CACHE_MIN_HITS", 2)
+    monkeypatch.setattr(Config, "CHUNK_CACHE_HOT_WINDOW", 60)
+    proxy = StreamProxy(FakeDownloader(), FakeChunkCache())
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    assert not proxy._is_hot(7, 0, "10.0.0.1")
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert not proxy._is_hot(7, 0, "10.0.0.2")
+
+def test_non_ascii_filename_header_is_latin1_safe():
+    headers = StreamProxy(FakeDownloader())._response_headers(
+        {"filename": 'फ़िल्म "भाग 1" 🎬.mp4', "mime_type": "video/mp4"}, 100, None
+    )
+    value = headers["Content-Disposition"]
+    value.encode("latin-1")
+    assert value.startswith('inline; filename="')
+    assert '"भाग' not in value
+    assert value.endswith("filename*=UTF-8''" + quote('फ़िल्म "भाग 1" 🎬.mp4', safe=''))
+    assert unquote(value.split("''", 1)[1]) == 'फ़िल्म "भाग 1" 🎬.mp4'
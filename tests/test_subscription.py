@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+from utils.subscription import MembershipGate
+
+class FakeBot:
+    def __init__(self, status="member", error=None):
+        self.status = status
+        self.error = error
+        self.calls = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        return SimpleNamespace(status=self.status)
+
+def test_concurrent_checks_share_one_lookup():
+    gate = MembershipGate(channel_id=-100, member_ttl=3600, non_member_ttl=60)
+    bot = FakeBot()
+
+    async def run():
+        results = await asyncio.gather(*[gate.is_member(bot, 7) for _ in range(5)])
+        assert all(results)
+        assert await gate.is_member(bot, 7)
+
+    asyncio.run(run())
+    assert bot.calls == 1
+
+def test_failed_lookup_fails_open_and_is_cached_briefly():
+    gate = MembershipGate(channel_id=-100, member_ttl=3600, non_member_ttl=60, failure_ttl=30)
+    bot = FakeBot(error=RuntimeError("bot is not a member of the channel"))
+
+    async def run():
+        for _ in range(3):
+            assert await gate.is_member(bot, 7)
+
+    asyncio.run(run())
+    assert bot.calls == 1
+    assert gate.failures == 1
+    assert 0 < gate.cache.expires_in(7) <= 30
+
+def test_non_members_and_leaves_are_recorded():
+    gate = MembershipGate(channel_id=-100, member_ttl=3600, non_member_ttl=60)
+    assert not asyncio.run(gate.is_member(FakeBot(status="left"), 7))
+
+    change = SimpleNamespace(chat=SimpleNamespace(id=-100), new_chat_member=SimpleNamespace(
+        status="member", user=SimpleNamespace(id=7)
+    ))
+    asyncio.run(gate.on_chat_member(SimpleNamespace(chat_member=change), None))
+    assert gate.cache.get(7) is True
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from app.config import Config
+from benchmarks.fake_servers import FakeTerabox
+from utils import FileProcessingError
+from utils.terabox import TeraboxDownloader
+
+def resolve_against(server, monkeypatch, scenario):
+    monkeypatch.setattr(Config, "TERABOX_API_HOSTS", [server.host])
+    monkeypatch.setattr(Config, "TERABOX_API_SCHEME", "http")
+
+    async def run():
+        await server.start()
+        downloader = TeraboxDownloader()
+        try:
+            return await scenario(downloader)
+        finally:
+            await downloader.close()
+            await server.stop()
+    return asyncio.run(run())
+
+def test_folder_entries_are_skipped(monkeypatch):
+    server = FakeTerabox(latency=0, files_per_share=3)
+
+    async def scenario(downloader):
+        # The fake lists the "extras" folder first
+        result = await downloader.process_share("dirshare")
+        assert result["filename"] == "episode-0000.mkv"
+        assert result["direct_url"].startswith(f"http://{server.host}/file/dirshare/100")
+        assert downloader.cache.get("dirshare") is not None
+
+    resolve_against(server, monkeypatch, scenario)
+
+def test_missing_download_url_is_an_error(monkeypatch):
+    server = FakeTerabox(latency=0, files_per_share=0)
+
+    async def scenario(downloader):
+        # Only a folder at the top level, so there is nothing to download
+        with pytest.raises(FileProcessingError):
+            await downloader._resolve("dirshare")
+        assert await downloader.process_share("dirshare") is None
+        assert downloader.cache.get("dirshare") is None
+
+        async def no_url(file_info):
+            return None
+
+        downloader._get_download_url = no_url
+        with pytest.raises(FileProcessingError):
+            await downloader._resolve("plain")
+        assert downloader.cache.get("plain") is None
+
+    resolve_against(server, monkeypatch, scenario)
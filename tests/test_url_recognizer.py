@@ -0,0 +1,35 @@
+from utils import TeraboxValidator
+
+def test_mirrors_and_surl_links_are_recognised():
+    text = " ".join([
+        "https://www.terabox.com/s/1a", "see teraboxapp.com/s/1b,",
+        "https://www.1024tera.com/s/1c", "(https://www.4funbox.com/s/1d)",
+        "https://MirroBox.com/s/1e", "https://www.terabox.com/sharing/link?surl=f",
+        "https://nephobox.com/wap/share/filelist?x=1&surl=g#top"
+    ])
+    assert TeraboxValidator.find_share_ids(text) == ["1a", "1b", "1c", "1d", "1e", "1f", "1g"]
+
+def test_ids_keep_their_case_and_are_deduplicated():
+    text = "https://terabox.com/s/1AbC https://terabox.com/sharing/link?surl=AbC"
+    assert TeraboxValidator.find_share_ids(text) == ["1AbC"]
+
+def test_results_follow_the_order_of_the_links():
+    text = "https://terabox.com/sharing/link?surl=b then https://terabox.com/s/1a"
+    assert TeraboxValidator.find_share_ids(text) == ["1b", "1a"]
+    assert TeraboxValidator.extract_share_id(text) == "1b"
+
+def test_lookalike_hosts_and_paths_are_rejected():
+    for url in [
+        "https://example.com/s/1a",
+        "https://notterabox.com/s/1a",
+        "https://my-terabox.com/s/1a",
+        "https://terabox.community/s/1a",
+        "https://terabox.com/share/s/1a",
+        "https://example.com/page?surl=1a",
+        "https://terabox.com/s/",
+    ]:
+        assert not TeraboxValidator.is_valid_terabox_url(url), url
+        assert TeraboxValidator.extract_share_id(url) is None, url
+
+def test_surl_is_ignored_on_a_share_path():
+    assert TeraboxValidator.find_share_ids("https://terabox.com/s/1a?surl=b") == ["1a"]
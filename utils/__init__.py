@@ -5,7 +5,8 @@ Created at: 2024-12-30
 """
 
 import logging
-from typing import Dict, Optional, Any
+import re
+from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timezone
 import os
 
@@ -21,6 +22,37 @@ __version__ = "1.0.0"
 __author__ = "TechRewindEditz"
 __created_at__ = "2024-12-30"
 
+# Known Terabox mirror domains
+TERABOX_DOMAINS = (
+    'teraboxshare', 'terafileshare', 'teraboxapp', '1024terabox', 'freeterabox',
+    '1024tera', 'terabox', '4funbox', 'mirrobox', 'nephobox', 'momerybox', 'tibibox'
+)
+
+# Host of a share link: a whole mirror domain label followed by its TLD
+TERABOX_HOST = (
+    r"(?<![a-z0-9-])(?:" + "|".join(TERABOX_DOMAINS) + r")\.(?:com|app|fun|co)"
+)
+
+# Longest stretch of text searched for the host in front of a ?surl= hit
+MAX_URL_LENGTH = 2048
+
+# Scanning a chat message costs one attempt per position the regex engine
+# stops at. re only jumps straight to a literal prefix, and IGNORECASE turns
+# that off, so the scan looks for the case-sensitive path markers "/s/" and
+# "surl=" (Terabox always emits them in lowercase) and only then checks, case
+# insensitively, that a mirror host sits right in front of the hit. Hits are
+# rare, so the host patterns run a handful of times instead of at every dot.
+# The one nested quantifier, (?:[^\s#&]*&)* over query parameters, is
+# unambiguous: each repetition ends at an "&" its inner class cannot match,
+# so the engine never tries more than one way to split the query.
+SHARE_PATH_PATTERN = re.compile(r"/s/(?P<share_id>[A-Za-z0-9_-]+)")
+SURL_PATTERN = re.compile(r"surl=(?P<surl>[A-Za-z0-9_-]+)")
+SHARE_HOST_PATTERN = re.compile(TERABOX_HOST + r"\Z", re.IGNORECASE)
+SURL_HOST_PATTERN = re.compile(
+    TERABOX_HOST + r"/(?!s/)[^\s?#]*\?(?:[^\s#&]*&)*\Z", re.IGNORECASE
+)
+SHARE_HOST_WIDTH = max(map(len, TERABOX_DOMAINS)) + len(".com")
+
 class UtilsConfig:
     """Configuration class for utilities"""
     SUPPORTED_MEDIA_TYPES = {
@@ -34,7 +66,10 @@ class UtilsConfig:
     PLAYER_SCHEMES = {
         'vlc': 'vlc://',
         'mx_player': 'intent:',
-        'playit': 'playit://'
+        'playit': 'playit://',
+        'nplayer': 'nplayer-',
+        'infuse': 'infuse://',
+        'mpv': 'intent:'
     }
 
     @staticmethod
@@ -66,15 +101,45 @@ class ResponseFormatter:
 class TeraboxValidator:
     """Validator for Terabox URLs and responses"""
     
+    @staticmethod
+    def _matches(text: str) -> List[Tuple[int, str]]:
+        """Return (position, share ID) for every Terabox link in text, in order
+
+        surl IDs are normalised to the /s/1<id> form so both spellings of a
+        link share one cache entry.
+        """
+        found = []
+        for match in SHARE_PATH_PATTERN.finditer(text):
+            pos = match.start()
+            host = SHARE_HOST_PATTERN.search(text, max(0, pos - SHARE_HOST_WIDTH), pos)
+            if host:
+                found.append((host.start(), match.group('share_id')))
+        # The substring test costs the same as a scan that finds nothing
+        # and is far cheaper on a single short link
+        if 'surl=' in text:
+            for match in SURL_PATTERN.finditer(text):
+                pos = match.start()
+                host = SURL_HOST_PATTERN.search(text, max(0, pos - MAX_URL_LENGTH), pos)
+                if host:
+                    found.append((host.start(), f"1{match.group('surl')}"))
+            found.sort()
+        return found
+
     @staticmethod
     def is_valid_terabox_url(url: str) -> bool:
         """Validate if URL is a valid Terabox share link"""
-        valid_domains = [
-            'terabox.com',
-            'teraboxapp.com',
-            '1024tera.com'
-        ]
-        return any(domain in url.lower() for domain in valid_domains)
+        return bool(TeraboxValidator._matches(url))
+
+    @staticmethod
+    def extract_share_id(url: str) -> Optional[str]:
+        """Return the share ID of the first Terabox link in url"""
+        found = TeraboxValidator._matches(url)
+        return found[0][1] if found else None
+
+    @staticmethod
+    def find_share_ids(text: str) -> List[str]:
+        """Return every distinct share ID in text, in order of appearance"""
+        return list(dict.fromkeys(share_id for _, share_id in TeraboxValidator._matches(text)))
 
     @staticmethod
     def validate_file_info(file_info: Dict) -> bool:
@@ -113,19 +178,8 @@ class GeminiHelper:
 
 def get_player_url(player: str, direct_url: str, filename: str) -> Optional[str]:
     """Generate player-specific streaming URLs"""
-    if player not in UtilsConfig.PLAYER_SCHEMES:
-        return None
-        
-    if player == 'mx_player':
-        return (f"intent:{direct_url}#Intent;"
-                f"package=com.mxtech.videoplayer.ad;"
-                f"S.title={filename};end")
-    elif player == 'vlc':
-        return f"vlc://{direct_url}"
-    elif player == 'playit':
-        return f"playit://{direct_url}"
-    
-    return None
+    from utils.media_player import player_links
+    return player_links.render(player, direct_url, filename)
 
 # Error classes
 class TeraboxError(Exception):
@@ -146,6 +200,10 @@ class UnsupportedMediaType(TeraboxError):
 
 # Export commonly used functions and classes
 __all__ = [
+    'TERABOX_DOMAINS',
+    'TERABOX_HOST',
+    'SHARE_PATH_PATTERN',
+    'SURL_PATTERN',
     'UtilsConfig',
     'ResponseFormatter',
     'TeraboxValidator',
@@ -0,0 +1,136 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from app.config import Config
+from utils.resilience import UpstreamError
+
+class AccountThrottled(UpstreamError):
+    """Terabox throttled the account; another account may still succeed"""
+    host_failure = False
+
+class NoAccountAvailable(UpstreamError):
+    """Every configured account is cooling down"""
+    host_failure = False
+
+class TeraboxAccount:
+    """One set of Terabox credentials and its request counters"""
+
+    def __init__(self, name: str, cookie: str = '', token: str = '', user_id: str = ''):
+        self.name = name
+        self.cookie = cookie
+        self.token = token
+        self.user_id = user_id
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.cooldown_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def headers(self) -> Dict[str, str]:
+        return {"Cookie": self.cookie} if self.cookie else {}
+
+    def params(self) -> Dict[str, str]:
+        return {"jsToken": self.token} if self.token else {}
+
+    def stats(self, now: float) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "throttled": self.throttled,
+            "cooldown": max(round(self.cooldown_until - now), 0)
+        }
+
+class AccountPool:
+    """Spread Terabox API calls over several accounts
+
+    Accounts are picked least-loaded (fewest requests in flight, ties broken
+    round-robin) or plain round-robin. An account that gets throttled sits
+    out for the cooldown and the call is retried on another one.
+    """
+    STRATEGIES = ('least_loaded', 'round_robin')
+
+    def __init__(self, accounts: List[TeraboxAccount], strategy: str = 'least_loaded', cooldown: float = 300):
+        if not accounts:
+            raise ValueError("AccountPool needs at least one account")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown account strategy: {strategy}")
+        self.accounts = accounts
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self._next = 0
+
+    @classmethod
+    def from_config(cls) -> 'AccountPool':
+        """Build the pool from TERABOX_ACCOUNTS, falling back to the single-account settings"""
+        accounts = []
+        if Config.TERABOX_ACCOUNTS:
+            for index, entry in enumerate(json.loads(Config.TERABOX_ACCOUNTS), 1):
+                accounts.append(TeraboxAccount(
+                    name=entry.get('name') or f"account-{index}",
+                    cookie=entry.get('cookie', ''),
+                    token=entry.get('token', ''),
+                    user_id=str(entry.get('user_id', ''))
+                ))
+        else:
+            accounts.append(TeraboxAccount(
+                name="default",
+                cookie=Config.TERABOX_COOKIE,
+                token=Config.TERABOX_TOKEN,
+                user_id=Config.TERABOX_USER_ID
+            ))
+        return cls(accounts, Config.ACCOUNT_STRATEGY, Config.ACCOUNT_COOLDOWN)
+
+    def acquire(self) -> TeraboxAccount:
+        """Pick the account for the next request"""
+        now = time.monotonic()
+        count = len(self.accounts)
+        # Rotate the scan start so equally loaded accounts take turns
+        ordered = [self.accounts[(self._next + offset) % count] for offset in range(count)]
+        candidates = [account for account in ordered if account.available(now)]
+        if not candidates:
+            raise NoAccountAvailable("All Terabox accounts are cooling down")
+        if self.strategy == 'least_loaded':
+            account = min(candidates, key=lambda candidate: candidate.in_flight)
+        else:
+            account = candidates[0]
+        self._next = (self.accounts.index(account) + 1) % count
+        return account
+
+    @contextmanager
+    def use(self) -> Iterator[TeraboxAccount]:
+        """Hold an account for one request and record how it went"""
+        account = self.acquire()
+        account.in_flight += 1
+        account.requests += 1
+        try:
+            yield account
+        except AccountThrottled:
+            account.throttled += 1
+            account.cooldown_until = time.monotonic() + self.cooldown
+            logging.warning(f"Terabox account {account.name} throttled, cooling down for {self.cooldown}s")
+            raise
+        except Exception:
+            account.failures += 1
+            raise
+        finally:
+            account.in_flight -= 1
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return request counters per account"""
+        now = time.monotonic()
+        return {account.name: account.stats(now) for account in self.accounts}
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+def is_throttled(status: int, data: Optional[Dict] = None) -> bool:
+    """Whether a Terabox response means the account is being rate limited"""
+    if status == 429:
+        return True
+    return bool(data) and data.get("errno") in Config.TERABOX_THROTTLE_ERRNOS
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import mmap
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+SAFE_KEY_PATTERN = re.compile(r"[^A-Za-z0-9_-]")
+
+class ChunkCache:
+    """Disk-backed cache of block-aligned file chunks with LRU eviction
+
+    Each block is one file under directory/<fs_id>/<block>.blk. The index of
+    cached blocks and their sizes lives in memory and is rebuilt from disk on
+    startup, oldest first. Reads memory-map the block and copy out only the
+    requested slice; disk I/O runs in the default executor so the event loop
+    never blocks on it.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, block_size: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index: "OrderedDict[Tuple[str, int], int]" = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Register blocks left on disk by a previous run, least recent first"""
+        found = []
+        for fs_id in os.listdir(self.directory):
+            folder = os.path.join(self.directory, fs_id)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith(".blk"):
+                    continue
+                try:
+                    block = int(name[:-4])
+                except ValueError:
+                    # Not written by us; leave it alone
+                    continue
+                path = os.path.join(folder, name)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, (fs_id, block), stat.st_size))
+        for _, key, size in sorted(found):
+            self._index[key] = size
+            self.current_bytes += size
+        self._evict()
+
+    def _key(self, fs_id: Hashable, block: int) -> Tuple[str, int]:
+        return SAFE_KEY_PATTERN.sub("_", str(fs_id)), block
+
+    def _path(self, key: Tuple[str, int]) -> str:
+        return os.path.join(self.directory, key[0], f"{key[1]}.blk")
+
+    def has(self, fs_id: Hashable, block: int) -> bool:
+        return self._key(fs_id, block) in self._index
+
+    async def read(self, fs_id: Hashable, block: int, offset: int, length: int) -> Optional[bytes]:
+        """Return length bytes at offset within a cached block, or None on a miss"""
+        key = self._key(fs_id, block)
+        if key not in self._index:
+            self.misses += 1
+            return None
+        self._index.move_to_end(key)
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, self._read_slice, self._path(key), offset, length)
+        except (OSError, ValueError) as e:
+            # Block vanished or was truncated underneath us
+            logging.warning(f"Dropping unreadable cache block {key}: {str(e)}")
+            self._drop(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    @staticmethod
+    def _read_slice(path: str, offset: int, length: int) -> bytes:
+        with open(path, "rb") as handle:
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[offset:offset + length]
+
+    async def write(self, fs_id: Hashable, block: int, data: bytes):
+        """Store a complete block and evict least recently used blocks over the cap"""
+        if len(data) > self.max_bytes:
+            return
+        key = self._key(fs_id, block)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_file, self._path(key), data)
+        if key in self._index:
+            self.current_bytes -= self._index[key]
+        self._index[key] = len(data)
+        self._index.move_to_end(key)
+        self.current_bytes += len(data)
+        self._evict()
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(data)
+        # Readers only ever see complete blocks
+        os.replace(temp_path, path)
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._index:
+            key = next(iter(self._index))
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key: Tuple[str, int]):
+        size = self._index.pop(key, None)
+        if size is None:
+            return
+        self.current_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and disk usage"""
+        lookups = self.hits + self.misses
+        return {
+            "blocks": len(self._index),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -1,15 +1,71 @@
-import google.generativeai as genai
-from typing import Dict, Optional
-import config
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import Config
+from utils.cache import SingleFlight, TTLCache
+from utils.media_analyzer import MediaAnalyzer
+from utils.metrics import GEMINI_LATENCY
+
+BATCH_SECTION_PATTERN = re.compile(r"^### FILE (\d+)\s*$", re.MULTILINE)
 
 class GeminiAI:
-    def __init__(self):
-        genai.configure(api_key=config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
+    def __init__(self, client: Optional[Any] = None):
+        # Any object with an async generate_content_async(prompt) whose result
+        # has a .text attribute can stand in for the Gemini model
+        self._model = client
+        self.cache = TTLCache(
+            max_size=Config.GEMINI_CACHE_SIZE,
+            ttl=Config.GEMINI_CACHE_TTL
+        )
+        self._inflight = SingleFlight()
+        self._pending: List[Tuple[Dict, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def model(self) -> Any:
+        """The Gemini model, imported and configured on the first analysis"""
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=Config.GEMINI_API_KEY)
+            self._model = genai.GenerativeModel(Config.GEMINI_MODEL)
+        return self._model
 
     async def analyze_file(self, file_info: Dict) -> Optional[Dict]:
         try:
-            prompt = f"""
+            # Identical metadata gives an identical answer, so reuse it
+            key = self._cache_key(file_info)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return dict(cached)
+
+            with GEMINI_LATENCY.time():
+                text = await self._inflight.do(key, lambda: self._generate(file_info))
+
+            result = {
+                "analysis": text,
+                "safety_check": self._safety_check(text),
+                "compatibility": self._check_compatibility(file_info)
+            }
+            self.cache.set(key, result)
+            return dict(result)
+        except Exception as e:
+            logging.error(f"Gemini Analysis Error: {str(e)}")
+            return None
+
+    def cache_stats(self) -> Dict:
+        """Return hit/miss counters of the analysis cache"""
+        return self.cache.stats()
+
+    def _cache_key(self, file_info: Dict) -> Tuple:
+        return (
+            file_info.get('filename', ''),
+            file_info.get('size', 0),
+            file_info.get('mime_type', 'unknown')
+        )
+
+    def _build_prompt(self, file_info: Dict) -> str:
+        return f"""
             Analyze this media file:
             Filename: {file_info['filename']}
             Size: {self._format_size(file_info['size'])}
@@ -22,16 +78,89 @@ class GeminiAI:
             4. Safety recommendations
             """
 
-            response = await self.model.generate_content_async(prompt)
-            
-            return {
-                "analysis": response.text,
-                "safety_check": self._safety_check(response.text),
-                "compatibility": self._check_compatibility(file_info)
-            }
+    def _build_batch_prompt(self, files: List[Dict]) -> str:
+        listing = "\n".join(
+            f"File {index}: {info['filename']} | "
+            f"{self._format_size(info['size'])} | {info.get('mime_type', 'unknown')}"
+            for index, info in enumerate(files, 1)
+        )
+        return f"""
+            Analyze each of these media files separately:
+            {listing}
+
+            For every file provide:
+            1. File format analysis
+            2. Estimated video quality (if video)
+            3. Streaming compatibility check
+            4. Safety recommendations
+
+            Start the answer for file N with a line containing only "### FILE N".
+            """
+
+    async def _generate(self, file_info: Dict) -> str:
+        if Config.GEMINI_BATCH_WINDOW > 0:
+            return await self._enqueue(file_info)
+        response = await self.model.generate_content_async(self._build_prompt(file_info))
+        return response.text
+
+    async def _enqueue(self, file_info: Dict) -> str:
+        """Queue an analysis to be sent with others arriving in the same window"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((file_info, future))
+        if len(self._pending) >= Config.GEMINI_BATCH_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(Config.GEMINI_BATCH_WINDOW, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[Dict, asyncio.Future]]):
+        files = [file_info for file_info, _ in batch]
+        try:
+            if len(batch) == 1:
+                response = await self.model.generate_content_async(self._build_prompt(files[0]))
+                sections = [response.text]
+            else:
+                response = await self.model.generate_content_async(self._build_batch_prompt(files))
+                sections = self._split_batch_response(response.text, len(batch))
         except Exception as e:
-            print(f"Gemini Analysis Error: {str(e)}")
-            return None
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (file_info, future), section in zip(batch, sections):
+            if future.done():
+                continue
+            if section:
+                future.set_result(section)
+                continue
+            # The model skipped this file; ask about it on its own
+            try:
+                response = await self.model.generate_content_async(self._build_prompt(file_info))
+                if not future.done():
+                    future.set_result(response.text)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _split_batch_response(self, text: str, count: int) -> List[Optional[str]]:
+        sections: List[Optional[str]] = [None] * count
+        markers = list(BATCH_SECTION_PATTERN.finditer(text))
+        for position, marker in enumerate(markers):
+            index = int(marker.group(1)) - 1
+            end = markers[position + 1].start() if position + 1 < len(markers) else len(text)
+            if 0 <= index < count:
+                sections[index] = text[marker.end():end].strip() or None
+        return sections
 
     def _format_size(self, size_bytes: int) -> str:
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -47,9 +176,4 @@ class GeminiAI:
         }
 
     def _check_compatibility(self, file_info: Dict) -> Dict:
-        return {
-            "vlc": True,
-            "mx_player": True,
-            "playit": True,
-            "notes": "Compatible with all supported players"
-        }
+        return MediaAnalyzer.compatibility(file_info.get('mime_type', 'unknown'))
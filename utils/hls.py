@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import math
+import shutil
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set
+from app.config import Config
+from utils import FileProcessingError
+from utils.cache import SingleFlight, TTLCache
+from utils.chunk_cache import ChunkCache
+
+# Codecs MPEG-TS segments can carry as-is; anything else is re-encoded
+COPY_VIDEO_CODECS = {'h264', 'hevc'}
+COPY_AUDIO_CODECS = {'aac', 'mp3', 'ac3', 'eac3'}
+
+INTERNAL_TOKEN_HEADER = "X-Internal-Token"
+
+@lru_cache(maxsize=None)
+def internal_token() -> str:
+    """Secret shared by every worker, derived from the bot token"""
+    return hashlib.sha256(f"hls-source:{Config.BOT_TOKEN}".encode()).hexdigest()
+
+def is_internal(token: Optional[str]) -> bool:
+    return bool(token) and hmac.compare_digest(token, internal_token())
+
+KeyframeSource = Callable[[str], Awaitable[Optional[List[float]]]]
+
+def plan_segments(duration: float, length: float, keyframes: Optional[Sequence[float]] = None) -> List[float]:
+    """Start time of every segment
+
+    Without keyframes segments are cut every length seconds, which only
+    works when the video is re-encoded. With them each segment starts on
+    a keyframe at least length seconds after the previous start, so
+    copied video never needs a frame from the segment before.
+    """
+    if keyframes is None:
+        return [index * length for index in range(math.ceil(duration / length))]
+    starts = [0.0]
+    for time in keyframes:
+        if time - starts[-1] >= length and time < duration:
+            starts.append(time)
+    return starts
+
+@lru_cache(maxsize=None)
+def ffmpeg_available() -> bool:
+    """HLS is enabled and ffmpeg/ffprobe are installed; checked once"""
+    return Config.HLS_ENABLED and bool(shutil.which(Config.FFMPEG_PATH)) and bool(shutil.which(Config.FFPROBE_PATH))
+
+class HLSRemuxer:
+    """Serve a file as HLS, remuxing segments with ffmpeg only when asked for
+
+    ffmpeg reads from our own /stream endpoint, so segment generation gets
+    the same link refresh and chunk cache as players do. Video is copied
+    when MPEG-TS allows the codec and keyframe_source knows where the
+    keyframes are, with segments cut on them; otherwise it is re-encoded
+    with keyframes forced at every segment start. Finished segments go
+    into a size-bounded disk cache, concurrent requests for one segment
+    share a single ffmpeg run, and the next segment is prepared in the
+    background so playback does not wait on it.
+    """
+
+    def __init__(self, segment_cache: Optional[ChunkCache] = None, keyframe_source: Optional[KeyframeSource] = None):
+        self.segment_cache = segment_cache
+        self.keyframe_source = keyframe_source
+        self.probes = TTLCache(max_size=Config.CACHE_MAX_ENTRIES, ttl=Config.CACHE_TIMEOUT)
+        self._inflight = SingleFlight()
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Held until done, so a prefetch is not garbage-collected mid-run
+        self._prefetches: Set[asyncio.Task] = set()
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(Config.HLS_MAX_PROCESSES)
+        return self._slots
+
+    @staticmethod
+    def source_url(share_id: str) -> str:
+        return f"{Config.HLS_SOURCE_URL}/stream/{share_id}"
+
+    @staticmethod
+    def source_headers() -> List[str]:
+        """ffmpeg input option marking its /stream reads as ours, exempt from the media rate limit"""
+        return ["-headers", f"{INTERNAL_TOKEN_HEADER}: {internal_token()}\r\n"]
+
+    async def probe(self, share_id: str) -> Dict:
+        """Duration and codecs of a file, probed once per share"""
+        cached = self.probes.get(share_id)
+        if cached is not None:
+            return cached
+        return await self._inflight.do(("probe", share_id), lambda: self._probe(share_id))
+
+    async def _probe(self, share_id: str) -> Dict:
+        output = await self._run([
+            Config.FFPROBE_PATH, "-v", "error", "-print_format", "json",
+            "-show_entries", "format=duration:stream=codec_type,codec_name",
+            *self.source_headers(), self.source_url(share_id)
+        ])
+        data = json.loads(output or b"{}")
+        duration = float(data.get("format", {}).get("duration") or 0)
+        if duration <= 0:
+            raise FileProcessingError(f"Could not read the duration of {share_id}")
+        codecs = {}
+        for stream in data.get("streams", []):
+            codecs.setdefault(stream.get("codec_type"), stream.get("codec_name"))
+        info = {"duration": duration, "video_codec": codecs.get("video"), "audio_codec": codecs.get("audio")}
+        keyframes = None
+        if info["video_codec"] in COPY_VIDEO_CODECS and self.keyframe_source is not None:
+            keyframes = await self.keyframe_source(share_id)
+        # Copying video cut anywhere but on a keyframe overlaps the previous segment
+        info["copy_video"] = keyframes is not None
+        info["starts"] = plan_segments(duration, Config.HLS_SEGMENT_SECONDS, keyframes)
+        self.probes.set(share_id, info)
+        return info
+
+    async def playlist(self, share_id: str) -> str:
+        """VOD playlist listing every segment; nothing is remuxed yet"""
+        info = await self.probe(share_id)
+        lengths = [self._bounds(info, index)[1] for index in range(len(info["starts"]))]
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max(lengths))}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:VOD"
+        ]
+        for index, length in enumerate(lengths):
+            lines.append(f"#EXTINF:{length:.3f},")
+            lines.append(f"{index}.ts")
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    async def segment(self, share_id: str, index: int) -> Optional[bytes]:
+        """MPEG-TS bytes of one segment, or None past the end of the file"""
+        info = await self.probe(share_id)
+        count = len(info["starts"])
+        if not 0 <= index < count:
+            return None
+        data = await self._cached_segment(share_id, index, info)
+        if index + 1 < count:
+            task = asyncio.ensure_future(self._prefetch(share_id, index + 1, info))
+            self._prefetches.add(task)
+            task.add_done_callback(self._prefetches.discard)
+        return data
+
+    async def _cached_segment(self, share_id: str, index: int, info: Dict) -> bytes:
+        if self.segment_cache is not None:
+            data = await self.segment_cache.read(share_id, index, 0, self.segment_cache.block_size)
+            if data is not None:
+                return data
+        return await self._inflight.do((share_id, index), lambda: self._remux(share_id, index, info))
+
+    async def _prefetch(self, share_id: str, index: int, info: Dict):
+        if self.segment_cache is None or self.segment_cache.has(share_id, index):
+            return
+        try:
+            await self._cached_segment(share_id, index, info)
+        except Exception as e:
+            logging.warning(f"Prefetch of HLS segment {index} for {share_id} failed: {str(e)}")
+
+    @staticmethod
+    def _bounds(info: Dict, index: int):
+        """Start and length of a segment in seconds"""
+        starts = info["starts"]
+        start = starts[index]
+        end = starts[index + 1] if index + 1 < len(starts) else info["duration"]
+        return start, end - start
+
+    async def _remux(self, share_id: str, index: int, info: Dict) -> bytes:
+        start, length = self._bounds(info, index)
+        # Rounded up so a copy seek cannot land on the keyframe before start
+        seek = math.ceil(start * 1000) / 1000
+        data = await self._run([
+            Config.FFMPEG_PATH, "-hide_banner", "-loglevel", "error",
+            "-ss", f"{seek:.3f}", *self.source_headers(), "-i", self.source_url(share_id), "-t", f"{length:.3f}",
+            "-map", "0:v:0?", "-map", "0:a:0?",
+            *self._codec_args(info),
+            "-output_ts_offset", f"{start:.3f}", "-muxdelay", "0",
+            "-f", "mpegts", "pipe:1"
+        ])
+        if not data:
+            raise FileProcessingError(f"ffmpeg produced no data for segment {index} of {share_id}")
+        if self.segment_cache is not None and len(data) <= self.segment_cache.block_size:
+            await self.segment_cache.write(share_id, index, data)
+        return data
+
+    @staticmethod
+    def _codec_args(info: Dict) -> List[str]:
+        args = []
+        if info.get("copy_video"):
+            args += ["-c:v", "copy"]
+        else:
+            args += [
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+                "-force_key_frames", f"expr:gte(t,n_forced*{Config.HLS_SEGMENT_SECONDS})"
+            ]
+        if info.get("audio_codec") in COPY_AUDIO_CODECS:
+            args += ["-c:a", "copy"]
+        else:
+            args += ["-c:a", "aac", "-b:a", "128k", "-ac", "2"]
+        return args
+
+    def cache_stats(self) -> Optional[Dict]:
+        """Return segment cache counters, or None when HLS is off"""
+        if not self.segment_cache:
+            return None
+        stats = self.segment_cache.stats()
+        stats["coalesced"] = self._inflight.coalesced
+        stats["probes"] = self.probes.stats()
+        return stats
+
+    async def _run(self, command: List[str]) -> bytes:
+        """Run ffmpeg or ffprobe within the process budget and return its stdout"""
+        async with self._get_slots():
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=Config.HLS_PROCESS_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise FileProcessingError(f"{command[0]} timed out")
+            if process.returncode != 0:
+                raise FileProcessingError(f"{command[0]} failed: {stderr.decode(errors='replace').strip()[-300:]}")
+            return stdout
@@ -0,0 +1,142 @@
+import os
+from datetime import datetime, timezone
+from typing import Dict
+from utils import UtilsConfig
+
+# Container name and per-player support, keyed by MIME type
+CONTAINER_PROFILES = {
+    'video/mp4': ('MP4', {'vlc': True, 'mx_player': True, 'playit': True, 'browser': True}),
+    'video/x-matroska': ('Matroska', {'vlc': True, 'mx_player': True, 'playit': True, 'browser': False}),
+    'video/x-msvideo': ('AVI', {'vlc': True, 'mx_player': True, 'playit': True, 'browser': False}),
+    'video/quicktime': ('QuickTime', {'vlc': True, 'mx_player': True, 'playit': True, 'browser': False}),
+    'video/x-ms-wmv': ('Windows Media', {'vlc': True, 'mx_player': True, 'playit': False, 'browser': False})
+}
+
+# Upper size bound (bytes) for each quality guess, smallest first
+QUALITY_BANDS = (
+    (350 * 1024 ** 2, 'SD (480p or lower)'),
+    (1200 * 1024 ** 2, 'HD (720p)'),
+    (4 * 1024 ** 3, 'Full HD (1080p)')
+)
+
+# Lower bound of frame height for each resolution label, largest first
+RESOLUTION_BANDS = (
+    (2000, '4K (2160p)'),
+    (1000, 'Full HD (1080p)'),
+    (700, 'HD (720p)'),
+    (0, 'SD (480p or lower)')
+)
+
+# Extensions that should never hide in front of a media extension
+EXECUTABLE_EXTENSIONS = {'.exe', '.apk', '.bat', '.cmd', '.scr', '.msi', '.js', '.vbs'}
+
+class MediaAnalyzer:
+    """Deterministic analysis of a file from its Terabox metadata and probed header"""
+
+    @staticmethod
+    def analyze(file_info: Dict) -> Dict:
+        """Answer the routine analysis fields without a network call"""
+        filename = file_info.get('filename', '')
+        size = file_info.get('size', 0) or 0
+        mime_type = file_info.get('mime_type') or UtilsConfig.get_mime_type(filename) or 'unknown'
+        container = CONTAINER_PROFILES.get(mime_type, ('Unknown', {}))[0]
+        media = file_info.get('media') or {}
+
+        return {
+            "analysis": {
+                "container": container,
+                "mime_type": mime_type,
+                "extension_matches_type": MediaAnalyzer._extension_matches(filename, mime_type),
+                "estimated_quality": (
+                    MediaAnalyzer.resolution_label(media['height']) if media.get('height')
+                    else MediaAnalyzer.estimate_quality(size)
+                ),
+                "video_codec": media.get('video_codec'),
+                "audio_codec": media.get('audio_codec'),
+                "duration": media.get('duration'),
+                "player_settings": MediaAnalyzer.player_settings(mime_type, size)
+            },
+            "safety_check": MediaAnalyzer.safety_check(filename, mime_type),
+            "compatibility": MediaAnalyzer.compatibility(mime_type),
+            "analysis_timestamp": datetime.now(timezone.utc).isoformat(),
+            "generated_by": "Local metadata analyzer"
+        }
+
+    @staticmethod
+    def compatibility(mime_type: str) -> Dict:
+        """Which players can open this container"""
+        container, players = CONTAINER_PROFILES.get(mime_type, ('Unknown', {}))
+        if not players:
+            return {
+                "vlc": False,
+                "mx_player": False,
+                "playit": False,
+                "notes": "Unsupported format"
+            }
+        unsupported = [name for name, ok in players.items() if not ok and name != 'browser']
+        notes = (
+            "Compatible with all supported players" if not unsupported
+            else f"{container} is not supported by: {', '.join(unsupported)}"
+        )
+        return {
+            "vlc": players['vlc'],
+            "mx_player": players['mx_player'],
+            "playit": players['playit'],
+            "browser": players['browser'],
+            "notes": notes
+        }
+
+    @staticmethod
+    def estimate_quality(size: int) -> str:
+        """Rough resolution guess for a feature-length video of this size"""
+        for upper_bound, label in QUALITY_BANDS:
+            if size < upper_bound:
+                return label
+        return '4K (2160p)'
+
+    @staticmethod
+    def resolution_label(height: int) -> str:
+        """Resolution label for a probed frame height"""
+        for lower_bound, label in RESOLUTION_BANDS:
+            if height >= lower_bound:
+                return label
+        return RESOLUTION_BANDS[-1][1]
+
+    @staticmethod
+    def player_settings(mime_type: str, size: int) -> Dict:
+        """Decoder and buffering suggestions for this file"""
+        legacy_container = mime_type in ('video/x-msvideo', 'video/x-ms-wmv')
+        large = size >= 2 * 1024 ** 3
+        return {
+            "decoder": "SW+" if legacy_container else "HW+",
+            "network_cache_ms": 10000 if large else 3000,
+            "notes": (
+                "Use software decoding for older containers"
+                if legacy_container else "Hardware decoding recommended"
+            )
+        }
+
+    @staticmethod
+    def safety_check(filename: str, mime_type: str) -> Dict:
+        """Flag names that disguise executables or do not match their type"""
+        stem, ext = os.path.splitext(filename.lower())
+        hidden_ext = os.path.splitext(stem)[1]
+        if ext in EXECUTABLE_EXTENSIONS or hidden_ext in EXECUTABLE_EXTENSIONS:
+            return {
+                "status": "warning",
+                "recommendation": "Filename contains an executable extension; do not open it"
+            }
+        if not MediaAnalyzer._extension_matches(filename, mime_type):
+            return {
+                "status": "warning",
+                "recommendation": "File extension does not match its media type"
+            }
+        return {
+            "status": "safe",
+            "recommendation": "File appears safe for streaming"
+        }
+
+    @staticmethod
+    def _extension_matches(filename: str, mime_type: str) -> bool:
+        ext = os.path.splitext(filename.lower())[1]
+        return ext in UtilsConfig.SUPPORTED_MEDIA_TYPES.get(mime_type, [])
@@ -1,28 +1,50 @@
-from typing import Dict
-from urllib.parse import quote
+from typing import Dict, Iterable, Optional
+from app.config import Config
+from utils.hls import ffmpeg_available
+from utils.player_links import PlayerLinkRenderer
+
+# Player templates are compiled once when the module is imported
+player_links = PlayerLinkRenderer(Config.PLAYER_TEMPLATES)
 
 class MediaPlayerHandler:
+    @staticmethod
+    def get_stream_url(file_info: Dict) -> Optional[str]:
+        """Proxied /stream URL for a file, if a public base URL is configured"""
+        if not Config.STREAM_BASE_URL or not file_info.get('share_id'):
+            return None
+        return f"{Config.STREAM_BASE_URL}/stream/{file_info['share_id']}"
+
+    @staticmethod
+    def get_hls_url(file_info: Dict) -> Optional[str]:
+        """HLS playlist URL for a file, if HLS is on and ffmpeg is installed"""
+        if not MediaPlayerHandler.get_stream_url(file_info) or not ffmpeg_available():
+            return None
+        return f"{Config.STREAM_BASE_URL}/hls/{file_info['share_id']}/index.m3u8"
+
     @staticmethod
     def generate_stream_urls(file_info: Dict) -> Dict[str, str]:
-        filename = quote(file_info['filename'])
-        direct_url = quote(file_info['direct_url'])
-        
+        # Players get the proxy when available; raw signed links expire mid-seek
+        stream_url = MediaPlayerHandler.get_stream_url(file_info)
+        playback_url = stream_url or file_info['direct_url']
         return {
             "direct_url": file_info['direct_url'],
-            "players": {
-                "vlc": f"vlc://{direct_url}",
-                "mx_player": (
-                    f"intent:{direct_url}#Intent;"
-                    f"package=com.mxtech.videoplayer.ad;"
-                    f"S.title={filename};end"
-                ),
-                "playit": f"playit://{direct_url}"
-            },
+            "stream_url": stream_url,
+            "hls_url": MediaPlayerHandler.get_hls_url(file_info),
+            "players": player_links.render_all(playback_url, file_info['filename']),
             "filename": file_info['filename'],
             "size": file_info['size'],
-            "mime_type": file_info['mime_type']
+            "mime_type": file_info['mime_type'],
+            "media": file_info.get('media')
         }
 
+    @staticmethod
+    def generate_playlist(files: Iterable[Dict]) -> str:
+        """Build an M3U playlist of converted files, pointing at the proxy when available"""
+        return player_links.render_playlist(
+            (file_info['filename'], MediaPlayerHandler.get_stream_url(file_info) or file_info['direct_url'])
+            for file_info in files
+        )
+
     @staticmethod
     def check_format_support(mime_type: str) -> bool:
         supported_types = [
@@ -0,0 +1,90 @@
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Characters left as-is when a URL is embedded after a scheme prefix
+URL_SAFE_CHARS = ":/?&=%@+,;~!$'()*"
+UNRESERVED_BYTES = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~")
+
+class Quoter:
+    """Percent-encoder equivalent to urllib.parse.quote with a fixed safe set
+
+    The byte-to-escape table is built once, so quoting is a single
+    str.translate over the UTF-8 bytes instead of a per-character loop.
+    """
+    __slots__ = ('table',)
+
+    def __init__(self, safe: str = ""):
+        safe_bytes = UNRESERVED_BYTES | frozenset(safe.encode('ascii'))
+        self.table = [chr(b) if b in safe_bytes else f"%{b:02X}" for b in range(256)]
+
+    def __call__(self, text: str) -> str:
+        return text.encode('utf-8').decode('latin-1').translate(self.table)
+
+quote_url = Quoter(URL_SAFE_CHARS)
+quote_component = Quoter()
+
+LINE_BREAKS = str.maketrans("\r\n", "  ")
+
+TEMPLATE_FIELDS = frozenset({'url', 'url_encoded', 'title'})
+
+class PlayerTemplate:
+    """A player URL template split into literal text and field names once"""
+    __slots__ = ('name', 'parts')
+
+    def __init__(self, name: str, template: str):
+        self.name = name
+        self.parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(template)
+        ]
+        unknown = {field for _, field in self.parts if field} - TEMPLATE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown fields in {name} player template: {', '.join(sorted(unknown))}")
+
+    def render(self, fields: Dict[str, str]) -> str:
+        return "".join([
+            literal + fields[field] if field else literal
+            for literal, field in self.parts
+        ])
+
+class PlayerLinkRenderer:
+    """Render every player link for a file from precompiled templates
+
+    Templates may use {url} (direct URL with only unsafe characters escaped),
+    {url_encoded} (direct URL encoded as a query value) and {title} (encoded
+    filename). Each is computed once per file, however many players use it.
+    """
+
+    def __init__(self, templates: Dict[str, str]):
+        self.templates = [PlayerTemplate(name, template) for name, template in templates.items()]
+        self._by_name = {template.name: template for template in self.templates}
+
+    @staticmethod
+    def prepare_fields(direct_url: str, filename: str) -> Dict[str, str]:
+        """Quote the URL and filename once for all templates"""
+        return {
+            "url": quote_url(direct_url),
+            "url_encoded": quote_component(direct_url),
+            "title": quote_component(filename)
+        }
+
+    def render_all(self, direct_url: str, filename: str) -> Dict[str, str]:
+        """Render every configured player link in one pass"""
+        fields = self.prepare_fields(direct_url, filename)
+        return {template.name: template.render(fields) for template in self.templates}
+
+    def render(self, player: str, direct_url: str, filename: str) -> Optional[str]:
+        """Render a single player link, or None for an unknown player"""
+        template = self._by_name.get(player)
+        if template is None:
+            return None
+        return template.render(self.prepare_fields(direct_url, filename))
+
+    @staticmethod
+    def render_playlist(entries: Iterable[Tuple[str, str]]) -> str:
+        """Build an extended M3U playlist from (title, url) pairs"""
+        lines = ["#EXTM3U"]
+        for title, url in entries:
+            # A line break in a filename would start a new playlist line
+            lines.append(f"#EXTINF:-1,{title.translate(LINE_BREAKS)}")
+            lines.append(quote_url(url))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,384 @@
+import asyncio
+import json
+import logging
+import shutil
+import struct
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import Config
+from utils.cache import SingleFlight, TTLCache
+from utils.stream import StreamProxy
+
+# libmagic answers that mean the same container under another name
+MIME_ALIASES = {
+    'video/x-ms-asf': 'video/x-ms-wmv',
+    'video/avi': 'video/x-msvideo',
+    'video/msvideo': 'video/x-msvideo',
+    'video/x-m4v': 'video/mp4',
+    'video/3gpp': 'video/mp4'
+}
+
+ASF_GUID = bytes.fromhex('3026b2758e66cf11a6d900aa0062ce6c')
+
+# MP4 sample entry fourcc to codec name, as ffprobe reports them
+MP4_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264', b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'av01': 'av1', b'vp09': 'vp9', b'mp4v': 'mpeg4',
+    b'mp4a': 'aac', b'ac-3': 'ac3', b'ec-3': 'eac3', b'.mp3': 'mp3', b'Opus': 'opus'
+}
+
+MAX_TOP_LEVEL_BOXES = 32  # Ranged reads spent looking for moov
+
+ReadRange = Callable[[int, int], Awaitable[Optional[bytes]]]
+
+@lru_cache(maxsize=None)
+def ffprobe_available() -> bool:
+    return bool(shutil.which(Config.FFPROBE_PATH))
+
+def sniff_mime(head: bytes) -> Optional[str]:
+    """Container MIME type from the file header, via libmagic when installed"""
+    try:
+        import magic
+        mime = magic.from_buffer(head, mime=True)
+        if mime and mime != 'application/octet-stream':
+            return MIME_ALIASES.get(mime, mime)
+    except ImportError:
+        pass
+    except Exception as e:
+        logging.warning(f"libmagic failed: {str(e)}")
+    return signature_mime(head)
+
+def signature_mime(head: bytes) -> Optional[str]:
+    """Recognise the video containers we support by their magic bytes"""
+    if head[4:8] == b'ftyp':
+        return 'video/quicktime' if head[8:12] == b'qt  ' else 'video/mp4'
+    if head[:4] == b'\x1aE\xdf\xa3':
+        return 'video/webm' if b'webm' in head[:64] else 'video/x-matroska'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'video/x-msvideo'
+    if head[:16] == ASF_GUID:
+        return 'video/x-ms-wmv'
+    if head[:3] == b'FLV':
+        return 'video/x-flv'
+    if len(head) > 188 and head[0] == 0x47 and head[188] == 0x47:
+        return 'video/mp2t'
+    return None
+
+def box_header(data: bytes, offset: int, end: int) -> Optional[Tuple[bytes, int, int]]:
+    """Type, header length and total size of the MP4 box at offset"""
+    if offset + 8 > end:
+        return None
+    size, kind = struct.unpack('>I4s', data[offset:offset + 8])
+    header = 8
+    if size == 1:
+        if offset + 16 > end:
+            return None
+        size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+        header = 16
+    elif size == 0:
+        size = end - offset
+    if size < header:
+        return None
+    return kind, header, size
+
+def child_box(data: bytes, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    """Content range of the first child box of the given type"""
+    offset = start
+    while True:
+        header = box_header(data, offset, end)
+        if header is None:
+            return None
+        found, length, size = header
+        if found == kind:
+            return offset + length, min(offset + size, end)
+        offset += size
+
+def parse_moov(moov: bytes) -> Dict:
+    """Duration, codecs and resolution from an MP4 moov box"""
+    info = {"duration": None, "video_codec": None, "audio_codec": None, "width": None, "height": None}
+    header = box_header(moov, 0, len(moov))
+    if header is None or header[0] != b'moov':
+        return info
+    start, end = header[1], len(moov)
+
+    mvhd = child_box(moov, start, end, b'mvhd')
+    if mvhd:
+        body = moov[mvhd[0]:mvhd[1]]
+        if body[:1] == b'\x01' and len(body) >= 32:
+            timescale, duration = struct.unpack('>IQ', body[20:32])
+        elif len(body) >= 20:
+            timescale, duration = struct.unpack('>II', body[12:20])
+        else:
+            timescale = duration = 0
+        if timescale:
+            info["duration"] = round(duration / timescale, 3)
+
+    offset = start
+    while True:
+        trak = child_box(moov, offset, end, b'trak')
+        if trak is None:
+            break
+        offset = trak[1]
+        mdia = child_box(moov, trak[0], trak[1], b'mdia')
+        hdlr = mdia and child_box(moov, mdia[0], mdia[1], b'hdlr')
+        if not hdlr:
+            continue
+        handler = moov[hdlr[0] + 8:hdlr[0] + 12]
+        minf = child_box(moov, mdia[0], mdia[1], b'minf')
+        stbl = minf and child_box(moov, minf[0], minf[1], b'stbl')
+        stsd = stbl and child_box(moov, stbl[0], stbl[1], b'stsd')
+        fourcc = moov[stsd[0] + 12:stsd[0] + 16] if stsd else b''
+        codec = MP4_CODECS.get(fourcc, fourcc.decode('latin-1').strip() or None)
+        if handler == b'vide' and info["video_codec"] is None:
+            info["video_codec"] = codec
+            tkhd = child_box(moov, trak[0], trak[1], b'tkhd')
+            if tkhd:
+                body = moov[tkhd[0]:tkhd[1]]
+                position = 88 if body[:1] == b'\x01' else 76
+                if len(body) >= position + 8:
+                    width, height = struct.unpack('>II', body[position:position + 8])
+                    info["width"], info["height"] = width >> 16, height >> 16
+        elif handler == b'soun' and info["audio_codec"] is None:
+            info["audio_codec"] = codec
+    return info
+
+def _table(moov: bytes, box: Optional[Tuple[int, int]], row: str) -> List[Tuple[int, ...]]:
+    """Rows of a sample table box (stts, stss, ctts, elst) after its entry count"""
+    if not box:
+        return []
+    start, end = box
+    count = struct.unpack('>I', moov[start + 4:start + 8])[0]
+    size = struct.calcsize(row)
+    count = min(count, (end - start - 8) // size)
+    return list(struct.iter_unpack(row, moov[start + 8:start + 8 + count * size]))
+
+def keyframe_times(moov: bytes) -> Optional[List[float]]:
+    """Presentation times in seconds of the video track's sync samples
+
+    Read from the sample tables (stss, stts, ctts) and the edit list, the
+    same way ffmpeg's MP4 demuxer places them. None when the file has no
+    video track or no sync sample table.
+    """
+    header = box_header(moov, 0, len(moov))
+    if header is None or header[0] != b'moov':
+        return None
+    offset, end = header[1], len(moov)
+    while True:
+        trak = child_box(moov, offset, end, b'trak')
+        if trak is None:
+            return None
+        offset = trak[1]
+        mdia = child_box(moov, trak[0], trak[1], b'mdia')
+        hdlr = mdia and child_box(moov, mdia[0], mdia[1], b'hdlr')
+        if hdlr and moov[hdlr[0] + 8:hdlr[0] + 12] == b'vide':
+            break
+
+    mdhd = child_box(moov, mdia[0], mdia[1], b'mdhd')
+    if not mdhd:
+        return None
+    body = moov[mdhd[0]:mdhd[1]]
+    position = 20 if body[:1] == b'\x01' else 12
+    if len(body) < position + 4:
+        return None
+    timescale = struct.unpack('>I', body[position:position + 4])[0]
+    minf = child_box(moov, mdia[0], mdia[1], b'minf')
+    stbl = minf and child_box(moov, minf[0], minf[1], b'stbl')
+    stss = stbl and child_box(moov, stbl[0], stbl[1], b'stss')
+    if not timescale or not stss:
+        return None
+    syncs = sorted(number for number, in _table(moov, stss, '>I'))
+    stts = _table(moov, child_box(moov, stbl[0], stbl[1], b'stts'), '>II')
+    ctts_box = child_box(moov, stbl[0], stbl[1], b'ctts')
+    # Version 1 ctts offsets are signed; version 0 ones are in practice too
+    ctts = _table(moov, ctts_box, '>Ii')
+
+    shift = 0
+    edts = child_box(moov, trak[0], trak[1], b'edts')
+    elst = edts and child_box(moov, edts[0], edts[1], b'elst')
+    if elst:
+        row = '>QqI' if moov[elst[0]:elst[0] + 1] == b'\x01' else '>IiI'
+        for _, media_time, _ in _table(moov, elst, row):
+            if media_time >= 0:
+                shift = media_time
+                break
+
+    def sample_values(runs: List[Tuple[int, int]], cumulative: bool) -> List[int]:
+        """Value at each sync sample: the running sum of deltas, or the run's offset"""
+        values = []
+        run, used, total = 0, 0, 0
+        sample = 1
+        for number in syncs:
+            while run < len(runs) and sample + (runs[run][0] - used) <= number:
+                count, value = runs[run]
+                total += (count - used) * value
+                sample += count - used
+                run, used = run + 1, 0
+            if run < len(runs):
+                step = number - sample
+                total += step * runs[run][1]
+                used += step
+                sample = number
+                values.append(total if cumulative else runs[run][1])
+            else:
+                values.append(total if cumulative else 0)
+        return values
+
+    dts = sample_values(stts, cumulative=True)
+    offsets = sample_values(ctts, cumulative=False) if ctts else [0] * len(dts)
+    return [max(0.0, (decode + offset - shift) / timescale) for decode, offset in zip(dts, offsets)]
+
+class MediaProber:
+    """Find a file's real container, codecs, duration and resolution from its header
+
+    Only the first PROBE_HEAD_BYTES are fetched, over a Range request, plus
+    the moov box for MP4/QuickTime wherever it sits in the file. Other
+    containers fall back to ffprobe on the same header bytes. Results are
+    memoized by fs_id, since a file's content never changes under it.
+    """
+
+    def __init__(self, stream_proxy: StreamProxy):
+        self.stream_proxy = stream_proxy
+        self.cache = TTLCache(max_size=Config.CACHE_MAX_ENTRIES, ttl=Config.PROBE_CACHE_TTL)
+        # Kept apart from the probe results, which are returned to API callers
+        self.keyframe_cache = TTLCache(max_size=Config.CACHE_MAX_ENTRIES, ttl=Config.PROBE_CACHE_TTL)
+        self._inflight = SingleFlight()
+
+    async def probe(self, file_info: Dict) -> Optional[Dict]:
+        """Probe a resolved file; None when the header could not be read"""
+        key = file_info.get("fs_id") or file_info.get("share_id")
+        if not key or not file_info.get("direct_url"):
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            result = await self._inflight.do(key, lambda: asyncio.wait_for(
+                self._probe(file_info), timeout=Config.PROBE_TIMEOUT
+            ))
+        except asyncio.TimeoutError:
+            logging.warning(f"Probe timed out for {file_info.get('share_id')}")
+            return None
+        except Exception as e:
+            logging.warning(f"Probe failed for {file_info.get('share_id')}: {str(e)}")
+            return None
+        if result is not None:
+            self.cache.set(key, result)
+        return result
+
+    async def keyframes(self, file_info: Dict) -> Optional[List[float]]:
+        """Keyframe times of an MP4/QuickTime file from its moov index, or None if unknown"""
+        key = file_info.get("fs_id") or file_info.get("share_id")
+        if not key or not file_info.get("direct_url"):
+            return None
+        cached = self.keyframe_cache.get(key)
+        if cached is not None:
+            return cached or None
+        try:
+            times = await self._inflight.do(("keyframes", key), lambda: asyncio.wait_for(
+                self._keyframes(file_info), timeout=Config.PROBE_TIMEOUT
+            ))
+        except Exception as e:
+            logging.warning(f"Keyframe index of {file_info.get('share_id')} unavailable: {str(e) or type(e).__name__}")
+            return None
+        # An empty list remembers that the file has no usable index
+        self.keyframe_cache.set(key, times or [])
+        return times
+
+    async def _keyframes(self, file_info: Dict) -> Optional[List[float]]:
+        read = self._reader(file_info)
+        head = await read(0, Config.PROBE_HEAD_BYTES - 1)
+        if not head or signature_mime(head) not in ('video/mp4', 'video/quicktime'):
+            return None
+        moov = await self._find_moov(read, head, int(file_info.get("size") or 0))
+        return keyframe_times(moov) if moov else None
+
+    def _reader(self, file_info: Dict) -> ReadRange:
+        size = int(file_info.get("size") or 0)
+        share_id = file_info.get("share_id")
+
+        async def read(start: int, end: int) -> Optional[bytes]:
+            if size:
+                end = min(end, size - 1)
+            return await self.stream_proxy.read_range(share_id, file_info, start, end)
+        return read
+
+    async def _probe(self, file_info: Dict) -> Optional[Dict]:
+        size = int(file_info.get("size") or 0)
+        read = self._reader(file_info)
+        head = await read(0, Config.PROBE_HEAD_BYTES - 1)
+        if not head:
+            return None
+        result = {
+            "mime_type": sniff_mime(head),
+            "duration": None,
+            "video_codec": None,
+            "audio_codec": None,
+            "width": None,
+            "height": None,
+            "probed_by": "header"
+        }
+        if result["mime_type"] in ('video/mp4', 'video/quicktime'):
+            moov = await self._find_moov(read, head, size)
+            if moov:
+                result.update(parse_moov(moov), probed_by="moov")
+                return result
+        if result["mime_type"] and result["mime_type"].startswith('video/') and ffprobe_available():
+            details = await self._ffprobe(head)
+            if details:
+                result.update(details, probed_by="ffprobe")
+        return result
+
+    async def _find_moov(self, read: ReadRange, head: bytes, size: int) -> Optional[bytes]:
+        """Walk top-level boxes, reading only headers beyond the first bytes, to fetch moov"""
+        offset = 0
+        for _ in range(MAX_TOP_LEVEL_BOXES):
+            if size and offset + 8 > size:
+                return None
+            header_bytes = head[offset:offset + 16]
+            if len(header_bytes) < 16 and not (size and offset + len(header_bytes) >= size):
+                header_bytes = await read(offset, offset + 15)
+            header = header_bytes and box_header(header_bytes, 0, len(header_bytes))
+            if not header:
+                return None
+            kind, _, box_size = header
+            if kind == b'moov':
+                if box_size > Config.PROBE_MAX_MOOV_BYTES:
+                    return None
+                if offset + box_size <= len(head):
+                    return head[offset:offset + box_size]
+                return await read(offset, offset + box_size - 1)
+            offset += box_size
+        return None
+
+    @staticmethod
+    async def _ffprobe(head: bytes) -> Optional[Dict]:
+        """Ask ffprobe about the header bytes; a truncated file is fine for this"""
+        process = await asyncio.create_subprocess_exec(
+            Config.FFPROBE_PATH, "-v", "error", "-print_format", "json",
+            "-show_entries", "format=duration:stream=codec_type,codec_name,width,height",
+            "-i", "pipe:0",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            stdout, _ = await process.communicate(head)
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        try:
+            data = json.loads(stdout or b"{}")
+        except ValueError:
+            return None
+        details = {}
+        duration = data.get("format", {}).get("duration")
+        if duration:
+            details["duration"] = round(float(duration), 3)
+        for stream in data.get("streams", []):
+            if stream.get("codec_type") == "video" and "video_codec" not in details:
+                details["video_codec"] = stream.get("codec_name")
+                details["width"], details["height"] = stream.get("width"), stream.get("height")
+            elif stream.get("codec_type") == "audio" and "audio_codec" not in details:
+                details["audio_codec"] = stream.get("codec_name")
+        return details or None
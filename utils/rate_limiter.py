@@ -0,0 +1,97 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+class _Window:
+    """Per-key counters for the current and previous fixed windows"""
+    __slots__ = ('index', 'current', 'previous')
+
+    def __init__(self, index: int):
+        self.index = index
+        self.current = 0
+        self.previous = 0
+
+class RateLimitBackend(ABC):
+    """Storage for rate-limit counters
+
+    Implement this to share one limit across worker processes; every
+    method must be safe to call concurrently from one event loop.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, cost: int, limit: int, window: int, now: float) -> bool:
+        """Count cost against key if it fits in the limit and return whether it did"""
+
+    @abstractmethod
+    async def evict_idle(self, window: int, now: float) -> int:
+        """Drop keys with no activity in the last two windows"""
+
+class MemoryBackend(RateLimitBackend):
+    """In-process sliding-window counters"""
+
+    def __init__(self):
+        self._windows: Dict[str, _Window] = {}
+
+    async def hit(self, key: str, cost: int, limit: int, window: int, now: float) -> bool:
+        index = int(now // window)
+        state = self._windows.get(key)
+        if state is None:
+            state = self._windows[key] = _Window(index)
+        elif state.index != index:
+            state.previous = state.current if state.index == index - 1 else 0
+            state.current = 0
+            state.index = index
+
+        # Weight the previous window by how much of it still overlaps
+        overlap = 1 - (now % window) / window
+        if state.previous * overlap + state.current + cost > limit:
+            return False
+        state.current += cost
+        return True
+
+    async def evict_idle(self, window: int, now: float) -> int:
+        stale_before = int(now // window) - 1
+        idle = [key for key, state in self._windows.items() if state.index < stale_before]
+        for key in idle:
+            del self._windows[key]
+        return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+class RateLimiter:
+    """Sliding-window request limiter with O(1) checks per key
+
+    The default MemoryBackend counts per process, so with several uvicorn
+    workers each one enforces max_requests on its own; pass a shared
+    backend to hold the limit across them.
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        window: int,
+        backend: Optional[RateLimitBackend] = None,
+        evict_interval: Optional[float] = None
+    ):
+        self.max_requests = max_requests
+        self.window = window
+        # An empty MemoryBackend is falsy, so test for None explicitly
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.evict_interval = evict_interval or window
+        self.rejected = 0
+        self._next_eviction = time.time() + self.evict_interval
+
+    async def allow(self, key: str, cost: int = 1) -> bool:
+        """Record a request for key and return False when it is over the limit"""
+        # A cost above the limit could never fit, so it only takes a whole window
+        cost = min(cost, self.max_requests)
+        now = time.time()
+        if now >= self._next_eviction:
+            self._next_eviction = now + self.evict_interval
+            await self.backend.evict_idle(self.window, now)
+
+        allowed = await self.backend.hit(key, cost, self.max_requests, self.window, now)
+        if not allowed:
+            self.rejected += 1
+        return allowed
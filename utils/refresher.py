@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.config import Config
+from utils.terabox import TeraboxDownloader
+
+COLD_SCORE = 0.1  # Decayed request count below which a share is forgotten
+
+class LinkRefresher:
+    """Re-resolve popular shares before their cached direct link runs out
+
+    Every request bumps a per-share score that halves each half_life
+    seconds. A sweep every interval seconds finds shares scoring at least
+    min_score whose cached link expires within lead_time (or already has)
+    and renews them, hottest first, at most concurrency at a time. Users
+    of hot links therefore keep hitting a warm cache. Shares whose score
+    decays away are dropped and not refreshed again until requested. At
+    most max_tracked shares are scored; the least recently requested one
+    makes room for a new one.
+    """
+
+    def __init__(self, downloader: TeraboxDownloader, interval: float, lead_time: float,
+                 concurrency: int, min_score: float, half_life: float,
+                 max_tracked: int = 10000):
+        self.downloader = downloader
+        self.interval = interval
+        self.lead_time = lead_time
+        self.concurrency = concurrency
+        self.min_score = min_score
+        self.half_life = half_life
+        self.max_tracked = max_tracked
+        self._scores: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._retry_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.unchanged = 0
+
+    @classmethod
+    def from_config(cls, downloader: TeraboxDownloader) -> 'LinkRefresher':
+        """Build the refresher from the REFRESH_* settings"""
+        return cls(
+            downloader,
+            interval=Config.REFRESH_INTERVAL,
+            lead_time=Config.REFRESH_LEAD_TIME,
+            concurrency=Config.REFRESH_CONCURRENCY,
+            min_score=Config.REFRESH_MIN_SCORE,
+            half_life=Config.REFRESH_HALF_LIFE,
+            max_tracked=Config.REFRESH_MAX_TRACKED
+        )
+
+    def touch(self, share_id: str):
+        """Count one successfully served request for share_id"""
+        now = time.monotonic()
+        score, seen = self._scores.pop(share_id, (0.0, now))
+        self._scores[share_id] = (self._decayed(score, seen, now) + 1, now)
+        while len(self._scores) > self.max_tracked:
+            evicted, _ = self._scores.popitem(last=False)
+            self._retry_at.pop(evicted, None)
+
+    def _decayed(self, score: float, seen: float, now: float) -> float:
+        return score * math.pow(0.5, (now - seen) / self.half_life)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logging.error(f"Link refresh sweep failed: {str(e)}")
+
+    async def sweep(self) -> int:
+        """Renew every hot share that is close to expiry; returns how many were renewed"""
+        self.sweeps += 1
+        now = time.monotonic()
+        due = []
+        for share_id, (score, seen) in list(self._scores.items()):
+            score = self._decayed(score, seen, now)
+            if score < COLD_SCORE:
+                del self._scores[share_id]
+                self._retry_at.pop(share_id, None)
+                continue
+            if score < self.min_score or self._retry_at.get(share_id, 0) > now:
+                continue
+            remaining = self.downloader.cache.expires_in(share_id)
+            if remaining is None or remaining <= self.lead_time:
+                due.append((score, share_id))
+        if not due:
+            return 0
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def renew(share_id: str) -> bool:
+            async with slots:
+                result = await self.downloader.renew(share_id)
+            if result is None:
+                # Back off so a dead share does not take a slot every sweep
+                self._retry_at[share_id] = time.monotonic() + self.lead_time
+                self.failed += 1
+                return False
+            remaining = self.downloader.cache.expires_in(share_id)
+            if remaining is None or remaining <= self.lead_time:
+                # Upstream handed back a link (often the same one) that does
+                # not outlive the lead time; wait for it to lapse rather than
+                # renewing it again on every sweep
+                self._retry_at[share_id] = time.monotonic() + (remaining or self.lead_time)
+                self.unchanged += 1
+                return False
+            self._retry_at.pop(share_id, None)
+            self.refreshed += 1
+            return True
+
+        due.sort(reverse=True)
+        results = await asyncio.gather(*[renew(share_id) for _, share_id in due])
+        return sum(results)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        hot = sum(
+            1 for score, seen in self._scores.values()
+            if self._decayed(score, seen, now) >= self.min_score
+        )
+        return {
+            "tracked": len(self._scores),
+            "hot": hot,
+            "sweeps": self.sweeps,
+            "refreshed": self.refreshed,
+            "unchanged": self.unchanged,
+            "failed": self.failed
+        }
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import random
+import time
+import aiohttp
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+from utils import TeraboxError
+from utils.metrics import UPSTREAM_ERRORS
+
+T = TypeVar('T')
+
+class UpstreamError(TeraboxError):
+    """Transient upstream failure that is worth retrying"""
+    # Whether the failure counts against the host's circuit breaker
+    host_failure = True
+
+class CircuitOpenError(UpstreamError):
+    """Every upstream host is failing and calls are rejected without trying"""
+    pass
+
+class CircuitBreaker:
+    """Fail fast after repeated failures, then let one probe through after a pause
+
+    Closed: calls pass and consecutive failures are counted. Open: calls are
+    rejected until reset_timeout has passed. Half-open: a single probe call
+    decides whether to close again or re-open.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; claims the probe slot when half-open"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._state = self.CLOSED
+
+    def release_probe(self):
+        """Give the half-open probe slot back without judging the host"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class RetryBudget:
+    """Allow retries only up to a fraction of recent calls
+
+    Every call deposits ratio tokens and every retry spends one, so a
+    degraded upstream sees at most (1 + ratio) times the normal load instead
+    of (1 + retries) times.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given zero-based retry"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+async def hedge(calls: Sequence[Callable[[], Awaitable[T]]], delay: Optional[float]) -> T:
+    """Start calls one after another every delay seconds and return the first success
+
+    A call that fails early starts the next one right away; with no delay
+    each call only starts after the previous one failed. The losers are
+    cancelled; if every call fails the last error is raised.
+    """
+    pending: List[asyncio.Future] = []
+    remaining = list(calls)
+    error: Optional[BaseException] = None
+    try:
+        while remaining or pending:
+            if remaining:
+                pending.append(asyncio.ensure_future(remaining.pop(0)()))
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=delay if remaining else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        for future in pending:
+            future.cancel()
+
+class UpstreamPolicy:
+    """Deadlines, jittered retries, per-host circuit breakers and hedging for upstream calls
+
+    call() takes a function of the host to contact. Hosts whose breaker is
+    open are skipped; with a hedge delay the remaining hosts are raced,
+    otherwise they are tried in order as fallbacks. Only UpstreamError and
+    connection-level errors are retried, and never past the call deadline.
+    """
+
+    def __init__(self, hosts: Sequence[str], attempt_timeout: float, deadline: float,
+                 retries: int, backoff_base: float, backoff_max: float,
+                 hedge_delay: float = 0, failure_threshold: int = 5,
+                 reset_timeout: float = 30, retry_budget: Optional[RetryBudget] = None):
+        self.hosts = list(hosts)
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.budget = retry_budget or RetryBudget()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retried = 0
+        self.rejected = 0
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def stats(self) -> Dict:
+        """Return retry counters and the state of every breaker"""
+        return {
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "retry_tokens": round(self.budget.tokens, 2),
+            "breakers": {host: breaker.state for host, breaker in self.breakers.items()}
+        }
+
+    async def call(self, func: Callable[[str], Awaitable[T]], hosts: Optional[Sequence[str]] = None) -> T:
+        """Run func against the upstream hosts under the policy"""
+        hosts = list(hosts) if hosts else self.hosts
+        deadline = time.monotonic() + self.deadline
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(
+                    self._attempt(func, hosts),
+                    timeout=max(deadline - time.monotonic(), 0)
+                )
+            except CircuitOpenError:
+                self.rejected += 1
+                UPSTREAM_ERRORS.labels("CircuitOpenError").inc()
+                raise
+            except (UpstreamError, asyncio.TimeoutError) as e:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                if (attempt >= self.retries or time.monotonic() + delay >= deadline
+                        or not self.budget.withdraw()):
+                    raise UpstreamError(f"Upstream failed after {attempt + 1} attempts: {str(e) or type(e).__name__}")
+                attempt += 1
+                self.retried += 1
+                logging.warning(f"Upstream attempt {attempt} failed, retrying in {delay:.2f}s: {str(e) or type(e).__name__}")
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, func: Callable[[str], Awaitable[T]], hosts: List[str]) -> T:
+        available = [host for host in hosts if self.breaker(host).state != CircuitBreaker.OPEN]
+        if not available:
+            raise CircuitOpenError(f"Circuit open for {', '.join(hosts)}")
+        calls = [lambda host=host: self._call_host(func, host) for host in available]
+        # Without a hedge delay the other hosts are plain fallbacks
+        return await hedge(calls, self.hedge_delay if self.hedge_delay > 0 else None)
+
+    async def _call_host(self, func: Callable[[str], Awaitable[T]], host: str) -> T:
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            raise UpstreamError(f"{host}: circuit open")
+        try:
+            result = await asyncio.wait_for(func(host), timeout=self.attempt_timeout)
+        except asyncio.CancelledError:
+            # Lost a hedge race; says nothing about the host's health
+            breaker.release_probe()
+            raise
+        except UpstreamError as e:
+            UPSTREAM_ERRORS.labels(type(e).__name__).inc()
+            if e.host_failure:
+                breaker.record_failure()
+            else:
+                breaker.release_probe()
+            raise
+        except (asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+            UPSTREAM_ERRORS.labels(type(e).__name__).inc()
+            breaker.record_failure()
+            raise UpstreamError(f"{host}: {str(e) or type(e).__name__}") from e
+        breaker.record_success()
+        return result
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, List, Optional
+from utils.cache import TTLCache
+
+SendCall = Callable[[], Awaitable[Any]]
+
+MAX_MESSAGE_LENGTH = 4096
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of refusing
+
+    reserve() always takes a token, letting the balance go negative, and
+    returns how long the caller must wait before using it. Callers are
+    therefore served in the order they reserved, without a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+class _Job:
+    """One queued Bot API call; call is swapped in place when an edit is coalesced"""
+    __slots__ = ('call', 'key', 'future')
+
+    def __init__(self, call: SendCall, key: Optional[Hashable]):
+        self.call = call
+        self.key = key
+        self.future = asyncio.get_running_loop().create_future()
+
+class SendQueue:
+    """Central scheduler for outbound Telegram calls
+
+    Each chat drains its own FIFO under a per-chat token bucket (stricter
+    for groups), and every call also takes a token from one global bucket,
+    so sends go out at Telegram's ceiling but not above it. RetryAfter
+    pauses the chat for the time Telegram asks and the call is retried
+    instead of dropped. Edits to a message that are still queued collapse
+    into the latest one. Admin alerts are batched into one message per
+    admin every alert_interval seconds.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        global_burst: int,
+        chat_rate: float,
+        group_rate: float,
+        chat_burst: int,
+        admin_ids: Iterable[int] = (),
+        alert_interval: float = 30
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.admin_ids = set(admin_ids)
+        self.alert_interval = alert_interval
+        # An idle chat's bucket is full again long before it expires here
+        self._buckets = TTLCache(max_size=10000, ttl=60)
+        self._queues: Dict[Hashable, Deque[_Job]] = {}
+        self._pending: Dict[Hashable, _Job] = {}
+        self._paused_until: Dict[Hashable, float] = {}
+        self._alerts: List[str] = []
+        self._alert_bot = None
+        self._alert_task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def send(self, chat_id: Hashable, call: SendCall, key: Optional[Hashable] = None) -> Any:
+        """Queue call for chat_id and return its result once sent
+
+        Calls sharing a key while still queued are coalesced: only the last
+        one runs and every caller gets its result.
+        """
+        job = self._pending.get(key) if key is not None else None
+        if job is not None:
+            job.call = call
+            self.coalesced += 1
+        else:
+            job = _Job(call, key)
+            if key is not None:
+                self._pending[key] = job
+            queue = self._queues.get(chat_id)
+            if queue is None:
+                queue = self._queues[chat_id] = deque()
+                asyncio.ensure_future(self._drain(chat_id, queue))
+            queue.append(job)
+        # The caller going away must not cancel a send other callers share
+        return await asyncio.shield(job.future)
+
+    def reply(self, message, text: str, **kwargs) -> Awaitable:
+        return self.send(message.chat_id, lambda: message.reply_text(text, **kwargs))
+
+    def edit(self, message, text: str, **kwargs) -> Awaitable:
+        return self.send(
+            message.chat_id,
+            lambda: message.edit_text(text, **kwargs),
+            key=("edit", message.chat_id, message.message_id)
+        )
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Negative IDs are groups and channels, which Telegram limits per minute
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._buckets.set(chat_id, bucket)
+        return bucket
+
+    async def _drain(self, chat_id: Hashable, queue: Deque[_Job]):
+        from telegram.error import BadRequest, RetryAfter
+
+        try:
+            while queue:
+                pause = self._paused_until.pop(chat_id, 0) - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                delay = self._chat_bucket(chat_id).reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+                delay = self.global_bucket.reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+
+                # Taken only now, so edits that arrived while we waited are already merged
+                job = queue.popleft()
+                if job.key is not None:
+                    self._pending.pop(job.key, None)
+                try:
+                    result = await job.call()
+                except RetryAfter as e:
+                    retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                    logging.warning(f"Telegram asked to retry chat {chat_id} after {retry_after}s")
+                    self.retried += 1
+                    self._paused_until[chat_id] = time.monotonic() + retry_after
+                    queue.appendleft(job)
+                    if job.key is not None:
+                        self._pending.setdefault(job.key, job)
+                    continue
+                except BadRequest as e:
+                    if "not modified" in str(e).lower():
+                        # A coalesced edit can repeat the text already shown
+                        job.future.set_result(None)
+                    else:
+                        self.failed += 1
+                        job.future.set_exception(e)
+                    continue
+                except Exception as e:
+                    self.failed += 1
+                    job.future.set_exception(e)
+                    continue
+                self.sent += 1
+                job.future.set_result(result)
+        finally:
+            self._queues.pop(chat_id, None)
+            for job in queue:
+                if not job.future.done():
+                    job.future.cancel()
+
+    def alert(self, bot, text: str):
+        """Queue an admin alert; alerts are sent together after alert_interval"""
+        self._alert_bot = bot
+        self._alerts.append(text)
+        if self._alert_task is None:
+            self._alert_task = asyncio.ensure_future(self._flush_alerts_later())
+
+    async def _flush_alerts_later(self):
+        try:
+            await asyncio.sleep(self.alert_interval)
+        finally:
+            self._alert_task = None
+        await self.flush_alerts()
+
+    async def flush_alerts(self):
+        """Send every queued alert now, as one message per admin"""
+        alerts, self._alerts = self._alerts, []
+        if not alerts or self._alert_bot is None:
+            return
+        counts = Counter(alerts)
+        lines = [text if count == 1 else f"{text} (x{count})" for text, count in counts.items()]
+        text = f"⚠️ {len(alerts)} bot error(s):\n\n" + "\n\n".join(lines)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 1] + "…"
+        bot = self._alert_bot
+        admins = list(self.admin_ids)
+        results = await asyncio.gather(*[
+            self.send(admin_id, lambda admin_id=admin_id: bot.send_message(chat_id=admin_id, text=text))
+            for admin_id in admins
+        ], return_exceptions=True)
+        for admin_id, result in zip(admins, results):
+            if isinstance(result, Exception):
+                logging.error(f"Failed to send error message to admin {admin_id}: {str(result)}")
+
+    async def close(self):
+        """Send pending alerts instead of losing them on shutdown"""
+        if self._alert_task is not None:
+            self._alert_task.cancel()
+            self._alert_task = None
+        await self.flush_alerts()
+
+    def stats(self) -> Dict:
+        return {
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "chats": len(self._queues),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed
+        }
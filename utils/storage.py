@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from app.config import Config
+
+# Columns persisted for every resolved share, in table order
+LINK_FIELDS = ('share_id', 'fs_id', 'filename', 'size', 'mime_type', 'direct_url', 'expires_at', 'updated_at')
+
+class StorageBackend(ABC):
+    """Interface of a link-metadata store"""
+
+    @abstractmethod
+    async def connect(self):
+        """Open the connection and create the links table if needed"""
+
+    @abstractmethod
+    async def close(self):
+        """Release the connection"""
+
+    @abstractmethod
+    async def get(self, share_id: str) -> Optional[Dict]:
+        """Stored row for share_id as a dict of LINK_FIELDS, or None"""
+
+    @abstractmethod
+    async def upsert_many(self, records: List[Dict]):
+        """Insert or replace records in one batch"""
+
+class SQLiteBackend(StorageBackend):
+    """Links in a local SQLite file, the default outside production
+
+    sqlite3 is blocking, so every statement runs on one dedicated worker
+    thread; that also serialises writers the way SQLite wants.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="link-store")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def connect(self):
+        await self._run(self._connect)
+
+    def _connect(self):
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS links (
+                share_id TEXT PRIMARY KEY,
+                fs_id TEXT,
+                filename TEXT,
+                size INTEGER,
+                mime_type TEXT,
+                direct_url TEXT,
+                expires_at REAL,
+                updated_at REAL
+            )
+        """)
+        self._connection.commit()
+
+    async def close(self):
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=False)
+
+    async def get(self, share_id: str) -> Optional[Dict]:
+        return await self._run(self._get, share_id)
+
+    def _get(self, share_id: str) -> Optional[Dict]:
+        row = self._connection.execute(
+            f"SELECT {', '.join(LINK_FIELDS)} FROM links WHERE share_id = ?", (share_id,)
+        ).fetchone()
+        return dict(zip(LINK_FIELDS, row)) if row else None
+
+    async def upsert_many(self, records: List[Dict]):
+        await self._run(self._upsert_many, records)
+
+    def _upsert_many(self, records: List[Dict]):
+        placeholders = ", ".join("?" for _ in LINK_FIELDS)
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO links ({', '.join(LINK_FIELDS)}) VALUES ({placeholders})",
+                [tuple(record[field] for field in LINK_FIELDS) for record in records]
+            )
+
+class PostgresBackend(StorageBackend):
+    """Links in PostgreSQL through an asyncpg connection pool"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool = None
+
+    async def connect(self):
+        # Only deployments with a Postgres DATABASE_URL need asyncpg
+        import asyncpg
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=1,
+            max_size=Config.DATABASE_POOL_SIZE
+        )
+        await self._pool.execute("""
+            CREATE TABLE IF NOT EXISTS links (
+                share_id TEXT PRIMARY KEY,
+                fs_id TEXT,
+                filename TEXT,
+                size BIGINT,
+                mime_type TEXT,
+                direct_url TEXT,
+                expires_at DOUBLE PRECISION,
+                updated_at DOUBLE PRECISION
+            )
+        """)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def get(self, share_id: str) -> Optional[Dict]:
+        row = await self._pool.fetchrow(
+            f"SELECT {', '.join(LINK_FIELDS)} FROM links WHERE share_id = $1", share_id
+        )
+        return dict(row) if row else None
+
+    async def upsert_many(self, records: List[Dict]):
+        placeholders = ", ".join(f"${index}" for index in range(1, len(LINK_FIELDS) + 1))
+        updates = ", ".join(f"{field} = EXCLUDED.{field}" for field in LINK_FIELDS[1:])
+        await self._pool.executemany(
+            f"INSERT INTO links ({', '.join(LINK_FIELDS)}) VALUES ({placeholders}) "
+            f"ON CONFLICT (share_id) DO UPDATE SET {updates}",
+            [tuple(record[field] for field in LINK_FIELDS) for record in records]
+        )
+
+def normalize_fs_id(fs_id):
+    """fs_id as the resolver produces it: an int when numeric, whatever it read back"""
+    if isinstance(fs_id, str) and fs_id.isdigit():
+        return int(fs_id)
+    return fs_id
+
+class LinkStore:
+    """Persist resolved links with buffered writes, read behind the memory cache
+
+    record() only drops the link into a buffer keyed by share_id, so the
+    request path never waits on the database and a link resolved many
+    times in a burst is written once. The buffer is flushed in one batch
+    when it reaches DATABASE_BATCH_SIZE or every DATABASE_FLUSH_INTERVAL.
+
+    While the database is unreachable, connecting is retried with doubling
+    pauses up to retry_max, the outage is logged once, and at most
+    max_pending links are held, dropping the oldest first.
+    """
+
+    def __init__(self, backend: StorageBackend, batch_size: int = 100, flush_interval: float = 2,
+                 max_pending: int = 10000, retry_max: float = 60):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_max = retry_max
+        self.hits = 0
+        self.misses = 0
+        self.written = 0
+        self.dropped = 0
+        self._buffer: Dict[str, Dict] = {}
+        self._ready: Optional[asyncio.Task] = None
+        self._connected = False
+        self._retry_at = 0.0
+        self._retry_delay = 0.0
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_config(cls) -> 'LinkStore':
+        """Use Postgres for a postgres:// DATABASE_URL, otherwise a local SQLite file"""
+        url = Config.DATABASE_URL
+        if url.startswith(('postgres://', 'postgresql://')):
+            backend = PostgresBackend(url)
+        else:
+            path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else Config.LINK_DB_PATH
+            backend = SQLiteBackend(path)
+        return cls(
+            backend,
+            Config.DATABASE_BATCH_SIZE,
+            Config.DATABASE_FLUSH_INTERVAL,
+            Config.DATABASE_MAX_PENDING,
+            Config.DATABASE_RETRY_MAX
+        )
+
+    def _start(self):
+        """Start the flusher on first use, within the running loop"""
+        if self._flusher is None:
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    async def _connect(self):
+        """Wait for the backend connection, reconnecting after a pause if it failed"""
+        if self._ready is None:
+            if time.monotonic() < self._retry_at:
+                raise ConnectionError("Link store is waiting to reconnect")
+            self._ready = asyncio.ensure_future(self.backend.connect())
+        ready = self._ready
+        try:
+            await asyncio.shield(ready)
+        except Exception as e:
+            # Every waiter sees the failure; only the first schedules the retry
+            if ready is self._ready:
+                self._ready = None
+                if self._retry_delay == 0:
+                    logging.error(f"Link store is unreachable, retrying in the background: {str(e)}")
+                self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), self.retry_max)
+                self._retry_at = time.monotonic() + self._retry_delay
+            raise ConnectionError(f"Link store is unreachable: {str(e)}") from e
+        if not self._connected:
+            if self._retry_delay:
+                logging.info("Link store reconnected")
+            self._connected = True
+            self._retry_delay = 0.0
+
+    def record(self, file_info: Dict, expires_at: Optional[float]):
+        """Queue a resolved link for the next batched write"""
+        self._buffer[file_info["share_id"]] = {
+            "share_id": file_info["share_id"],
+            # Stored as text; lookup() turns numeric IDs back into ints
+            "fs_id": None if file_info.get("fs_id") is None else str(file_info["fs_id"]),
+            "filename": file_info.get("filename", ""),
+            "size": int(file_info.get("size") or 0),
+            "mime_type": file_info.get("mime_type"),
+            "direct_url": file_info.get("direct_url"),
+            "expires_at": expires_at,
+            "updated_at": time.time()
+        }
+        self._trim()
+        self._start()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _trim(self):
+        """Drop the oldest unwritten links beyond max_pending"""
+        excess = len(self._buffer) - self.max_pending
+        if excess <= 0:
+            return
+        if self.dropped == 0:
+            logging.warning(f"Link store backlog is full, dropping the oldest of {len(self._buffer)} unwritten links")
+        for share_id in list(self._buffer)[:excess]:
+            del self._buffer[share_id]
+        self.dropped += excess
+
+    async def lookup(self, share_id: str) -> Optional[Dict]:
+        """Return the stored link for share_id if its direct URL is still valid"""
+        record = self._buffer.get(share_id)
+        if record is None:
+            try:
+                self._start()
+                await self._connect()
+                record = await self.backend.get(share_id)
+            except ConnectionError:
+                # Already logged when the connection failed
+                record = None
+            except Exception as e:
+                logging.error(f"Link store lookup failed: {str(e)}")
+                record = None
+        if not record or not record.get("direct_url") or not self._is_fresh(record):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {**record, "fs_id": normalize_fs_id(record.get("fs_id"))}
+
+    @staticmethod
+    def _is_fresh(record: Dict) -> bool:
+        expires_at = record.get("expires_at")
+        if expires_at is None:
+            # No expiry in the URL; trust it as long as the memory cache would
+            return record["updated_at"] + Config.CACHE_TIMEOUT > time.time()
+        return expires_at - Config.CACHE_EXPIRY_MARGIN > time.time()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every buffered link in one batch"""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, {}
+        try:
+            await self._connect()
+            await self.backend.upsert_many(list(batch.values()))
+            self.written += len(batch)
+        except Exception as e:
+            if not isinstance(e, ConnectionError):
+                logging.error(f"Link store write of {len(batch)} links failed: {str(e)}")
+            # Older than anything recorded since; newer entries for a share win
+            batch.update(self._buffer)
+            self._buffer = batch
+            self._trim()
+
+    async def close(self):
+        """Flush pending writes and release the database"""
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        self._flusher = None
+        await self.flush()
+        if self._ready is not None and not self._ready.done():
+            self._ready.cancel()
+        await self.backend.close()
+        self._ready = None
+        self._connected = False
+
+    def stats(self) -> Dict:
+        """Return lookup counters and the write backlog"""
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pending": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "connected": self._connected
+        }
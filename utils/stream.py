@@ -0,0 +1,282 @@
+import logging
+import re
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import quote
+import aiohttp
+from app.config import Config
+from utils import FileProcessingError, TeraboxError
+from utils.cache import SingleFlight, TTLCache
+from utils.chunk_cache import ChunkCache
+from utils.terabox import TeraboxDownloader
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Characters that cannot appear in a quoted ASCII filename parameter
+ASCII_UNSAFE_PATTERN = re.compile(r'[^\x20-\x7e]|["\\]')
+
+# Upstream statuses that mean the signed URL is no longer usable
+EXPIRED_STATUSES = {401, 403, 404, 410}
+
+class RangeNotSatisfiable(TeraboxError):
+    """Requested byte range lies outside the file"""
+    def __init__(self, size: int):
+        super().__init__(f"Range not satisfiable for size {size}")
+        self.size = size
+
+class FileTooLarge(TeraboxError):
+    """File is larger than Config.MAX_FILE_SIZE"""
+    pass
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into inclusive (start, end)
+
+    Returns None when the whole file should be served, which includes
+    multi-range requests and unknown sizes.
+    """
+    if not header or size <= 0:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(size)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(size)
+    return start, end
+
+def content_disposition(filename: str) -> str:
+    """Inline Content-Disposition that survives any filename
+
+    Header values must be latin-1, so filename carries an ASCII fallback
+    and filename* (RFC 5987) the exact UTF-8 name for clients that read it.
+    """
+    fallback = ASCII_UNSAFE_PATTERN.sub("_", filename) or "video"
+    return f"inline; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+class StreamResponse:
+    """Status, headers and body of a proxied stream"""
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status: int, headers: Dict[str, str], body: Optional[AsyncIterator[bytes]] = None):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+class StreamProxy:
+    """Relay Terabox files to players over the pooled upstream session
+
+    Bytes are forwarded chunk by chunk as they arrive, so memory use does
+    not depend on file size. An expired signed URL is re-resolved before
+    the first byte, and a stream cut mid-way resumes from the last byte
+    sent against a freshly resolved URL.
+
+    With a chunk cache, files streamed by at least CHUNK_CACHE_MIN_HITS
+    distinct clients within CHUNK_CACHE_HOT_WINDOW are fetched in whole
+    blocks keyed by fs_id and served from disk after that; one viewer
+    seeking around a file does not make it popular. Concurrent misses on
+    the same block share one upstream fetch.
+    """
+
+    def __init__(self, downloader: TeraboxDownloader, chunk_cache: Optional[ChunkCache] = None):
+        self.downloader = downloader
+        self.chunk_cache = chunk_cache
+        # fs_id -> {client: last seen}, for clients seen within the hot window
+        self._viewers = TTLCache(max_size=Config.CACHE_MAX_ENTRIES, ttl=Config.CHUNK_CACHE_HOT_WINDOW)
+        self._block_fetches = SingleFlight()
+        self.timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=Config.STREAM_CONNECT_TIMEOUT,
+            sock_read=Config.STREAM_READ_TIMEOUT
+        )
+
+    async def open(self, share_id: str, range_header: Optional[str], with_body: bool = True,
+                   client: Optional[str] = None) -> Optional[StreamResponse]:
+        file_info = await self.downloader.process_share(share_id)
+        if not file_info or not file_info.get("direct_url"):
+            return None
+
+        size = int(file_info.get("size") or 0)
+        if size > Config.MAX_FILE_SIZE:
+            raise FileTooLarge(Config.ERROR_MESSAGES['file_too_large'])
+
+        byte_range = parse_range(range_header, size)
+        headers = self._response_headers(file_info, size, byte_range)
+        status = 206 if byte_range else 200
+        if not with_body:
+            return StreamResponse(status, headers)
+
+        start, end = byte_range if byte_range else (0, None)
+        fs_id = file_info.get("fs_id")
+        if self.chunk_cache and fs_id and size and self._is_hot(fs_id, start, client):
+            end = size - 1 if end is None else end
+            # Fetch the first block now so an expired link is refreshed before we answer
+            first = await self._read_block(share_id, fs_id, size, start // self.chunk_cache.block_size, start, end)
+            if first is None:
+                return None
+            return StreamResponse(status, headers, self._relay_cached(share_id, fs_id, size, first, start, end))
+
+        # Open upstream now so an expired link is refreshed before we answer
+        response = await self._open_upstream(share_id, file_info, start, end)
+        if response is None:
+            return None
+        return StreamResponse(status, headers, self._relay(share_id, response, start, end))
+
+    def _is_hot(self, fs_id, start: int, client: Optional[str]) -> bool:
+        """Record client as a viewer of fs_id and tell whether it should go through the chunk cache"""
+        now = time.monotonic()
+        window = Config.CHUNK_CACHE_HOT_WINDOW
+        viewers = {
+            viewer: seen for viewer, seen in (self._viewers.get(fs_id) or {}).items()
+            if now - seen < window
+        }
+        # Once hot, more viewers change nothing, so the set stays small
+        if client in viewers or len(viewers) < Config.CHUNK_CACHE_MIN_HITS:
+            viewers[client] = now
+        self._viewers.set(fs_id, viewers)
+        return len(viewers) >= Config.CHUNK_CACHE_MIN_HITS or self.chunk_cache.has(fs_id, start // self.chunk_cache.block_size)
+
+    def cache_stats(self) -> Optional[Dict]:
+        """Return chunk cache counters, or None when the cache is disabled"""
+        if not self.chunk_cache:
+            return None
+        stats = self.chunk_cache.stats()
+        stats["coalesced"] = self._block_fetches.coalesced
+        return stats
+
+    async def read_range(self, share_id: str, file_info: Dict, start: int, end: int) -> Optional[bytes]:
+        """Read bytes start..end of a file, from the chunk cache when it already holds them"""
+        fs_id = file_info.get("fs_id")
+        if self.chunk_cache and fs_id:
+            block = start // self.chunk_cache.block_size
+            if block == end // self.chunk_cache.block_size and self.chunk_cache.has(fs_id, block):
+                offset = start - block * self.chunk_cache.block_size
+                data = await self.chunk_cache.read(fs_id, block, offset, end - start + 1)
+                if data is not None:
+                    return data
+        response = await self._open_upstream(share_id, file_info, start, end)
+        if response is None:
+            return None
+        try:
+            return await response.read()
+        finally:
+            response.close()
+
+    def _response_headers(self, file_info: Dict, size: int, byte_range: Optional[Tuple[int, int]]) -> Dict[str, str]:
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Type": file_info.get("mime_type") or "application/octet-stream",
+            "Content-Disposition": content_disposition(file_info.get("filename") or "video"),
+            "Cache-Control": "no-store"
+        }
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+        elif size:
+            headers["Content-Length"] = str(size)
+        return headers
+
+    async def _open_upstream(self, share_id: str, file_info: Dict, start: int, end: Optional[int]) -> Optional[aiohttp.ClientResponse]:
+        """Open the upstream body at start, refreshing the signed URL once if needed"""
+        for attempt in range(2):
+            response = await self._request(file_info["direct_url"], start, end)
+            if response.status not in EXPIRED_STATUSES:
+                if response.status >= 400:
+                    response.close()
+                    raise FileProcessingError(f"Upstream returned {response.status}")
+                if (start or end is not None) and response.status != 206:
+                    response.close()
+                    raise FileProcessingError("Upstream ignored the Range request")
+                return response
+            response.close()
+            if attempt == 0:
+                logging.info(f"Direct link for {share_id} expired, refreshing")
+                file_info = await self.downloader.refresh(share_id)
+                if not file_info or not file_info.get("direct_url"):
+                    return None
+        return None
+
+    async def _request(self, url: str, start: int, end: Optional[int]) -> aiohttp.ClientResponse:
+        session = await self.downloader.get_session()
+        headers = {"Accept": "*/*", **self.downloader.accounts.acquire().headers()}
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{end if end is not None else ''}"
+        return await session.get(url, headers=headers, timeout=self.timeout)
+
+    async def _relay(self, share_id: str, response: aiohttp.ClientResponse, start: int, end: Optional[int]) -> AsyncIterator[bytes]:
+        position = start
+        resumes = 0
+        try:
+            while True:
+                try:
+                    async for chunk in response.content.iter_chunked(Config.STREAM_CHUNK_SIZE):
+                        position += len(chunk)
+                        yield chunk
+                    return
+                except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError) as e:
+                    if resumes >= Config.STREAM_MAX_RESUMES or (end is not None and position > end):
+                        raise
+                    resumes += 1
+                    logging.warning(f"Upstream stream for {share_id} broke at byte {position}: {str(e)}")
+                    # Forget it once closed, in case the resume below fails
+                    response.close()
+                    response = None
+                    file_info = await self.downloader.refresh(share_id)
+                    if not file_info:
+                        raise
+                    response = await self._open_upstream(share_id, file_info, position, end)
+                    if response is None:
+                        raise
+        finally:
+            if response is not None:
+                response.close()
+
+    async def _relay_cached(self, share_id: str, fs_id, size: int, first: bytes, start: int, end: int) -> AsyncIterator[bytes]:
+        yield first
+        block_size = self.chunk_cache.block_size
+        for block in range(start // block_size + 1, end // block_size + 1):
+            data = await self._read_block(share_id, fs_id, size, block, start, end)
+            if data is None:
+                raise FileProcessingError(f"Could not fetch block {block} of {share_id}")
+            yield data
+
+    async def _read_block(self, share_id: str, fs_id, size: int, block: int, start: int, end: int) -> Optional[bytes]:
+        """Return the part of a block inside start..end, from disk or fetched whole from upstream"""
+        block_start = block * self.chunk_cache.block_size
+        low = max(start, block_start) - block_start
+        high = min(end, block_start + self.chunk_cache.block_size - 1) - block_start
+        data = await self.chunk_cache.read(fs_id, block, low, high - low + 1)
+        if data is not None:
+            return data
+        data = await self._block_fetches.do(
+            (fs_id, block), lambda: self._fetch_block(share_id, fs_id, size, block)
+        )
+        return data[low:high + 1] if data is not None else None
+
+    async def _fetch_block(self, share_id: str, fs_id, size: int, block: int) -> Optional[bytes]:
+        file_info = await self.downloader.process_share(share_id)
+        if not file_info or not file_info.get("direct_url"):
+            return None
+        block_start = block * self.chunk_cache.block_size
+        block_end = min(block_start + self.chunk_cache.block_size, size) - 1
+        response = await self._open_upstream(share_id, file_info, block_start, block_end)
+        if response is None:
+            return None
+        try:
+            data = await response.read()
+        finally:
+            response.close()
+        if len(data) != block_end - block_start + 1:
+            raise FileProcessingError(f"Upstream returned {len(data)} bytes for block {block} of {share_id}")
+        await self.chunk_cache.write(fs_id, block, data)
+        return data
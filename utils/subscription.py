@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+from utils.cache import SingleFlight, TTLCache
+
+MEMBER_STATUSES = {'creator', 'administrator', 'member'}
+
+class MembershipGate:
+    """Force-subscribe check for one channel, backed by a membership cache
+
+    Members are remembered for member_ttl and non-members for the shorter
+    non_member_ttl, so someone who just joined is not refused for long.
+    chat_member updates overwrite the cached answer as soon as Telegram
+    reports a join or leave. The Bot API has no bulk membership lookup, so
+    concurrent checks are batched instead: checks for the same user share
+    one get_chat_member call, and at most max_concurrent calls are in flight.
+    A failed lookup lets the user through and is remembered for
+    failure_ttl, so a bot that cannot see the channel does not call
+    get_chat_member on every message.
+    """
+
+    def __init__(self, channel_id: int, member_ttl: int, non_member_ttl: int, max_concurrent: int = 16,
+                 max_size: int = 10000, failure_ttl: int = 60):
+        self.channel_id = channel_id
+        self.member_ttl = member_ttl
+        self.non_member_ttl = non_member_ttl
+        self.failure_ttl = failure_ttl
+        self.cache = TTLCache(max_size=max_size, ttl=member_ttl)
+        self.max_concurrent = max_concurrent
+        self._inflight = SingleFlight()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.lookups = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.channel_id)
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        return self._slots
+
+    async def is_member(self, bot, user_id: int) -> bool:
+        """Whether user_id has joined the channel; always True when the gate is off"""
+        if not self.enabled:
+            return True
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            return cached
+        return await self._inflight.do(user_id, lambda: self._lookup(bot, user_id))
+
+    async def _lookup(self, bot, user_id: int) -> bool:
+        async with self._get_slots():
+            self.lookups += 1
+            try:
+                member = await bot.get_chat_member(chat_id=self.channel_id, user_id=user_id)
+            except Exception as e:
+                # Usually the bot is not an admin of the channel; do not lock everyone out
+                self.failures += 1
+                logging.warning(f"Membership check for {user_id} failed: {str(e)}")
+                self.cache.set(user_id, True, ttl=self.failure_ttl)
+                return True
+        joined = self.status_is_member(member.status, getattr(member, 'is_member', False))
+        self.record(user_id, joined)
+        return joined
+
+    @staticmethod
+    def status_is_member(status: str, is_member: bool = False) -> bool:
+        # Restricted users are still in the channel when is_member is set
+        return status in MEMBER_STATUSES or (status == 'restricted' and bool(is_member))
+
+    def record(self, user_id: int, joined: bool):
+        """Cache a known membership state, replacing whatever was cached before"""
+        self.cache.set(user_id, joined, ttl=self.member_ttl if joined else self.non_member_ttl)
+
+    async def on_chat_member(self, update, context):
+        """ChatMemberHandler callback keeping the cache in step with joins and leaves"""
+        change = update.chat_member
+        if change is None or change.chat.id != self.channel_id:
+            return
+        new = change.new_chat_member
+        self.record(new.user.id, self.status_is_member(new.status, getattr(new, 'is_member', False)))
+
+    def stats(self) -> Dict:
+        return {
+            "cache": self.cache.stats(),
+            "lookups": self.lookups,
+            "failures": self.failures
+        }
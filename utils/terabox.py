@@ -1,61 +1,333 @@
 import aiohttp
 import json
 import re
-from typing import Dict, Optional
+import time
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
 import logging
-import config
+from app.config import Config
+from utils import FileProcessingError, TeraboxValidator
+from utils.accounts import AccountPool, AccountThrottled, is_throttled
+from utils.cache import SingleFlight, TTLCache
+from utils.metrics import UPSTREAM_LATENCY
+from utils.resilience import CircuitOpenError, RetryBudget, UpstreamError, UpstreamPolicy
+from utils.storage import LinkStore
+
+# Statuses that mean Terabox is struggling rather than that the request is wrong
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+FILE_INFO_LATENCY = UPSTREAM_LATENCY.labels("file_info")
+DOWNLOAD_URL_LATENCY = UPSTREAM_LATENCY.labels("download_url")
+
+# Separates share ID and fs_id in the key of a single entry of a folder share
+ENTRY_SEPARATOR = ":"
+
+def entry_key(share_id: str, fs_id) -> str:
+    """Key under which one file of a folder share is cached and streamed"""
+    return f"{share_id}{ENTRY_SEPARATOR}{fs_id}"
 
 class TeraboxDownloader:
     def __init__(self):
         self.headers = {
-            "User-Agent": config.TERABOX_USER_AGENT,
+            "User-Agent": Config.USER_AGENT,
             "Accept": "application/json"
         }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.cache = TTLCache(
+            max_size=Config.CACHE_MAX_ENTRIES,
+            ttl=Config.CACHE_TIMEOUT
+        )
+        self._inflight = SingleFlight()
+        # Survives restarts; consulted only when the memory cache misses
+        self.store: Optional[LinkStore] = LinkStore.from_config() if Config.LINK_STORE else None
+        self._skip_store = set()
+        self.accounts = AccountPool.from_config()
+        self.upstream = UpstreamPolicy(
+            hosts=Config.TERABOX_API_HOSTS,
+            attempt_timeout=Config.UPSTREAM_TIMEOUT,
+            deadline=Config.UPSTREAM_DEADLINE,
+            retries=Config.UPSTREAM_RETRIES,
+            backoff_base=Config.UPSTREAM_BACKOFF_BASE,
+            backoff_max=Config.UPSTREAM_BACKOFF_MAX,
+            hedge_delay=Config.UPSTREAM_HEDGE_DELAY,
+            failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=Config.CIRCUIT_RESET_TIMEOUT,
+            retry_budget=RetryBudget(Config.UPSTREAM_RETRY_RATIO)
+        )
+        # dlinks seen while listing folders, so picking an entry needs no re-listing
+        self._entries = TTLCache(
+            max_size=Config.CACHE_MAX_ENTRIES,
+            ttl=Config.CACHE_TIMEOUT
+        )
+        # Attached at startup; told about every request so hot links stay warm
+        self.refresher = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared keep-alive session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=Config.HTTP_POOL_SIZE,
+                limit_per_host=Config.HTTP_POOL_PER_HOST,
+                ttl_dns_cache=Config.DNS_CACHE_TTL,
+                keepalive_timeout=Config.HTTP_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers
+            )
+        return self._session
+
+    async def close(self):
+        """Close the pooled session and release its connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.store is not None:
+            await self.store.close()
+
+    def cache_stats(self) -> Dict:
+        """Return hit/miss counters of the resolved-link cache"""
+        stats = self.cache.stats()
+        stats["inflight"] = len(self._inflight)
+        stats["coalesced"] = self._inflight.coalesced
+        stats["upstream"] = self.upstream.stats()
+        stats["accounts"] = self.accounts.stats()
+        if self.store is not None:
+            stats["store"] = self.store.stats()
+        return stats
 
     async def process_url(self, url: str) -> Optional[Dict]:
+        # Extract share ID from URL
+        share_id = self._extract_share_id(url)
+        if not share_id:
+            logging.error("Terabox Error: Invalid Terabox URL")
+            return None
+        return await self.process_share(share_id)
+
+    def invalidate(self, share_id: str):
+        """Forget the cached resolution of a share"""
+        self.cache.pop(share_id)
+        # The stored copy carries the same dead URL
+        self._skip_store.add(share_id)
+
+    async def refresh(self, share_id: str) -> Optional[Dict]:
+        """Re-resolve a share whose signed direct URL stopped working"""
+        self.invalidate(share_id)
+        return await self.process_share(share_id)
+
+    async def renew(self, share_id: str) -> Optional[Dict]:
+        """Resolve a share again ahead of expiry while its cached link keeps being served"""
         try:
-            # Extract share ID from URL
-            share_id = self._extract_share_id(url)
-            if not share_id:
-                raise ValueError("Invalid Terabox URL")
+            result = await self._inflight.do(share_id, lambda: self._resolve(share_id, use_store=False))
+        except Exception as e:
+            logging.warning(f"Could not renew link for {share_id}: {str(e)}")
+            return None
+        return dict(result)
 
-            # Get file info
-            file_info = await self._get_file_info(share_id)
-            if not file_info:
-                raise ValueError("Failed to get file info")
-
-            # Get download URL
-            download_url = await self._get_download_url(file_info)
-            
-            return {
-                "filename": file_info.get("filename", ""),
-                "size": file_info.get("size", 0),
-                "mime_type": self._get_mime_type(file_info.get("filename", "")),
-                "direct_url": download_url
-            }
+    async def resolve_entry(self, share_id: str, fs_id) -> Optional[Dict]:
+        """Resolve the direct link of one file inside a folder share"""
+        return await self.process_share(entry_key(share_id, fs_id))
+
+    async def iter_share_files(self, share_id: str, directory: Optional[str] = None,
+                               recursive: bool = True) -> AsyncIterator[Dict]:
+        """Yield the entries of a share folder page by page, without direct links
+
+        Only one page and the paths of directories still to visit are held in
+        memory. With recursive, subdirectories are walked and only files are
+        yielded; otherwise the directories of this level are yielded as well.
+        """
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            page = 1
+            while True:
+                entries = await self._list_page(share_id, current, page)
+                for raw in entries:
+                    entry = self._entry_info(share_id, raw)
+                    if entry["is_dir"]:
+                        if recursive:
+                            pending.append(entry["path"])
+                            continue
+                    else:
+                        self._entries.set((share_id, str(entry["fs_id"])), {
+                            "fs_id": entry["fs_id"],
+                            "filename": entry["filename"],
+                            "size": entry["size"],
+                            "dlink": raw.get("dlink")
+                        })
+                    yield entry
+                if len(entries) < Config.SHARE_LIST_PAGE_SIZE:
+                    break
+                page += 1
 
+    async def process_share(self, share_id: str) -> Optional[Dict]:
+        try:
+            # Serve recently resolved links from cache
+            result = self.cache.get(share_id)
+            if result is None:
+                # Concurrent requests for the same share wait on one upstream call
+                result = await self._inflight.do(share_id, lambda: self._resolve(share_id))
+
+        except CircuitOpenError as e:
+            logging.warning(f"Terabox Error: {str(e)}")
+            return None
         except Exception as e:
             logging.error(f"Terabox Error: {str(e)}")
             return None
 
+        # Only shares that resolve are worth keeping warm
+        if self.refresher is not None:
+            self.refresher.touch(share_id)
+        return dict(result)
+
+    async def _resolve(self, share_id: str, use_store: bool = True) -> Dict:
+        """Resolve a share ID or entry key to file metadata and a direct URL"""
+        if use_store and self.store is not None and share_id not in self._skip_store:
+            stored = await self.store.lookup(share_id)
+            if stored:
+                result = {
+                    field: stored[field]
+                    for field in ("share_id", "fs_id", "filename", "size", "mime_type", "direct_url")
+                }
+                self.cache.set(share_id, result, ttl=self._get_cache_ttl(result["direct_url"]))
+                return result
+        self._skip_store.discard(share_id)
+
+        # Get file info
+        if ENTRY_SEPARATOR in share_id:
+            file_info = await self._get_entry_info(*share_id.split(ENTRY_SEPARATOR, 1))
+        else:
+            file_info = await self._get_file_info(share_id)
+        if not file_info:
+            raise FileProcessingError(f"No file found in share {share_id}")
+
+        # Get download URL
+        download_url = await self._get_download_url(file_info)
+        if not download_url:
+            raise FileProcessingError(f"No download URL for share {share_id}")
+
+        result = {
+            "share_id": share_id,
+            "fs_id": file_info.get("fs_id"),
+            "filename": file_info.get("filename", ""),
+            "size": file_info.get("size", 0),
+            "mime_type": self._get_mime_type(file_info.get("filename", "")),
+            "direct_url": download_url
+        }
+        self.cache.set(share_id, result, ttl=self._get_cache_ttl(download_url))
+        if self.store is not None:
+            expires_in = self._get_url_expiry(download_url)
+            self.store.record(result, None if expires_in is None else time.time() + expires_in)
+        return result
+
     async def _get_file_info(self, share_id: str) -> Optional[Dict]:
-        async with aiohttp.ClientSession() as session:
-            url = f"https://www.terabox.com/api/share/list?shareid={share_id}"
-            async with session.get(url, headers=self.headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("list", [{}])[0]
+        """Return the first downloadable file at the top of a share, skipping folders"""
+        with FILE_INFO_LATENCY.time():
+            entries = await self._list_page(share_id, None, 1)
+        for raw in entries:
+            if str(raw.get("isdir", 0)) != "1" and raw.get("dlink"):
+                return raw
         return None
 
+    async def _get_entry_info(self, share_id: str, fs_id: str) -> Optional[Dict]:
+        """Find a folder entry by fs_id, walking the share only if it was not listed yet"""
+        file_info = self._entries.get((share_id, fs_id))
+        if file_info is None:
+            async for entry in self.iter_share_files(share_id):
+                if str(entry["fs_id"]) == fs_id:
+                    return self._entries.get((share_id, fs_id))
+        return file_info
+
+    async def _list_page(self, share_id: str, directory: Optional[str], page: int) -> List[Dict]:
+        """Fetch one page of a share folder listing"""
+        params = {"shareid": share_id, "page": page, "num": Config.SHARE_LIST_PAGE_SIZE}
+        if directory:
+            params["dir"] = directory
+        else:
+            params["root"] = 1
+
+        async def fetch(host: str) -> List[Dict]:
+            session = await self.get_session()
+            with self.accounts.use() as account:
+                async with session.get(
+                    f"{Config.TERABOX_API_SCHEME}://{host}/api/share/list",
+                    params={**params, **account.params()},
+                    headers=account.headers()
+                ) as response:
+                    data = await response.json(content_type=None) if response.status == 200 else None
+                    if is_throttled(response.status, data):
+                        raise AccountThrottled(f"{host} throttled account {account.name}")
+                    self._check_status(host, response.status)
+                    return (data or {}).get("list") or []
+
+        return await self.upstream.call(fetch)
+
+    @staticmethod
+    def _check_status(host: str, status: int):
+        if status in RETRYABLE_STATUSES:
+            raise UpstreamError(f"{host} returned {status}")
+
+    def _entry_info(self, share_id: str, raw: Dict) -> Dict:
+        filename = raw.get("server_filename") or raw.get("filename", "")
+        is_dir = str(raw.get("isdir", 0)) == "1"
+        return {
+            "share_id": share_id if is_dir else entry_key(share_id, raw.get("fs_id")),
+            "fs_id": raw.get("fs_id"),
+            "filename": filename,
+            "path": raw.get("path", ""),
+            "size": int(raw.get("size") or 0),
+            "is_dir": is_dir,
+            "mime_type": None if is_dir else self._get_mime_type(filename)
+        }
+
+    async def _get_download_url(self, file_info: Dict) -> Optional[str]:
+        """Follow the share dlink once to get the signed direct URL"""
+        dlink = file_info.get("dlink")
+        if not dlink:
+            return None
+
+        async def follow(host: str) -> str:
+            session = await self.get_session()
+            with self.accounts.use() as account:
+                async with session.head(dlink, allow_redirects=False, headers=account.headers()) as response:
+                    if is_throttled(response.status):
+                        raise AccountThrottled(f"{host} throttled account {account.name}")
+                    self._check_status(host, response.status)
+                    return response.headers.get("Location", dlink)
+
+        # The dlink names its own host, so there is nothing to hedge across
+        with DOWNLOAD_URL_LATENCY.time():
+            return await self.upstream.call(follow, hosts=[urlparse(dlink).netloc])
+
+    def _get_cache_ttl(self, direct_url: str) -> float:
+        """Cache until CACHE_TIMEOUT or shortly before the signed URL expires"""
+        expires_in = self._get_url_expiry(direct_url)
+        if expires_in is None:
+            return Config.CACHE_TIMEOUT
+        return min(Config.CACHE_TIMEOUT, expires_in - Config.CACHE_EXPIRY_MARGIN)
+
+    def _get_url_expiry(self, direct_url: str) -> Optional[float]:
+        """Seconds until a signed direct URL expires, if it carries an expiry"""
+        params = parse_qs(urlparse(direct_url).query)
+        expires = params.get("expires", [""])[0]
+        match = re.fullmatch(r"(\d+)([smhd]?)", expires)
+        if not match:
+            return None
+        value, unit = int(match.group(1)), match.group(2)
+        if not unit and value > 1_000_000_000:
+            # Absolute unix timestamp
+            return value - time.time()
+        seconds = value * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[unit]
+        issued = params.get("time", [""])[0]
+        issued_at = int(issued) if issued.isdigit() else time.time()
+        return issued_at + seconds - time.time()
+
     def _extract_share_id(self, url: str) -> Optional[str]:
-        patterns = [
-            r"terabox\.com/s/([a-zA-Z0-9_-]+)",
-            r"teraboxapp\.com/s/([a-zA-Z0-9_-]+)"
-        ]
-        for pattern in patterns:
-            if match := re.search(pattern, url):
-                return match.group(1)
-        return None
+        return TeraboxValidator.extract_share_id(url)
+
+    def extract_share_ids(self, text: str) -> List[str]:
+        """Return every distinct share ID in a block of text, in order"""
+        return TeraboxValidator.find_share_ids(text)
 
     def _get_mime_type(self, filename: str) -> str:
         ext_map = {